@@ -0,0 +1,51 @@
+"""
+Measures time per tick and memory churn per tick for the example scenario (without
+logging), to check that the dynamic models' x, u, and y are being updated in place
+rather than reallocated. Memory churn is the peak memory traced by tracemalloc
+during each tick, over what was allocated before it, i.e. the most temporary memory
+the tick had live at once.
+"""
+import sys
+import time
+import tracemalloc
+
+import numpy.random as npr
+
+from scenario import build_scenario
+
+from benchmarks.common import temp_world
+
+if __name__ == "__main__":
+    ticks = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+
+    world, tmpdir = temp_world(rng=npr.default_rng(seed=0))
+    models = build_scenario(world, 5.0, logging=False)
+    world.compile()
+    msd = models['mass_spring_damper']
+    arrays = (msd.x, msd.u, msd.y)
+
+    for i in range(100): # warm up (builds the schedule, discretizes, etc.)
+        world.cycle()
+
+    start = time.perf_counter()
+    for i in range(ticks):
+        world.cycle()
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    churn = 0
+    for i in range(1000):
+        before, peak = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        world.cycle()
+        current, peak = tracemalloc.get_traced_memory()
+        churn = max(churn, peak - before)
+    tracemalloc.stop()
+
+    same = all(a is b for a, b in zip(arrays, (msd.x, msd.u, msd.y)))
+    world.finish_logging()
+    tmpdir.cleanup()
+
+    print(f"{1e6 * elapsed / ticks:10.2f} us/tick")
+    print(f"{churn:10d} bytes max temporary memory per tick")
+    print(f"x, u, y updated in place: {same}")
@@ -0,0 +1,51 @@
+"""
+Tick-latency histograms for World.cycle with synchronous versus asynchronous
+(background thread) log writes. With synchronous writes, every buffer flush shows up
+as a latency spike in whichever cycle filled the buffer. With asynchronous writes,
+the writer still holds the GIL while it's in h5py, so the cycles it overlaps get
+held up instead: the tail is about the same (and on a single core, it can't be any
+better).
+"""
+import sys
+import time
+
+import numpy as np
+
+from logger import Logger
+
+from benchmarks.common import ConstantInput, temp_world
+
+BINS_US = [0, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, float('inf')]
+
+def tick_latencies(frames: int, async_writes: bool):
+    world, tmpdir = temp_world()
+    source = ConstantInput(world, 'source', dt=0.01)
+    logger = Logger(world, 'log', dt=0.01, buffer_size=10000,
+                    compression='gzip', compression_opts=6, shuffle=True)
+    for i in range(20):
+        logger.add_input(f'column_{i}', 'source.y')
+    world.setup_logging(async_writes=async_writes)
+
+    latencies = np.zeros(frames)
+    for i in range(frames):
+        start = time.perf_counter_ns()
+        world.cycle()
+        latencies[i] = (time.perf_counter_ns() - start) / 1000.0
+
+    world.finish_logging()
+    tmpdir.cleanup()
+    return latencies
+
+def report(name: str, latencies):
+    print(f"{name}: p50 {np.percentile(latencies, 50):.1f} us, p99 {np.percentile(latencies, 99):.1f} us, "
+          f"p99.9 {np.percentile(latencies, 99.9):.1f} us, max {np.max(latencies):.1f} us")
+    counts, edges = np.histogram(latencies, bins=BINS_US)
+    for count, low, high in zip(counts, edges[:-1], edges[1:]):
+        if count > 0:
+            print(f"  {low:>8.0f} - {high:<8.0f} us: {count}")
+
+if __name__ == "__main__":
+    frames = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+
+    report("synchronous", tick_latencies(frames, False))
+    report("asynchronous", tick_latencies(frames, True))
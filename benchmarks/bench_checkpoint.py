@@ -0,0 +1,47 @@
+"""
+Measures the size of a checkpoint of the example world (with a logger buffer full
+of frames) and how long it takes to save and restore, compared with how long the
+warm-up it replaces takes to run.
+"""
+import sys
+import time
+
+import numpy.random as npr
+
+from scenario import build_scenario
+
+from benchmarks.common import temp_world
+
+def make_world():
+    world, tmpdir = temp_world(rng=npr.default_rng(seed=0))
+    build_scenario(world, 5.0)
+    world.setup_logging()
+    return world, tmpdir
+
+if __name__ == "__main__":
+    warmup = float(sys.argv[1]) if len(sys.argv) > 1 else 50.0
+
+    world, tmpdir = make_world()
+    start = time.perf_counter()
+    while world.t < warmup:
+        world.cycle()
+    warmup_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    checkpoint = world.checkpoint()
+    save_time = time.perf_counter() - start
+    world.finish_logging()
+    tmpdir.cleanup()
+
+    fork, tmpdir = make_world()
+    start = time.perf_counter()
+    fork.restore(checkpoint)
+    restore_time = time.perf_counter() - start
+    fork.finish_logging()
+    tmpdir.cleanup()
+
+    print(f"checkpoint size: {len(checkpoint) / 1e3:10.1f} kB")
+    print(f"           save: {1e3 * save_time:10.2f} ms")
+    print(f"        restore: {1e3 * restore_time:10.2f} ms")
+    print(f"  {warmup:g} s warm-up: {1e3 * warmup_time:10.2f} ms "
+          f"({warmup_time / (save_time + restore_time):.0f}x save + restore)")
@@ -0,0 +1,40 @@
+"""
+Compares steps/second for a world of many mass-spring-dampers at the same rate
+(using the solve_ivp integrator), integrated separately versus coupled into one
+solve_ivp call (see World.set_coupled).
+"""
+import sys
+
+import numpy as np
+
+from mass_spring_damper import MassSpringDamper
+
+from benchmarks.common import ConstantInput, temp_world, rate
+
+def bench_coupled(coupled: bool, plants: int, steps: int):
+    world, tmpdir = temp_world()
+    ConstantInput(world, 'force', dt=0.01)
+    for i in range(plants):
+        msd = MassSpringDamper(world, f'msd_{i}', dt=0.01, x=np.array([1.0, 0.0]),
+                               m=4.0, k=2.0 + 0.1 * i, b=3.0, integrator='solve_ivp')
+        msd.add_input('force', 'force.y')
+    world.compile()
+    world.set_coupled(coupled)
+
+    def run():
+        for i in range(steps):
+            world.cycle()
+
+    steps_per_second = rate(steps, run)
+    world.finish_logging()
+    tmpdir.cleanup()
+    return steps_per_second
+
+if __name__ == "__main__":
+    steps = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+
+    for plants in [1, 10, 50]:
+        separate = bench_coupled(False, plants, steps)
+        coupled = bench_coupled(True, plants, steps)
+        print(f"{plants:>4} plants: {separate:10.1f} steps/s separate, "
+              f"{coupled:10.1f} steps/s coupled ({coupled / separate:.1f}x)")
@@ -0,0 +1,40 @@
+"""
+Compares evaluations/second of the mass-spring-damper's dynamics (the right-hand side
+the ODE solvers call) through LinearStateSpaceModel.dynamics against the baseline of
+computing A @ x + B @ u straight from the (already built) matrices.
+"""
+import sys
+
+import numpy as np
+
+from mass_spring_damper import MassSpringDamper
+
+from benchmarks.common import temp_world, rate
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+
+    world, tmpdir = temp_world()
+    msd = MassSpringDamper(world, 'msd', m=4.0, k=2.0, b=3.0)
+    msd.u = 1.0
+    x = np.array([1.0, 0.5])
+    A, B = msd.state_space()
+    u = np.array([1.0])
+
+    def run_baseline():
+        for i in range(count):
+            A @ x + B @ u
+
+    def run_model():
+        for i in range(count):
+            msd.dynamics(0.0, x)
+
+    results = {
+        'baseline': rate(count, run_baseline),
+        'model': rate(count, run_model),
+    }
+    world.finish_logging()
+    tmpdir.cleanup()
+
+    for name, value in results.items():
+        print(f"{name:>10}: {value:12.1f} evaluations/s ({value / results['baseline']:.2f}x)")
@@ -0,0 +1,48 @@
+"""
+Simulated seconds per wall second for a fast plant alongside many sparse, slow
+subsystems, with the rate-group scheduler versus the event-driven one.
+
+The slow rates are chosen so that the hyperperiod is large: the rate-group table
+gets long (or too long to build at all), but the event queue only ever holds one
+entry per model.
+"""
+import sys
+
+from benchmarks.common import ConstantInput, temp_world, rate
+from scheduler import MAX_HYPERPERIOD
+
+FAST_DT = 0.001
+
+def build_world(count: int, event_driven: bool):
+    world, tmpdir = temp_world()
+    ConstantInput(world, 'plant', dt=FAST_DT)
+    for i in range(count):
+        # Slow, mutually awkward rates (e.g. 1.009 s, 1.013 s, ...)
+        ConstantInput(world, f'slow_{i}', dt=1.0 + 0.001 * (9 + 4 * i))
+    world.set_event_driven(event_driven)
+    return world, tmpdir
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    duration = float(sys.argv[2]) if len(sys.argv) > 2 else 10.0
+    frames = int(round(duration / FAST_DT))
+
+    for event_driven in [False, True]:
+        label = "event-driven" if event_driven else "rate-group"
+        world, tmpdir = build_world(count, event_driven)
+        try:
+            world.cycle() # builds the schedule
+        except ValueError as e:
+            print(f"{label:>14}: {e} (limit {MAX_HYPERPERIOD})")
+            world.finish_logging()
+            tmpdir.cleanup()
+            continue
+
+        def run():
+            for i in range(frames):
+                world.cycle()
+
+        frames_per_second = rate(frames, run)
+        print(f"{label:>14}: {frames_per_second * FAST_DT:10.2f} simulated s/s")
+        world.finish_logging()
+        tmpdir.cleanup()
@@ -0,0 +1,52 @@
+"""
+Compares steps/second of the exact zero-order-hold integrator, the solve_ivp path,
+and the persistent ODE solver for the mass-spring-damper, along with the number of
+dynamics evaluations per simulated second for the ODE solvers. The force changes
+every 0.1 s (like it would coming from the example's PID controller).
+"""
+import sys
+
+from discrete_model import DiscreteModel
+from mass_spring_damper import MassSpringDamper
+
+from benchmarks.common import temp_world, rate
+
+class SquareWave(DiscreteModel):
+    """
+    A force that flips sign every update.
+    """
+    def compute_inputs(self):
+        self.x = 1.0 if self.y <= 0.0 else -1.0
+        self.u = 0.0
+
+    def compute_outputs(self):
+        self.y = self.x
+
+def bench_integrator(integrator: str, steps: int):
+    world, tmpdir = temp_world()
+    force = SquareWave(world, 'force', dt=0.1)
+    msd = MassSpringDamper(world, 'msd', dt=0.01, m=4.0, k=2.0, b=3.0,
+                           integrator=integrator)
+    msd.add_input('force', 'force.y')
+    world.compile()
+
+    def run():
+        for i in range(steps):
+            world.cycle()
+
+    steps_per_second = rate(steps, run)
+    nfev_per_second = msd.nfev / world.t
+    world.finish_logging()
+    tmpdir.cleanup()
+    return steps_per_second, nfev_per_second
+
+if __name__ == "__main__":
+    steps = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+
+    results = {}
+    for integrator in ['solve_ivp', 'persistent', 'zoh']:
+        results[integrator], nfev = bench_integrator(integrator, steps)
+        print(f"{integrator:>10}: {results[integrator]:12.1f} steps/s {nfev:10.1f} evaluations/simulated s")
+
+    print(f"   speedup: {results['zoh'] / results['solve_ivp']:12.1f}x (zoh), "
+          f"{results['persistent'] / results['solve_ivp']:.1f}x (persistent)")
@@ -0,0 +1,51 @@
+"""
+Compares pulling a 100 s window of one column out of a long 100 Hz log with
+LogReader (time index, reading only the window) versus loading every t and the
+column and masking them in memory. The first LogReader query includes building the
+time index; later queries reuse it.
+"""
+import os
+import sys
+import tempfile
+import time
+
+import h5py
+import numpy as np
+
+from log_reader import LogReader
+
+
+def load_and_mask(basename: str, t_start: float, t_end: float):
+    with h5py.File(f"{basename}.h5", 'r') as f:
+        t = f['log']['t'][:]
+        mask = (t >= t_start) & (t <= t_end)
+        return f['log']['position'][:][mask]
+
+
+if __name__ == "__main__":
+    frames = int(sys.argv[1]) if len(sys.argv) > 1 else 10000000
+
+    tmpdir = tempfile.TemporaryDirectory()
+    basename = os.path.join(tmpdir.name, "log")
+    t = np.arange(1, frames + 1) * 0.01
+    with h5py.File(f"{basename}.h5", 'w') as f:
+        group = f.create_group('log')
+        group.create_dataset('t', data=t, chunks=(10000,))
+        group.create_dataset('position', data=np.sin(t).astype('f'), chunks=(10000,))
+    t_start = 0.5 * frames * 0.01
+    t_end = t_start + 100.0
+
+    reader = LogReader(basename)
+    results = {}
+    for name, fn in [
+            ('load and mask', lambda: load_and_mask(basename, t_start, t_end)),
+            ('first query', lambda: reader.read('log', t_start, t_end, columns=['position'])['position']),
+            ('next query', lambda: reader.read('log', t_start + 100.0, t_end + 100.0, columns=['position'])['position']),
+    ]:
+        start = time.perf_counter()
+        data = fn()
+        results[name] = time.perf_counter() - start
+        print(f"{name:>14}: {1e3 * results[name]:10.2f} ms ({len(data)} frames, "
+              f"{results['load and mask'] / results[name]:.1f}x)")
+    reader.close()
+    tmpdir.cleanup()
@@ -0,0 +1,70 @@
+"""
+Write throughput and file size of a long, high-rate log under different storage
+layouts (dtype, chunking, and compression).
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+from discrete_model import DiscreteModel
+from logger import Logger
+
+from benchmarks.common import temp_world
+
+LAYOUTS = {
+    'float32': dict(),
+    'float64': dict(dtype='f8'),
+    'float32 gzip': dict(compression='gzip', compression_opts=4),
+    'float32 shuffle+gzip': dict(compression='gzip', compression_opts=4, shuffle=True),
+    'float32 lzf': dict(compression='lzf'),
+    'float32 shuffle+lzf': dict(compression='lzf', shuffle=True),
+}
+
+class Oscillator(DiscreteModel):
+    """
+    Something vaguely realistic to log: a noisy, decaying oscillation.
+    """
+    def compute_inputs(self):
+        self.x = np.exp(-0.001 * self.t) * np.sin(self.t) + 1e-3 * np.sin(97.0 * self.t)
+        self.u = 0.0
+
+def bench_layout(frames: int, columns: int, **options):
+    world, tmpdir = temp_world()
+    source = Oscillator(world, 'source', dt=0.01)
+    logger = Logger(world, 'log', dt=0.01, **options)
+    for i in range(columns):
+        logger.add_input(f'column_{i}', 'source.y')
+    world.setup_logging()
+
+    # Fill the buffers outside the timing, so we only measure the writes.
+    write_time = 0.0
+    for i in range(1, frames + 1):
+        source.update(i * 0.01)
+        if logger.index == logger.buffer_size:
+            start = time.perf_counter()
+            logger.dump_buffers()
+            write_time += time.perf_counter() - start
+        logger.update(i * 0.01)
+    start = time.perf_counter()
+    logger.finalize()
+    world.f.flush()
+    write_time += time.perf_counter() - start
+
+    filename = world.f.filename
+    world.finish_logging()
+    size = os.path.getsize(filename)
+    tmpdir.cleanup()
+
+    raw_bytes = frames * (8 + columns * logger.dtype.itemsize)
+    return raw_bytes / write_time, size
+
+if __name__ == "__main__":
+    frames = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    columns = 4
+
+    print(f"{frames} frames, {columns} columns")
+    for name, options in LAYOUTS.items():
+        throughput, size = bench_layout(frames, columns, **options)
+        print(f"{name:>22}: {throughput / 1e6:10.1f} MB/s {size / 1e6:10.2f} MB on disk")
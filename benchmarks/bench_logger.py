@@ -0,0 +1,63 @@
+"""
+Logger performance: frames/second for a logger on its own, and the cost of logging
+as a fraction of the example scenario's run time.
+"""
+import sys
+
+import numpy.random as npr
+
+from logger import Logger
+from scenario import build_scenario
+
+from benchmarks.common import ConstantInput, temp_world, rate
+
+def bench_logger_update(frames: int, columns: int = 10) -> float:
+    world, tmpdir = temp_world()
+    source = ConstantInput(world, 'source', dt=0.01)
+    logger = Logger(world, 'log', dt=0.01)
+    for i in range(columns):
+        logger.add_input(f'column_{i}', 'source.y')
+    world.setup_logging()
+
+    def run():
+        for i in range(1, frames + 1):
+            logger.update(i * 0.01)
+        logger.finalize()
+
+    frames_per_second = rate(frames, run)
+    world.finish_logging()
+    tmpdir.cleanup()
+    return frames_per_second
+
+def bench_example(duration: float, logging: bool, repeat: int = 5) -> float:
+    """Simulated seconds per second for the example (the best of repeat runs)."""
+    return max(run_example(duration, logging) for i in range(repeat))
+
+def run_example(duration: float, logging: bool) -> float:
+    world, tmpdir = temp_world(rng=npr.default_rng(seed=0))
+    build_scenario(world, 5.0, logging=logging)
+    if logging:
+        world.setup_logging()
+    else:
+        world.compile()
+
+    def run():
+        while world.t < duration:
+            world.cycle()
+        world.finish_logging()
+
+    seconds_per_second = rate(duration, run)
+    tmpdir.cleanup()
+    return seconds_per_second
+
+if __name__ == "__main__":
+    frames = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    duration = float(sys.argv[2]) if len(sys.argv) > 2 else 100.0
+
+    print(f"logger alone: {bench_logger_update(frames):12.1f} frames/s (10 columns)")
+
+    with_logging = bench_example(duration, True)
+    without_logging = bench_example(duration, False)
+    print(f"example without logging: {without_logging:12.1f} simulated s/s")
+    print(f"example with logging:    {with_logging:12.1f} simulated s/s")
+    print(f"logging fraction of run time: {100 * (1 - with_logging / without_logging):.1f}%")
@@ -0,0 +1,46 @@
+"""
+Runs/second for dispersed runs of the example scenario, looping over separate World
+instances versus one batched world.
+"""
+import os
+import sys
+import tempfile
+
+import numpy.random as npr
+
+from world import World
+from scenario import build_scenario
+from monte_carlo import run_batch
+
+from benchmarks.common import rate
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    looped_count = min(count, 20) # looping is slow, so extrapolate from a few runs
+    duration = 10.0
+
+    rng = npr.default_rng(seed=1)
+    m = rng.normal(4.0, 0.4, count)
+    k = rng.normal(2.0, 0.2, count)
+    b = rng.normal(3.0, 0.3, count)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        def looped():
+            for i in range(looped_count):
+                world = World(os.path.join(tmpdir, f"looped_{i}"), rng=npr.default_rng(seed=i))
+                build_scenario(world, 5.0, m=m[i], k=k[i], b=b[i])
+                world.setup_logging()
+                while world.t < duration:
+                    world.cycle()
+                world.finish_logging()
+
+        def batched():
+            run_batch(duration, 5.0, basename=os.path.join(tmpdir, "batched"), m=m, k=k, b=b)
+
+        looped_rate = rate(looped_count, looped)
+        batched_rate = rate(count, batched)
+
+    print(f"{count} runs of {duration} time units")
+    print(f" looped: {looped_rate:12.1f} runs/s")
+    print(f"batched: {batched_rate:12.1f} runs/s")
+    print(f"speedup: {batched_rate / looped_rate:12.1f}x")
@@ -0,0 +1,34 @@
+"""
+Noise samples/second for GaussianNoise, drawing samples one update at a time
+(block_size=1, like drawing from the generator every update) versus in blocks,
+for scalar and vector-valued, white and Gauss-Markov noise.
+"""
+import sys
+
+from benchmarks.common import temp_world, rate
+from gaussian_noise import GaussianNoise
+
+def bench_noise(block_size: int, shape: tuple, tau: float, steps: int):
+    world, tmpdir = temp_world()
+    noise = GaussianNoise(world, 'noise', dt=0.01, sigma=0.1, tau=tau, shape=shape,
+                          block_size=block_size)
+
+    def run():
+        for i in range(steps):
+            noise.generate()
+
+    updates_per_second = rate(steps, run)
+    world.finish_logging()
+    tmpdir.cleanup()
+    return updates_per_second
+
+if __name__ == "__main__":
+    steps = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+
+    for shape in [(), (100,)]:
+        for tau in [None, 1.0]:
+            single = bench_noise(1, shape, tau, steps)
+            block = bench_noise(1024, shape, tau, steps)
+            label = f"shape {shape}, {'white' if tau is None else 'Gauss-Markov'}"
+            print(f"{label:>30}: {single:10.0f} updates/s one at a time, "
+                  f"{block:10.0f} updates/s in blocks ({block / single:.1f}x)")
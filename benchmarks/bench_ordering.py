@@ -0,0 +1,52 @@
+"""
+Closed-loop fidelity versus controller rate, with the controller seeing the
+sensor's reading from the same frame (dependency ordering) versus from the frame
+before (what you got when the models were added in the wrong order).
+
+Fidelity is the RMS error in the mass's position against a reference run with
+the sensor and controller at the plant's rate; cost is model updates per
+simulated second.
+"""
+import sys
+
+import numpy as np
+import numpy.random as npr
+
+from benchmarks.common import temp_world
+from gaussian_noise import GaussianNoise
+from mass_spring_damper import MassSpringDamper
+from pid_controller import PIDController
+
+PLANT_DT = 0.01
+
+def run(controller_dt: float, stale: bool, duration: float):
+    world, tmpdir = temp_world(rng=npr.default_rng(0))
+    msd = MassSpringDamper(world, 'msd', dt=PLANT_DT, m=4.0, k=2.0, b=3.0)
+    sensor = GaussianNoise(world, 'sensor', dt=controller_dt, sigma=0.0)
+    pid = PIDController(world, 'pid', dt=controller_dt, kp=40.0, ki=2.0, kd=4.0, setpoint=5.0)
+    msd.add_input('force', 'pid.y', delay=True)
+    sensor.add_input('process', 'msd.y', 0)
+    pid.add_input('process', 'sensor.y', delay=stale)
+
+    position = []
+    while world.t < duration - 1e-9:
+        world.cycle()
+        if msd.t == world.t:
+            position.append(msd.y[0])
+    world.finish_logging()
+    tmpdir.cleanup()
+
+    updates = 1.0 / PLANT_DT + 2.0 / controller_dt
+    return np.array(position), updates
+
+if __name__ == "__main__":
+    duration = float(sys.argv[1]) if len(sys.argv) > 1 else 20.0
+    reference, updates = run(PLANT_DT, False, duration)
+
+    print(f"{'controller dt':>14} {'ordering':>12} {'rms error':>10} {'updates/s':>10}")
+    for controller_dt in [0.02, 0.05, 0.1]:
+        for stale in [True, False]:
+            position, updates = run(controller_dt, stale, duration)
+            error = np.sqrt(np.mean((position - reference) ** 2))
+            label = "stale" if stale else "same-frame"
+            print(f"{controller_dt:14.2f} {label:>12} {error:10.4f} {updates:10.0f}")
@@ -0,0 +1,54 @@
+"""
+Wall time for a world of several independent plant/controller loops, run serially
+versus split across worker processes with run_partitioned (one loop per worker).
+
+Each plant integrates with solve_ivp so that there's real work per step to share
+out; the loops only meet in a slow logger, whose inputs go through shared memory.
+"""
+import os
+import sys
+import tempfile
+import time
+
+import numpy.random as npr
+
+from logger import Logger
+from mass_spring_damper import MassSpringDamper
+from partition import run_partitioned
+from pid_controller import PIDController
+from world import World
+
+def build_plants(world, plants: int = 4):
+    for i in range(plants):
+        msd = MassSpringDamper(world, f"msd_{i}", dt=0.01, k=2.0 + i, integrator='solve_ivp')
+        pid = PIDController(world, f"pid_{i}", dt=0.1, kp=40.0, ki=2.0, kd=4.0, setpoint=1.0 + i)
+        msd.add_input('force', f"pid_{i}.y", delay=True)
+        pid.add_input('process', f"msd_{i}.y", 0)
+        log = Logger(world, f"log_{i}", dt=0.01)
+        log.add_input('position', f"msd_{i}.y", 0)
+
+    slow_log = Logger(world, "slow_log", dt=1.0)
+    for i in range(plants):
+        slow_log.add_input(f"e_{i}", f"pid_{i}.e")
+
+if __name__ == "__main__":
+    plants = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    duration = float(sys.argv[2]) if len(sys.argv) > 2 else 20.0
+    print(f"{plants} loops, {duration} s, {os.cpu_count()} CPUs")
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        world = World(os.path.join(tmpdir, "serial"), rng=npr.default_rng(0))
+        build_plants(world, plants)
+        world.setup_logging()
+        start = time.perf_counter()
+        while world.t < duration:
+            world.cycle()
+        world.finish_logging()
+        serial = time.perf_counter() - start
+        print(f"      serial: {serial:8.3f} s")
+
+        start = time.perf_counter()
+        run_partitioned(build_plants, duration, basename=os.path.join(tmpdir, "partitioned"),
+                        workers=plants, min_dt=1.0, plants=plants)
+        partitioned = time.perf_counter() - start
+        print(f" partitioned: {partitioned:8.3f} s (including process start-up), {serial / partitioned:.2f}x")
@@ -0,0 +1,55 @@
+"""
+Updates/second for a many-channel controller, as one PIDController per channel
+versus a single PIDBank with a channel each.
+"""
+import sys
+
+import numpy as np
+
+from benchmarks.common import temp_world, rate
+from discrete_model import DiscreteModel
+from pid_bank import PIDBank
+from pid_controller import PIDController
+
+class VectorInput(DiscreteModel):
+    """A model with a constant vector output, one value per channel."""
+    def __init__(self, world, name: str, channels: int, dt: float = 0.1):
+        super().__init__(world, name, dt=dt)
+        self.y = np.linspace(0.0, 1.0, channels)
+
+    def compute_inputs(self):
+        pass
+
+    def compute_outputs(self):
+        pass
+
+def bench_pid_bank(bank: bool, channels: int, steps: int):
+    world, tmpdir = temp_world()
+    VectorInput(world, 'process', channels, dt=0.1)
+    if bank:
+        pid = PIDBank(world, 'pid', channels, dt=0.1, kp=2.0, ki=0.5, kd=0.1, setpoint=5.0,
+                      u_min=-10.0, u_max=10.0, tau=0.05)
+        pid.add_input('process', 'process.y')
+    else:
+        for i in range(channels):
+            pid = PIDController(world, f'pid_{i}', dt=0.1, kp=2.0, ki=0.5, kd=0.1, setpoint=5.0)
+            pid.add_input('process', 'process.y', i)
+    world.compile()
+
+    def run():
+        for i in range(steps):
+            world.cycle()
+
+    steps_per_second = rate(steps, run)
+    world.finish_logging()
+    tmpdir.cleanup()
+    return steps_per_second
+
+if __name__ == "__main__":
+    steps = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+
+    for channels in [1, 10, 100]:
+        separate = bench_pid_bank(False, channels, steps)
+        bank = bench_pid_bank(True, channels, steps)
+        print(f"{channels:>4} channels: {separate:10.1f} steps/s with PIDControllers, "
+              f"{bank:10.1f} steps/s with a PIDBank ({bank / separate:.1f}x)")
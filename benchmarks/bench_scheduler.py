@@ -0,0 +1,36 @@
+"""
+Frames/second and model updates/second for a world with many models at mixed rates.
+"""
+import sys
+
+from benchmarks.common import ConstantInput, temp_world, rate
+
+RATES = [0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0]
+
+def build_world(count: int):
+    world, tmpdir = temp_world()
+    for i in range(count):
+        ConstantInput(world, f'model_{i}', dt=RATES[i % len(RATES)])
+    return world, tmpdir
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    duration = float(sys.argv[2]) if len(sys.argv) > 2 else 10.0
+
+    world, tmpdir = build_world(count)
+    world.cycle() # builds the schedule
+
+    frames = int(round(duration / world.scheduler.base_dt))
+    updates = sum(int(round(duration / model.dt)) for model in world.models.values())
+
+    def run():
+        for i in range(frames):
+            world.cycle()
+
+    frames_per_second = rate(frames, run)
+    print(f"{count} models, hyperperiod {world.scheduler.hyperperiod} ticks, {len(world.scheduler.frames)} frames")
+    print(f"{frames_per_second:12.1f} frames/s")
+    print(f"{frames_per_second * updates / frames:12.1f} model updates/s")
+
+    world.finish_logging()
+    tmpdir.cleanup()
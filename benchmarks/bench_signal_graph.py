@@ -0,0 +1,51 @@
+"""
+Microbenchmark of input resolution on a world with many connections, before and
+after compiling the world.
+"""
+import sys
+
+from benchmarks.common import ConstantInput, temp_world, rate
+
+def build_world(sources: int, connections: int):
+    world, tmpdir = temp_world()
+    for i in range(sources):
+        ConstantInput(world, f'source_{i}', dt=0.1, value=float(i))
+
+    sink = ConstantInput(world, 'sink', dt=0.1)
+    for j in range(connections):
+        sink.add_input(f'input_{j}', f'source_{j % sources}.y')
+    return world, sink, tmpdir
+
+if __name__ == "__main__":
+    sources = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    connections = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    repeats = 200
+
+    world, sink, tmpdir = build_world(sources, connections)
+    input_names = list(sink.inputs)
+
+    def read_all():
+        for i in range(repeats):
+            for input_name in input_names:
+                sink.get_input(input_name)
+
+    by_name = rate(repeats * connections, read_all)
+    world.compile()
+    compiled = rate(repeats * connections, read_all)
+
+    # This is how the loggers read their inputs
+    accessors = list(sink.accessors.values())
+    def call_all():
+        for i in range(repeats):
+            for accessor in accessors:
+                accessor()
+    direct = rate(repeats * connections, call_all)
+
+    print(f"{connections} connections from {sources} models")
+    print(f"  by name: {by_name:12.1f} reads/s")
+    print(f" compiled: {compiled:12.1f} reads/s")
+    print(f"   direct: {direct:12.1f} reads/s")
+    print(f"  speedup: {compiled / by_name:12.1f}x (get_input), {direct / by_name:.1f}x (direct)")
+
+    world.finish_logging()
+    tmpdir.cleanup()
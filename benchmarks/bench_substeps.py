@@ -0,0 +1,54 @@
+"""
+Wall time for the example loop with the plant scheduled at 100 Hz (and a 100 Hz
+logger), versus scheduled at the controller's 10 Hz with 0.01 s substeps sent
+straight to the logger in bulk.
+"""
+import sys
+import time
+
+import numpy.random as npr
+
+from benchmarks.common import temp_world
+from gaussian_noise import GaussianNoise
+from logger import Logger
+from mass_spring_damper import MassSpringDamper
+from pid_controller import PIDController
+
+def build_world(substeps: bool):
+    world, tmpdir = temp_world(rng=npr.default_rng(0))
+    if substeps:
+        msd = MassSpringDamper(world, 'msd', dt=0.1, substep=0.01, m=4.0, k=2.0, b=3.0)
+        log = Logger(world, 'high_rate_log', dt=None)
+        msd.log_substeps(log)
+    else:
+        msd = MassSpringDamper(world, 'msd', dt=0.01, m=4.0, k=2.0, b=3.0)
+        log = Logger(world, 'high_rate_log', dt=0.01)
+    sensor = GaussianNoise(world, 'sensor', dt=0.1, sigma=0.01)
+    pid = PIDController(world, 'pid', dt=0.1, kp=40.0, ki=2.0, kd=4.0, setpoint=5.0)
+    msd.add_input('force', 'pid.y', delay=True)
+    sensor.add_input('process', 'msd.y', 0)
+    pid.add_input('process', 'sensor.y')
+    log.add_input('position', 'msd.y', 0)
+    log.add_input('velocity', 'msd.x', 1)
+    log.add_input('force', 'msd.u')
+    world.setup_logging()
+    return world, tmpdir
+
+if __name__ == "__main__":
+    duration = float(sys.argv[1]) if len(sys.argv) > 1 else 1000.0
+
+    for substeps in [False, True]:
+        world, tmpdir = build_world(substeps)
+        frames = 0
+        start = time.perf_counter()
+        while world.t < duration - 1e-9:
+            world.cycle()
+            frames += 1
+        elapsed = time.perf_counter() - start
+        logged = world.models['high_rate_log'].total_logged + world.models['high_rate_log'].index
+        world.finish_logging()
+        tmpdir.cleanup()
+
+        label = "10 Hz + substeps" if substeps else "100 Hz"
+        print(f"{label:>17}: {frames:8d} frames, {logged:8d} samples logged, {elapsed:7.3f} s, "
+              f"{duration / elapsed:10.0f} simulated s/s")
@@ -0,0 +1,43 @@
+"""
+Shared helpers for the benchmark scripts. Run the benchmarks from the repository
+root, e.g.
+
+    python -m benchmarks.bench_integrators
+"""
+import os
+import tempfile
+import time
+
+from discrete_model import DiscreteModel
+from world import World
+
+class ConstantInput(DiscreteModel):
+    """
+    A model with a constant output, for driving other models in benchmarks.
+    """
+    def __init__(self, world, name: str, dt: float = 0.1, value: float = 1.0):
+        super().__init__(world, name, dt=dt)
+        self.value = value
+        self.y = value
+
+    def compute_inputs(self):
+        self.x = self.value
+        self.u = 0.0
+
+def temp_world(**kwargs):
+    """
+    Make a world whose hdf5 file lives in a temporary directory (so benchmarks don't
+    leave files lying around). Returns the world and the TemporaryDirectory, which
+    should be cleaned up after world.finish_logging().
+    """
+    tmpdir = tempfile.TemporaryDirectory()
+    world = World(os.path.join(tmpdir.name, "bench"), **kwargs)
+    return world, tmpdir
+
+def rate(count: int, fn) -> float:
+    """
+    Call fn() and return count / (elapsed wall time in seconds).
+    """
+    start = time.perf_counter()
+    fn()
+    return count / (time.perf_counter() - start)
@@ -0,0 +1,25 @@
+"""
+Profiles the example scenario and prints the per-model report.
+"""
+import sys
+
+import numpy.random as npr
+
+from scenario import build_scenario
+
+from benchmarks.common import temp_world
+
+if __name__ == "__main__":
+    duration = float(sys.argv[1]) if len(sys.argv) > 1 else 100.0
+
+    world, tmpdir = temp_world(rng=npr.default_rng(seed=0))
+    build_scenario(world, 5.0)
+    world.enable_profiling()
+    world.setup_logging()
+
+    while world.t < duration:
+        world.cycle()
+    world.finish_logging()
+
+    print(world.profiler.report())
+    tmpdir.cleanup()
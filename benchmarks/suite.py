@@ -0,0 +1,251 @@
+"""
+Benchmark suite for the simulation loop, integrators, logger, and plotter.
+
+Each scenario runs in its own subprocess (so that peak memory is measured for that
+scenario alone), and the results can be saved as JSON and compared against a saved
+baseline:
+
+    python -m benchmarks.suite --output baseline.json
+    # ... change things ...
+    python -m benchmarks.suite --baseline baseline.json
+
+Use --quick for a fast smoke run with smaller problem sizes. Everything runs offline,
+and plotting uses matplotlib's Agg backend, so no display is needed.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+SCENARIOS = ('example', 'mixed_rate', 'high_rate_logging', 'plot_analyze')
+
+# Metrics ending in these are better when larger; everything else is better smaller.
+HIGHER_IS_BETTER = ('_per_s',)
+
+def peak_memory_mb() -> float:
+    """Peak resident set size of this process, in MB (ru_maxrss is in kB on Linux)."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+def bench_example(tmpdir: str, quick: bool):
+    """The world.py example, with logging."""
+    import numpy.random as npr
+    from world import World
+    from scenario import build_scenario
+
+    duration = 20.0 if quick else 200.0
+    world = World(os.path.join(tmpdir, "example"), rng=npr.default_rng(seed=0))
+    build_scenario(world, 5.0)
+    world.setup_logging()
+
+    start = time.perf_counter()
+    frames = 0
+    while world.t < duration:
+        world.cycle()
+        frames += 1
+    world.finish_logging()
+    elapsed = time.perf_counter() - start
+
+    return {
+        'frames_per_s': frames / elapsed,
+        'simulated_s_per_s': duration / elapsed,
+    }
+
+def bench_mixed_rate(tmpdir: str, quick: bool):
+    """100 models (plants, sensors, and controllers) at mixed rates."""
+    import numpy.random as npr
+    from world import World
+    from mass_spring_damper import MassSpringDamper
+    from gaussian_noise import GaussianNoise
+    from pid_controller import PIDController
+
+    duration = 2.0 if quick else 20.0
+    world = World(os.path.join(tmpdir, "mixed_rate"), rng=npr.default_rng(seed=0))
+    rates = [0.01, 0.02, 0.05, 0.1, 0.2]
+    for i in range(33):
+        dt = rates[i % len(rates)]
+        msd = MassSpringDamper(world, f'msd_{i}', dt=dt)
+        sensor = GaussianNoise(world, f'sensor_{i}', dt=2 * dt, sigma=0.01)
+        pid = PIDController(world, f'pid_{i}', dt=2 * dt)
+        msd.add_input('force', f'pid_{i}.y', delay=True)
+        sensor.add_input('process', f'msd_{i}.y', 0)
+        pid.add_input('process', f'sensor_{i}.y')
+    extra = MassSpringDamper(world, 'msd_extra', dt=0.5) # to make it an even 100
+    extra.add_input('force', 'pid_0.y')
+    world.compile()
+
+    start = time.perf_counter()
+    frames = 0
+    while world.t < duration:
+        world.cycle()
+        frames += 1
+    elapsed = time.perf_counter() - start
+    world.finish_logging()
+
+    updates = sum(round(duration / model.dt) for model in world.models.values())
+    return {
+        'frames_per_s': frames / elapsed,
+        'model_updates_per_s': updates / elapsed,
+    }
+
+def bench_high_rate_logging(tmpdir: str, quick: bool):
+    """A long run of a single high-rate logger."""
+    from world import World
+    from logger import Logger
+    from benchmarks.common import ConstantInput
+
+    steps = 100000 if quick else 1000000
+    basename = os.path.join(tmpdir, "high_rate_logging")
+    world = World(basename)
+    source = ConstantInput(world, 'source', dt=0.001)
+    logger = Logger(world, 'log', dt=0.001)
+    for i in range(8):
+        logger.add_input(f'column_{i}', 'source.y')
+    world.setup_logging()
+
+    start = time.perf_counter()
+    for i in range(steps):
+        world.cycle()
+    world.finish_logging()
+    elapsed = time.perf_counter() - start
+
+    size = os.path.getsize(f"{basename}.h5")
+    return {
+        'steps_per_s': steps / elapsed,
+        'file_write_bytes_per_s': size / elapsed,
+        'file_size_mb': size / 1e6,
+    }
+
+def bench_plot_analyze(tmpdir: str, quick: bool):
+    """Plotter.analyze and Plotter.plot on a large log file."""
+    import h5py
+    import matplotlib
+    matplotlib.use('Agg')
+    from plotter import Plotter
+
+    frames = 200000 if quick else 5000000
+    basename = os.path.join(tmpdir, "plot_analyze")
+
+    # Write the file directly (we're not timing this part)
+    t = np.arange(1, frames + 1) * 0.01
+    e = 5.0 * np.exp(-t / 10.0) * np.cos(t)
+    with h5py.File(f"{basename}.h5", 'w') as f:
+        group = f.create_group('low_rate_log')
+        group.create_dataset('t', data=t, chunks=(10000,))
+        group.create_dataset('e', data=e.astype('f'), chunks=(10000,))
+        group.create_dataset('setpoint', data=np.full(frames, 5.0, dtype='f'), chunks=(10000,))
+
+    plotter = Plotter(basename)
+    start = time.perf_counter()
+    plotter.analyze('low_rate_log', 'e')
+    analyze_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    plotter.plot('low_rate_log')
+    plotter.fig.canvas.draw()
+    plot_time = time.perf_counter() - start
+    plotter.close()
+
+    return {
+        'analyze_samples_per_s': frames / analyze_time,
+        'plot_samples_per_s': frames / plot_time,
+        'analyze_s': analyze_time,
+        'plot_s': plot_time,
+    }
+
+BENCHMARKS = {
+    'example': bench_example,
+    'mixed_rate': bench_mixed_rate,
+    'high_rate_logging': bench_high_rate_logging,
+    'plot_analyze': bench_plot_analyze,
+}
+
+def run_scenario(name: str, quick: bool):
+    """Run one scenario in this process, returning its metrics."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        metrics = BENCHMARKS[name](tmpdir, quick)
+    metrics['peak_memory_mb'] = peak_memory_mb()
+    return metrics
+
+def run_in_subprocess(name: str, quick: bool):
+    """Run one scenario in a fresh interpreter, returning its metrics."""
+    command = [sys.executable, '-m', 'benchmarks.suite', '--scenario', name]
+    if quick:
+        command.append('--quick')
+    output = subprocess.run(command, check=True, stdout=subprocess.PIPE, text=True).stdout
+    return json.loads(output)
+
+def compare(results, baseline, threshold: float):
+    """
+    Compare results against a baseline, returning a list of (scenario, metric, ratio,
+    regressed) tuples, where ratio > 1 is always an improvement.
+    """
+    comparisons = []
+    for scenario, metrics in results['results'].items():
+        for metric, value in metrics.items():
+            old = baseline['results'].get(scenario, {}).get(metric)
+            if old is None or old == 0.0 or value == 0.0:
+                continue
+            if metric.endswith(HIGHER_IS_BETTER):
+                ratio = value / old
+            else:
+                ratio = old / value
+            comparisons.append((scenario, metric, ratio, ratio < 1.0 - threshold))
+    return comparisons
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--quick', action='store_true', help="smaller problem sizes")
+    parser.add_argument('--only', nargs='+', choices=SCENARIOS, help="scenarios to run")
+    parser.add_argument('--output', help="write results to this JSON file")
+    parser.add_argument('--baseline', help="compare against this JSON file")
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help="fractional slowdown that counts as a regression (default 0.1)")
+    parser.add_argument('--scenario', choices=SCENARIOS, help=argparse.SUPPRESS) # used internally
+    args = parser.parse_args()
+
+    if args.scenario is not None:
+        # We're the subprocess for a single scenario.
+        print(json.dumps(run_scenario(args.scenario, args.quick)))
+        return
+
+    results = {
+        'meta': {
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'quick': args.quick,
+        },
+        'results': {},
+    }
+    for name in args.only or SCENARIOS:
+        print(f"running {name}...", file=sys.stderr)
+        results['results'][name] = run_in_subprocess(name, args.quick)
+        for metric, value in results['results'][name].items():
+            print(f"  {metric:>24}: {value:14.3f}")
+
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = 0
+        print(f"compared to {args.baseline} (ratio > 1 is better):")
+        for scenario, metric, ratio, regressed in compare(results, baseline, args.threshold):
+            flag = "  REGRESSION" if regressed else ""
+            print(f"  {scenario:>18} {metric:>24}: {ratio:8.3f}x{flag}")
+            regressions += regressed
+        if regressions > 0:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
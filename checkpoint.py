@@ -0,0 +1,89 @@
+import io
+import json
+
+import numpy as np
+
+FORMAT_VERSION = 1
+
+def save_checkpoint(world, file=None):
+    """
+    Save everything it takes to pick a world up where it left off: the clock, the
+    random number generators' states (the world's, and any model's own, saved as its
+    'rng' state), any one-shot events that haven't happened yet,
+    and the state of every model (see Model.get_state), including the frames each
+    logger has buffered.
+
+    The checkpoint is a compressed .npz file. If file (a path or a file object) is
+    None, this returns the checkpoint as bytes instead.
+
+    Things that don't change as the world runs (the models, their parameters, and
+    their connections) aren't saved, so to restore a checkpoint, you need to build
+    the same world again first (e.g. with the same scenario function).
+    """
+    arrays = {
+        'version': np.array(FORMAT_VERSION),
+        'world/t': np.array(world.t),
+        'world/rng': np.array(json.dumps(world.rng.bit_generator.state, default=lambda value: value.tolist())),
+    }
+    events = world.pending_events()
+    arrays['world/event_t'] = np.array([t for t, model in events], dtype=float)
+    arrays['world/event_model'] = np.array([model.name for t, model in events], dtype=str)
+
+    for name in world.order:
+        for attribute, value in world.models[name].get_state().items():
+            arrays[f"models/{name}/{attribute}"] = value
+
+    if file is None:
+        buffer = io.BytesIO()
+        np.savez_compressed(buffer, **arrays)
+        return buffer.getvalue()
+
+    np.savez_compressed(file, **arrays)
+
+def load_checkpoint(world, source, restore_rng: bool = True):
+    """
+    Restore a checkpoint from save_checkpoint() into a world with the same models.
+
+    Args:
+        world: the world to restore into (which may be the one that was saved, to go
+            back in time, or a new one, to resume or fork a run)
+        source: the checkpoint, as bytes, a path, or a file object
+        restore_rng: if False, the world (and each model with a generator of its own)
+            keeps its own random number generator state, e.g. so that runs forked from
+            the same checkpoint get different noise
+    """
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+
+    states = {}
+    with np.load(source) as data:
+        if int(data['version']) != FORMAT_VERSION:
+            raise ValueError(f"unsupported checkpoint version {int(data['version'])}")
+        t = float(data['world/t'])
+        rng_state = json.loads(str(data['world/rng']))
+        events = list(zip(data['world/event_t'].tolist(), data['world/event_model'].tolist()))
+
+        for key in data.files:
+            if not key.startswith("models/"):
+                continue
+            name, attribute = key[len("models/"):].rsplit('/', 1)
+            states.setdefault(name, {})[attribute] = data[key]
+
+    missing = set(world.models) ^ set(states)
+    if len(missing) > 0:
+        raise KeyError(f"checkpoint doesn't match the world's models: {', '.join(sorted(missing))}")
+
+    # Anything still on its way to the file has to get there before loggers rewind.
+    if world.writer is not None:
+        world.writer.queue.join()
+        world.writer.check()
+
+    for name in world.order:
+        if not restore_rng:
+            states[name].pop('rng', None)
+        world.models[name].set_state(states[name])
+
+    world.t = t
+    world.events = [(event_t, world.models[name]) for event_t, name in events]
+    if restore_rng:
+        world.rng.bit_generator.state = rng_state
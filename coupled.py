@@ -0,0 +1,129 @@
+import numpy as np
+from scipy.integrate import solve_ivp
+
+from dynamic_model import DynamicModel
+
+class CoupledGroup:
+    """
+    A group of dynamic models at the same rate that get integrated together, in a
+    single solve_ivp call on their stacked state vectors, rather than each paying the
+    solver's overhead separately.
+
+    The models' states get gathered into one stacked array before integrating, and
+    the result gets written back into each model's x in place (so x stays wherever
+    it's bound, e.g. in the world's StateStore).
+
+    The group takes the place of its models in the world's schedule, at the position
+    of the first one, and updates them all at once: compute_inputs() for every model,
+    then the combined integration, then finish_update() for every model (so their
+    outputs and any substep loggers get the same treatment as in update()). So couple()
+    only puts models in a group if none of them reads (without a delay) from another
+    member, or from anything in between them in the update order.
+    """
+    def __init__(self, models):
+        self.models = list(models)
+        first = self.models[0]
+        self.name = "+".join(model.name for model in self.models)
+        self.dt = first.dt
+        self.t = first.t
+        self.method = first.method
+        self.rtol = first.rtol
+        self.atol = first.atol
+
+        # The members' values for delayed inputs (see Model.hold)
+        self.latches = [latch for model in self.models for latch in model.latches.values()]
+
+        # Where each model's state goes in the stack
+        self.shapes = [np.shape(model.x) for model in self.models]
+        sizes = [int(np.prod(shape)) for shape in self.shapes]
+        offsets = np.cumsum([0] + sizes)
+        self.slices = [slice(start, end) for start, end in zip(offsets[:-1], offsets[1:])]
+
+        self.state = np.zeros(offsets[-1])
+
+    def dynamics(self, t, state):
+        """
+        The combined dynamics of all of the models in the group.
+        """
+        xdot = np.empty_like(state)
+        for model, piece, shape in zip(self.models, self.slices, self.shapes):
+            xdot[piece] = np.ravel(model.dynamics(t, state[piece].reshape(shape)))
+        return xdot
+
+    def hold(self, frame: int):
+        for latch in self.latches:
+            latch.hold(frame)
+
+    def update(self, t):
+        for model, piece in zip(self.models, self.slices):
+            model.compute_inputs()
+            self.state[piece] = np.ravel(model.x)
+
+        sol = solve_ivp(
+            self.dynamics,
+            [self.t, t],
+            self.state,
+            method=self.method,
+            rtol=self.rtol,
+            atol=self.atol,
+        )
+        self.state[:] = sol.y[:,-1]
+        self.t = t
+
+        for model, piece, shape in zip(self.models, self.slices, self.shapes):
+            model.x[...] = self.state[piece].reshape(shape) # in place, wherever x is bound
+            model.nfev += sol.nfev
+            model.t = t
+            model.finish_update(t)
+
+def coupling_key(model):
+    """
+    Models with the same key can be integrated together. That's solve_ivp dynamic
+    models with the same rate and solver settings (and no substeps).
+    """
+    if not isinstance(model, DynamicModel) or model.integrator != 'solve_ivp' or model.substep is not None:
+        return None
+    return (model.dt, model.method, model.rtol, model.atol)
+
+def couple(models):
+    """
+    Given the models in update order, group up the ones that can be integrated
+    together, returning the update order with each group in place of its models.
+
+    Since a group updates all of its models at the position of the first one, a model
+    only joins a group if none of its inputs (other than delayed ones) come from the
+    group's first model or anything after it, which would change what it sees within
+    the frame. Otherwise it starts a new group.
+    """
+    position = {model.name: i for i, model in enumerate(models)}
+    filling = {} # key: the members of the group we're adding to
+    groups = []
+    for i, model in enumerate(models):
+        key = coupling_key(model)
+        if key is None:
+            continue
+        members = filling.get(key)
+        if members is not None:
+            start = position[members[0].name]
+            for input_name, (model_id, attribute, index) in model.inputs.items():
+                if input_name not in model.delayed and start <= position.get(model_id, -1) < i:
+                    members = None
+                    break
+        if members is None:
+            members = filling[key] = []
+            groups.append(members)
+        members.append(model)
+
+    replacements = {}
+    for members in groups:
+        if len(members) > 1:
+            group = CoupledGroup(members)
+            for model in members:
+                replacements[model] = group
+
+    order = []
+    for model in models:
+        unit = replacements.get(model, model)
+        if unit not in order:
+            order.append(unit)
+    return order
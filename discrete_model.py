@@ -6,6 +6,7 @@ class DiscreteModel(Model):
     class from which we can derive other discrete models, but you can
     instantiate it if you really want.
     """
+    state_attributes = Model.state_attributes + ('x', 'u', 'y')
 
     def __init__(
             self,
@@ -1,8 +1,58 @@
 import numpy as np
-from scipy.integrate import solve_ivp
+from scipy.integrate import solve_ivp, RK23, RK45, DOP853, Radau, BDF, LSODA
+from scipy.linalg import expm
 
 from model import Model
 
+INTEGRATORS = ('solve_ivp', 'zoh', 'persistent')
+
+# ODE solvers for the persistent integrator (these are the same ones solve_ivp uses)
+METHODS = {
+    'RK23': RK23,
+    'RK45': RK45,
+    'DOP853': DOP853,
+    'Radau': Radau,
+    'BDF': BDF,
+    'LSODA': LSODA,
+}
+
+def discretize_zoh(A, B, dt: float):
+    """
+    Exact zero-order-hold discretization of the continuous system xdot = A x + B u.
+    Returns (Phi, Gamma) such that x(t + dt) = Phi x(t) + Gamma u, assuming u is
+    held constant over the step.
+
+    This uses the usual trick of exponentiating the augmented matrix [[A, B], [0, 0]],
+    which gives us both Phi and Gamma out of a single call to expm.
+
+    A and B may have leading batch dimensions, in which case we discretize each
+    instance separately (this only happens once per dt, so a loop is fine).
+    """
+    n, m = B.shape[-2:]
+    batch_shape = np.broadcast_shapes(A.shape[:-2], B.shape[:-2])
+    A = np.broadcast_to(A, batch_shape + (n, n))
+    B = np.broadcast_to(B, batch_shape + (n, m))
+
+    Phi = np.zeros(batch_shape + (n, n))
+    Gamma = np.zeros(batch_shape + (n, m))
+    for i in np.ndindex(batch_shape):
+        M = np.zeros((n + m, n + m))
+        M[:n,:n] = A[i]
+        M[:n,n:] = B[i]
+        E = expm(M * dt)
+        Phi[i] = E[:n,:n]
+        Gamma[i] = E[:n,n:]
+    return Phi, Gamma
+
+def matvec(M, v):
+    """
+    Matrix-vector product which broadcasts over any leading (batch) dimensions of M
+    and v.
+    """
+    if M.ndim == 2 and v.ndim == 1:
+        return M.dot(v)
+    return np.matmul(M, v[..., None])[..., 0]
+
 class DynamicModel(Model):
     """
     A model that can be integrated over time. Generally this sets us up to use state-space
@@ -14,7 +64,46 @@ class DynamicModel(Model):
     * dynamics: compute the derivative of the state vector, often in state-space form
     * compute_outputs: setup all outputs for the model (e.g. self.y = C.dot(self.x) + D.dot(self.u))
 
+    Linear time-invariant models can also set linear = True and define state_space(),
+    which returns the (A, B) matrices. Those models get integrated exactly with a
+    zero-order hold on u (one matrix-vector product per step) instead of calling
+    solve_ivp every step. The discretization is computed and cached by the world.
+
+    For nonlinear models, the 'persistent' integrator keeps a single scipy ODE solver
+    alive from step to step (rather than starting solve_ivp from scratch every step),
+    so it keeps its step size and doesn't redo its initial step selection. Since u is
+    piecewise constant, the solver only gets restarted when u changes (or when you
+    call reset_integrator(), e.g. after changing x yourself). Use method to pick the
+    solver (e.g. 'BDF' or 'LSODA' for stiff plants).
+
+    By default, each update integrates in one step from the last update, but with
+    substep, the model takes steps of (at most) substep in between, which lets it be
+    scheduled at the rate of its inputs (e.g. the controller's) while still being
+    integrated and sampled at a higher rate. The zero-order hold takes fixed exact
+    substeps, while solve_ivp and the persistent integrator keep choosing their own
+    (adaptive) steps and just sample the state at each substep. The samples from the
+    last update are in substep_t and substep_x, and log_substeps() sends them
+    straight to a logger in one go.
+
+    In a batched world (see World), the state has a leading batch dimension, so
+    dynamics() gets an x of shape batch_shape + (n,), and should work on all the
+    instances at once.
+
+    x, u, and y are fixed arrays which get updated in place: the first assignment to
+    each one sets its shape, and after that, assigning to it (e.g. self.u = 5.0)
+    copies the value into the existing array. That way anything reading them (other
+    models, loggers) always sees the same memory, and the world can gather them all
+    into one contiguous store (see StateStore). If you hang on to one of them, make
+    a copy if you want the value rather than the live array.
     """
+    linear = False
+    state_attributes = Model.state_attributes + ('x', 'u', 'y')
+
+    # Backing arrays for x, u, and y (see bind())
+    _x = None
+    _u = None
+    _y = None
+
     def __init__(
             self,
             world,
@@ -22,14 +111,101 @@ class DynamicModel(Model):
             x = np.zeros(1),
             u = np.zeros(1),
             dt: float = 0.1,
+            integrator: str = None,
+            method: str = 'RK45',
+            rtol: float = 1e-3,
+            atol: float = 1e-6,
+            substep: float = None,
     ):
+        """
+        Args:
+            integrator: 'zoh', 'solve_ivp', or 'persistent'; if None, picks 'zoh' for
+                linear models and falls back to 'solve_ivp' for everything else
+            method: ODE solver for solve_ivp and persistent (see METHODS)
+            rtol, atol: ODE solver tolerances
+            substep: if given, the longest step to take (or sample at) in between
+                updates
+        """
         super().__init__(world, name, dt)
 
-        # initialize the state
-        self.x = x
+        if substep is not None and substep <= 0.0:
+            raise ValueError(f"substep {substep} must be positive")
+        self.substep = substep
+        self.substep_t = None # times of the substeps of the last update
+        self.substep_x = None # state at each of those times
+        self.loggers = [] # loggers that get our substeps (see log_substeps)
+
+        if method not in METHODS:
+            raise ValueError(f"unknown ODE solver method {method}")
+        self.method = method
+        self.rtol = rtol
+        self.atol = atol
+
+        if integrator is None:
+            integrator = 'zoh' if self.linear else 'solve_ivp'
+        if integrator not in INTEGRATORS:
+            raise ValueError(f"unknown integrator {integrator}")
+        if integrator == 'zoh' and not self.linear:
+            raise ValueError(f"zoh integrator requires a linear model, but {name} is not linear")
+        self.integrator = integrator
+
+        # initialize the state and the control input (one copy per instance in a
+        # batched world)
+        self.x = np.broadcast_to(x, world.batch_shape + np.shape(x))
+        self.u = np.broadcast_to(u, world.batch_shape + np.shape(u))
+
+        # state of the persistent integrator
+        self.solver = None
+        self.solver_u = None # the input the solver was started with
+        self.nfev = 0 # number of evaluations of dynamics() by the ODE solvers
+
+    @property
+    def x(self):
+        return self._x
+
+    @x.setter
+    def x(self, value):
+        if self._x is None:
+            self._x = np.array(value, dtype=float)
+        else:
+            self._x[...] = value
+
+    @property
+    def u(self):
+        return self._u
+
+    @u.setter
+    def u(self, value):
+        if self._u is None:
+            self._u = np.array(value, dtype=float)
+        else:
+            self._u[...] = value
+
+    @property
+    def y(self):
+        return self._y
 
-        # initialize the control input
-        self.u = u
+    @y.setter
+    def y(self, value):
+        if self._y is None:
+            self._y = np.array(value, dtype=float)
+        else:
+            self._y[...] = value
+
+    def bind(self, signal: str, array):
+        """
+        Move x, u, or y (given by signal) into the given array, which should have the
+        same shape, copying the current value over. From then on, the model reads and
+        updates it there.
+        """
+        current = getattr(self, signal)
+        if current is not None:
+            array[...] = current
+        setattr(self, '_' + signal, array)
+
+    def set_state(self, state):
+        super().set_state(state) # x, u, and y get copied in place
+        self.solver = None # the persistent integrator starts over from here
 
     def dynamics(self, t, x):
         """
@@ -38,6 +214,32 @@ class DynamicModel(Model):
         """
         raise NotImplementedError("expected dynamic model to have dynamics method defined")
 
+    def state_space(self):
+        """
+        For linear models, returns the continuous-time (A, B) matrices, where B is
+        n-by-m for n states and m inputs.
+        """
+        raise NotImplementedError("expected linear model to have state_space method defined")
+
+    def flat_dynamics(self, t, x):
+        """
+        dynamics() for a flat state vector, which is what the ODE solvers want (only
+        needed if we're batched).
+        """
+        return self.dynamics(t, x.reshape(self.x.shape)).ravel()
+
+    def input_vector(self):
+        """
+        Get the control input as a vector with the inputs along the last axis, so
+        that a scalar input becomes a one-element vector (for each instance, if we're
+        batched).
+        """
+        u = np.asarray(self.u, dtype=float)
+        batch_shape = self.world.batch_shape
+        if u.ndim <= len(batch_shape):
+            u = np.broadcast_to(u, batch_shape)[..., None]
+        return u
+
     def compute_outputs(self):
         """
         Post-integration step of update().
@@ -48,28 +250,167 @@ class DynamicModel(Model):
         D = np.zeros(1)
         self.y = C.dot(self.x) + D.dot(self.u)
         
+    def log_substeps(self, logger):
+        """
+        Send every substep to the given logger (see Logger.log_substeps), rather than
+        having it scheduled. The model needs a substep. The logger should have dt=None, and its inputs can be
+        our x, u, and y (which get logged at each substep, with u held) or anything
+        else (which gets logged as its current value).
+        """
+        if self.substep is None:
+            raise ValueError(f"model {self.name} has no substeps to log (give it a substep)")
+        if logger.dt is not None:
+            raise ValueError(f"logger {logger.name} needs dt=None to log the substeps of {self.name}")
+        self.loggers.append(logger)
+
+    def substep_times(self, t: float):
+        """
+        Get the times of the substeps to get from the last update to t.
+        """
+        count = max(1, int(np.ceil((t - self.t) / self.substep - 1e-9)))
+        times = self.t + (t - self.t) * np.arange(1, count + 1) / count
+        times[-1] = t
+        return times
+
+    def substep_outputs(self):
+        """
+        Get y at each substep of the last update (with u held), with a row per substep.
+        This calls compute_outputs() on each substep's state, so subclasses can do it
+        all at once instead.
+        """
+        x = self.x.copy()
+        y = []
+        for x_substep in self.substep_x:
+            self.x = x_substep
+            self.compute_outputs()
+            y.append(np.array(self.y))
+        self.x = x
+        self.compute_outputs()
+        return np.stack(y)
+
     def integrate(self, t):
         """
         Integrate the model to the given time. At the end of this function call,
         self.x should be updated to the state at time t.
         """
+        if self.substep is None:
+            self.step(t)
+            return
+
+        times = self.substep_times(t)
+        if self.substep_x is None or len(self.substep_x) != len(times):
+            self.substep_x = np.zeros((len(times),) + self.x.shape)
+
+        if self.integrator == 'solve_ivp':
+            # One solve, sampled at the substeps
+            fun = self.flat_dynamics if self.world.batch_shape else self.dynamics
+            sol = solve_ivp(fun, [self.t, t], self.x.ravel(), method=self.method,
+                            t_eval=times, rtol=self.rtol, atol=self.atol)
+            self.nfev += sol.nfev
+            self.substep_x[...] = sol.y.T.reshape(self.substep_x.shape)
+            self.x = self.substep_x[-1]
+            self.t = t
+        else:
+            for i, t_substep in enumerate(times):
+                self.step(t_substep)
+                self.substep_x[i] = self.x
+        self.substep_t = times
+
+    def step(self, t):
+        """
+        Integrate to time t in one step.
+        """
+        if self.integrator == 'zoh':
+            Phi, Gamma = self.world.discretize(self, t - self.t)
+            self.x = matvec(Phi, self.x) + matvec(Gamma, self.input_vector())
+            self.t = t
+            return
+
+        if self.integrator == 'persistent':
+            self.integrate_persistent(t)
+            return
 
         # We should maybe consider putting x and u into a single state vector just
         # for the integration step, but this isn't a current necessity (since u is
         # a discrete rather than continuous input in our system), so consider it
         # forward work.
 
-        sol = solve_ivp(
-            self.dynamics,
-            [self.t, t],
-            self.x,
-        )
+        if self.world.batch_shape:
+            # solve_ivp wants a flat state vector, so integrate all of the instances
+            # as one big system.
+            sol = solve_ivp(
+                self.flat_dynamics,
+                [self.t, t],
+                self.x.ravel(),
+                method=self.method,
+                rtol=self.rtol,
+                atol=self.atol,
+            )
+            x = sol.y[:,-1].reshape(self.x.shape)
+        else:
+            sol = solve_ivp(
+                self.dynamics,
+                [self.t, t],
+                self.x,
+                method=self.method,
+                rtol=self.rtol,
+                atol=self.atol,
+            )
+            x = sol.y[:,-1]
+        self.nfev += sol.nfev
 
         # Save new state and time
         self.t = t
 
         # Now pull the state back out of the solution and update the model's state.
-        self.x = sol.y[:,-1]
+        self.x = x
+
+    def reset_integrator(self):
+        """
+        Restart the persistent integrator from the current time and state. It picks
+        up where the last solver left off as far as step size goes.
+        """
+        first_step = None
+        if self.solver is not None:
+            first_step = self.solver.step_size
+
+        fun = self.flat_dynamics if self.world.batch_shape else self.dynamics
+        self.solver = METHODS[self.method](
+            fun,
+            self.t,
+            self.x.ravel().copy(), # the solver mustn't see us update x in place
+            np.inf, # we don't know when we'll stop
+            first_step=first_step,
+            rtol=self.rtol,
+            atol=self.atol,
+        )
+        self.solver_u = np.array(self.u, dtype=float)
+        self.nfev += self.solver.nfev # starting up takes an evaluation or two
+
+    def integrate_persistent(self, t):
+        """
+        Integrate to time t, reusing the ODE solver from previous steps. The solver is
+        free to step past t, in which case we interpolate the state at t (and next
+        time, we may not need to step at all).
+        """
+        if self.solver is None or not np.array_equal(self.u, self.solver_u):
+            self.reset_integrator()
+
+        solver = self.solver
+        nfev = solver.nfev
+        while solver.t < t:
+            message = solver.step()
+            if solver.status == 'failed':
+                raise RuntimeError(f"integration of {self.name} failed: {message}")
+        self.nfev += solver.nfev - nfev
+
+        if solver.t == t:
+            x = solver.y.copy()
+        else:
+            x = solver.dense_output()(t)
+
+        self.t = t
+        self.x = x.reshape(self.x.shape)
 
     def update(self, t):
         self.compute_inputs()
@@ -79,4 +420,15 @@ class DynamicModel(Model):
         
         self.integrate(t)
 
-        self.compute_outputs()
\ No newline at end of file
+        self.finish_update(t)
+
+    def finish_update(self, t):
+        """
+        Post-integration step of update(): compute the outputs and send the substeps
+        to our loggers. Anything that integrates us itself (like a CoupledGroup) calls
+        this afterwards, so none of it gets skipped.
+        """
+        self.compute_outputs()
+
+        for logger in self.loggers:
+            logger.log_substeps(self)
\ No newline at end of file
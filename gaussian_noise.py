@@ -1,25 +1,136 @@
+import json
+
+import numpy as np
+from scipy.signal import lfilter
+
 from discrete_model import DiscreteModel
 
 class GaussianNoise(DiscreteModel):
     """
-    A scalar, zero-mean, first-order Gaussian noise model.
+    A zero-mean Gaussian noise model, which adds noise mu to its process input. The
+    noise is white by default, or with a time constant tau, first-order Gauss-Markov
+    (exponentially correlated, with standard deviation sigma in steady state):
+
+        mu[k+1] = phi mu[k] + sigma sqrt(1 - phi^2) w[k],  phi = exp(-dt / tau)
+
+    With shape, the noise is vector-valued (e.g. shape=(3,) for a noise sample per
+    axis), and sigma and tau may be arrays with one value per element. In a batched
+    world, they may also have one value per instance.
+
+    Each noise model draws from its own generator (see World.spawn_rng), and draws
+    block_size updates' worth of samples at a time (working out the noise for all of
+    them at once), so an update only has to pick out the next sample. The samples are
+    the same whatever the block size, the other models, or their update order.
     """
+    state_attributes = DiscreteModel.state_attributes + ('mu',)
 
     def __init__(
-            self, 
+            self,
             world,
             name: str,
             dt: float = 0.1,
             sigma: float = 1.0,
+            tau: float = None,
+            shape: tuple = (),
+            block_size: int = 1024,
     ):
+        """
+        Args:
+            world: the registry of models
+            name: the name of the model
+            dt: the update period
+            sigma: the standard deviation of the noise
+            tau: correlation time constant (None for white noise)
+            shape: the shape of a noise sample (() for scalar noise)
+            block_size: how many updates' worth of samples to draw at a time
+        """
+        if np.any(np.asarray(sigma) < 0):
+            raise ValueError(f"noise {name} has a negative sigma")
+        if tau is not None and np.any(np.asarray(tau) <= 0):
+            raise ValueError(f"noise {name} needs a positive tau (or None for white noise)")
+
         super().__init__(world, name, dt=dt)
-        
+
         # set the noise parameters
-        self.sigma = sigma
+        self._sigma = sigma
+        self._tau = tau
+        self.shape = tuple(shape)
+        self.block_size = block_size
+
+        self.rng = world.spawn_rng(name)
+        self.w = None # pre-drawn standard normal samples, one row per update
+        self.samples = None # the noise they make, one row per update
+        self.position = 0 # next row of the block
+        self.block_state = None # the generator's state before drawing the block
+
+        self.mu = None
         self.generate() # first initialization of mu
 
+    @property
+    def sigma(self):
+        return self._sigma
+
+    @sigma.setter
+    def sigma(self, value):
+        self._sigma = value
+        self.rescale()
+
+    @property
+    def tau(self):
+        return self._tau
+
+    @tau.setter
+    def tau(self, value):
+        self._tau = value
+        self.rescale()
+
+    def refill(self, position: int = 0):
+        """
+        Draw the next block of samples, and work out the noise from the given
+        position on.
+        """
+        self.block_state = self.rng.bit_generator.state
+        self.w = self.rng.standard_normal((self.block_size,) + self.world.batch_shape + self.shape)
+        self.samples = np.empty_like(self.w)
+        self.position = position
+        self.rescale()
+
+    def rescale(self):
+        """
+        Work out the noise for the rest of the block (again, e.g. after sigma or tau
+        changes), carrying on from the current mu.
+        """
+        if self.w is None or self.position == len(self.w):
+            return
+        w = self.w[self.position:]
+        samples = self.samples[self.position:]
+        np.multiply(self.sigma, w, out=samples)
+        if self.tau is None:
+            return
+
+        # Gauss-Markov: mu[k+1] = phi mu[k] + sqrt(1 - phi^2) sigma w[k]
+        tau = np.asarray(self.tau, dtype=float)
+        phi = np.exp(-self.dt / tau)
+        if self.mu is None: # the first sample is in steady state
+            mu = samples[0]
+            samples = samples[1:]
+        else:
+            mu = self.mu
+        samples *= np.sqrt(-np.expm1(-2.0 * self.dt / tau))
+
+        if np.ndim(phi) == 0:
+            zi = np.broadcast_to(phi * mu, (1,) + samples.shape[1:])
+            samples[...], _ = lfilter([1.0], [1.0, -phi], samples, axis=0, zi=zi)
+        else: # per-element time constants, so one row at a time
+            for sample in samples:
+                sample += phi * mu
+                mu = sample
+
     def generate(self):
-        self.mu = self.world.rng.normal(0.0, self.sigma)
+        if self.w is None or self.position == len(self.w):
+            self.refill()
+        self.mu = self.samples[self.position]
+        self.position += 1
 
     def compute_inputs(self):
         self.x = self.get_input('process')
@@ -29,5 +140,27 @@ class GaussianNoise(DiscreteModel):
         # add noise to the process
         self.y = self.x + self.mu
 
+    def get_state(self):
+        """
+        Get the model's state, including where its generator is up to (as the state
+        before the current block, and how far into the block we are).
+        """
+        state = super().get_state()
+        state['rng'] = np.array(json.dumps(
+            {'state': self.block_state, 'position': self.position},
+            default=lambda value: value.tolist(),
+        ))
+        return state
 
-
+    def set_state(self, state):
+        """
+        Put back a state from get_state(). Without the generator's state (see
+        World.restore(restore_rng=False)), we carry on with our own samples.
+        """
+        super().set_state(state)
+        if 'rng' in state:
+            rng = json.loads(str(state['rng']))
+            self.rng.bit_generator.state = rng['state']
+            self.refill(rng['position']) # carrying on from the restored mu
+        else:
+            self.rescale()
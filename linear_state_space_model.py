@@ -0,0 +1,247 @@
+import numpy as np
+
+from dynamic_model import DynamicModel, matvec
+
+class LinearStateSpaceModel(DynamicModel):
+    """
+    A linear time-invariant model in state-space form,
+
+        xdot = A x + B u
+        y = C x + D u
+
+    The matrices get built once and cached, and only get rebuilt when one of the
+    attributes named in parameters is assigned (which also throws out the world's
+    cached discretizations of this model). Note that changing a parameter array in
+    place (e.g. model.m[0] = 2.0) doesn't count as assigning it, so do model.m = ...
+    instead.
+
+    You can use this directly by passing in the matrices (and connecting its control
+    input as 'u', if it has one), or subclass it with your own parameters and
+    build_matrices() (see MassSpringDamper).
+
+    The zero-order-hold step and the outputs are computed in place (unbatched).
+
+    In a batched world, any of the matrices can have a leading batch dimension.
+    """
+    linear = True
+
+    # Attributes that the matrices depend on
+    parameters = ('A', 'B', 'C', 'D')
+
+    def __init__(
+            self,
+            world,
+            name: str,
+            A = None,
+            B = None,
+            C = None,
+            D = None,
+            dt: float = 0.1,
+            x = None,
+            u = 0.0,
+            integrator: str = None,
+            method: str = 'RK45',
+            rtol: float = 1e-3,
+            atol: float = 1e-6,
+            substep: float = None,
+    ):
+        """
+        Args:
+            world: the registry of models
+            name: the name of the model
+            A: the n-by-n dynamics matrix (subclasses which build their own matrices
+                from their parameters leave A through D as None)
+            B: the n-by-m control matrix
+            C: the output matrix (defaults to the identity, so y = x)
+            D: the feedthrough matrix (defaults to zeros)
+            dt: the time step for integration and updating
+            x: the initial state (defaults to zeros)
+            u: the initial control input
+            integrator: 'zoh' (the default), 'solve_ivp', or 'persistent'
+            method: ODE solver for the solve_ivp and persistent integrators
+            rtol, atol: ODE solver tolerances
+            substep: if given, the longest step to take in between updates (see
+                DynamicModel)
+        """
+        self.matrices = None # (A, B, C, D), built when we first need them
+        if A is not None:
+            self.A = A
+            self.B = B
+            self.C = C
+            self.D = D
+            if x is None:
+                x = np.zeros(np.shape(A)[-1])
+        super().__init__(world, name, x, u, dt, integrator=integrator,
+                         method=method, rtol=rtol, atol=atol, substep=substep)
+
+    def __setattr__(self, name, value):
+        super().__setattr__(name, value)
+        if name in self.parameters:
+            super().__setattr__('matrices', None) # rebuild next time we need them (and the zoh)
+            world = getattr(self, 'world', None)
+            if world is not None:
+                world.clear_discretizations(self)
+
+    def compute_inputs(self):
+        """
+        Pre-integration step of update().
+        """
+        if 'u' in self.inputs:
+            self.u = self.get_input('u')
+
+    def build_matrices(self):
+        """
+        Build the (A, B, C, D) matrices from the parameters.
+        """
+        A = np.asarray(self.A, dtype=float)
+        B = np.asarray(self.B, dtype=float)
+        n, m = B.shape[-2:]
+        C = np.eye(n) if self.C is None else np.asarray(self.C, dtype=float)
+        D = np.zeros((C.shape[-2], m)) if self.D is None else np.asarray(self.D, dtype=float)
+        return A, B, C, D
+
+    def refresh_matrices(self):
+        """
+        Rebuild the matrices (if the parameters have changed), along with the buffers
+        for the zero-order hold and the outputs.
+        """
+        if self.matrices is not None:
+            return self.matrices
+
+        self.matrices = self.build_matrices()
+        A, B, C, D = self.matrices
+        self.u_buffer = np.zeros(B.shape[-1])
+        self.Bu_buffer = np.zeros(B.shape[-2])
+        self.x_buffer = np.zeros(A.shape[-1])
+        self.Du_buffer = np.zeros(D.shape[-2])
+        self.zoh = None # (dt, Phi, Gamma) of the last step
+        self.substep_zoh = None # (dt, count, Phi powers, input terms, and buffers) of the last substeps
+        self.substep_y = None # y at each of the substeps (see substep_outputs)
+        self.feedthrough = bool(np.any(D)) # whether y depends on u directly
+        return self.matrices
+
+    def batched(self, A, B, C, D) -> bool:
+        return A.ndim > 2 or B.ndim > 2 or C.ndim > 2 or D.ndim > 2 or self.x.ndim > 1
+
+    def state_space(self):
+        """
+        Returns the dynamics matrix A and the control matrix B.
+        """
+        A, B, C, D = self.refresh_matrices()
+        return A, B
+
+    def dynamics(self, t, x):
+        """
+        Returns xdot = A x + B u. It's independent of t, but the solvers expect it in
+        the signature.
+        """
+        A, B, C, D = self.refresh_matrices()
+        if self.batched(A, B, C, D):
+            return matvec(A, x) + matvec(B, self.input_vector())
+        return A.dot(x) + B.dot(self.u.reshape(-1))
+
+    def compute_outputs(self):
+        """
+        Post-integration step of update(): y = C x + D u.
+        """
+        A, B, C, D = self.refresh_matrices()
+        if self.y is None or self.batched(A, B, C, D):
+            self.y = matvec(C, self.x) + matvec(D, self.input_vector())
+            return
+
+        y = self.y
+        u = self.u_buffer
+        u[:] = self.u
+        np.dot(C, self.x, out=y)
+        y += np.dot(D, u, out=self.Du_buffer)
+
+    def substep_outputs(self):
+        """
+        Get y = C x + D u at each substep of the last update, all at once (into a
+        buffer which gets reused from update to update).
+        """
+        A, B, C, D = self.refresh_matrices()
+        if self.batched(A, B, C, D):
+            return super().substep_outputs()
+
+        shape = (len(self.substep_x), C.shape[0])
+        if self.substep_y is None or self.substep_y.shape != shape:
+            self.substep_y = np.zeros(shape)
+        np.dot(self.substep_x, C.T, out=self.substep_y)
+        if self.feedthrough:
+            u = self.u_buffer
+            u[:] = self.u
+            self.substep_y += np.dot(D, u, out=self.Du_buffer)
+        return self.substep_y
+
+    def integrate(self, t):
+        """
+        Integrate the model to the given time. With substeps and the zero-order hold,
+        since u is held over the update, the state at the k-th substep is
+        Phi^k x + (Phi^(k-1) + ... + 1) Gamma u, so we keep those matrices (for as
+        long as the substeps stay the same) and get all of the substeps at once.
+        """
+        A, B, C, D = self.refresh_matrices()
+        if self.substep is None or self.integrator != 'zoh' or self.batched(A, B, C, D):
+            super().integrate(t)
+            return
+
+        count = max(1, int(np.ceil((t - self.t) / self.substep - 1e-9)))
+        dt = (t - self.t) / count
+        cached = self.substep_zoh
+        if cached is None or cached[1] != count or abs(cached[0] - dt) > 1e-12:
+            Phi, Gamma = self.world.discretize(self, dt)
+            powers = np.zeros((count,) + Phi.shape)
+            terms = np.zeros((count,) + Gamma.shape)
+            powers[0] = Phi
+            terms[0] = Gamma
+            for k in range(1, count):
+                powers[k] = Phi.dot(powers[k - 1])
+                terms[k] = Phi.dot(terms[k - 1]) + Gamma
+            # Stacked into 2-D matrices, since np.dot makes temporary copies for
+            # anything with more dimensions
+            powers = powers.reshape(-1, Phi.shape[1])
+            terms = terms.reshape(-1, Gamma.shape[1])
+            steps = np.arange(1, count + 1, dtype=float)
+            buffers = (np.zeros(count), np.zeros((count, Phi.shape[0])), np.zeros(count * Phi.shape[0]))
+            self.substep_zoh = cached = (dt, count, powers, terms, steps) + buffers
+        dt, count, powers, terms, steps, times, substep_x, input_terms = cached
+
+        # Everything goes into the buffers, so nothing gets allocated from step to step
+        # (the same arithmetic as substep_times, so the times come out the same)
+        np.multiply(steps, t - self.t, out=times)
+        times /= count
+        times += self.t
+        times[-1] = t
+        u = self.u_buffer
+        u[:] = self.u
+        flat_x = substep_x.reshape(-1)
+        np.dot(powers, self.x, out=flat_x)
+        flat_x += np.dot(terms, u, out=input_terms)
+        self.x = substep_x[-1]
+        self.t = t
+        self.substep_t = times
+        self.substep_x = substep_x
+
+    def step(self, t):
+        """
+        Integrate to time t in one step. The zero-order-hold step is done in place,
+        holding on to the discretization for as long as the step stays the same.
+        """
+        A, B, C, D = self.refresh_matrices()
+        if self.integrator != 'zoh' or self.batched(A, B, C, D):
+            super().step(t)
+            return
+
+        dt = t - self.t
+        if self.zoh is None or abs(self.zoh[0] - dt) > 1e-12:
+            self.zoh = (dt,) + self.world.discretize(self, dt)
+        dt, Phi, Gamma = self.zoh
+
+        x = self.x
+        u = self.u_buffer
+        u[:] = self.u
+        x_next = np.dot(Phi, x, out=self.x_buffer)
+        x_next += np.dot(Gamma, u, out=self.Bu_buffer)
+        x[:] = x_next
+        self.t = t
@@ -0,0 +1,168 @@
+from bisect import bisect_left, bisect_right
+
+import h5py
+import numpy as np
+
+# Most entries a time index gets (so building one stays cheap on huge logs)
+MAX_INDEX_ENTRIES = 4096
+
+def logger_groups(f):
+    """
+    Get the names of the logger groups in an open log file: the groups with a t
+    column and nothing but datasets in them (which leaves out the realtime and
+    profile groups, and plotting pyramids).
+    """
+    return [
+        name for name, group in f.items()
+        if isinstance(group, h5py.Group) and 't' in group
+        and all(isinstance(member, h5py.Dataset) for member in group.values())
+    ]
+
+class TimeIndex:
+    """
+    A coarse index of a logger's t column: the time of every stride-th frame, where
+    the stride is a whole number of hdf5 chunks. Building it is one strided read of
+    t, and finding a time is then a binary search of the index in memory, and one
+    read of at most stride frames of t. (Plotter uses this too, to find its window.)
+    """
+    def __init__(self, t_dataset, max_entries: int = MAX_INDEX_ENTRIES):
+        self.t_dataset = t_dataset
+        self.length = t_dataset.shape[0]
+
+        chunk = t_dataset.chunks[0] if t_dataset.chunks is not None else 1
+        stride = max(chunk, -(-self.length // max_entries))
+        self.stride = -(-stride // chunk) * chunk
+
+        self.frames = np.arange(0, self.length, self.stride)
+        self.t = t_dataset[::self.stride] if self.length > 0 else np.zeros(0)
+
+    def find(self, t: float, side: str = 'left') -> int:
+        """
+        Get the frame at which t would be inserted to keep the t column sorted (so
+        'left' gives the first frame at or after t, and 'right' gives the first one
+        after t).
+        """
+        search = bisect_left if side == 'left' else bisect_right
+        block = search(self.t, t) - 1
+        if block < 0:
+            return 0
+        start = int(self.frames[block])
+        end = min(start + self.stride, self.length)
+        return start + search(self.t_dataset[start:end], t)
+
+class LogReader:
+    """
+    Random access to logged data, for post-processing. Each logger's t column gets
+    a coarse time index (built the first time we need it), so that we can pull out
+    just the frames in a time window, and just the columns we want, without reading
+    anything else.
+
+    Queries can also line up several loggers (e.g. the 10 Hz and 100 Hz logs) on a
+    common time grid (see read_aligned).
+    """
+    def __init__(self, basename: str):
+        self.f = h5py.File(f"{basename}.h5", 'r')
+        self.indexes = {} # TimeIndex by group
+
+    def close(self):
+        self.f.close()
+
+    def groups(self):
+        """Get the names of the logger groups (see logger_groups)."""
+        return logger_groups(self.f)
+
+    def columns(self, group: str):
+        """Get the names of a logger's columns (other than t)."""
+        return [name for name in self.f[group] if name != 't']
+
+    def time_index(self, group: str) -> TimeIndex:
+        if group not in self.indexes:
+            if group not in self.groups():
+                raise KeyError(f"no such logger group {group}")
+            self.indexes[group] = TimeIndex(self.f[group]['t'])
+        return self.indexes[group]
+
+    def window(self, group: str, t_start: float = None, t_end: float = None):
+        """
+        Get the (start, end) frames of a logger which are in the time window from
+        t_start to t_end (inclusive), for slicing its datasets.
+        """
+        index = self.time_index(group)
+        start = 0 if t_start is None else index.find(t_start, 'left')
+        end = index.length if t_end is None else index.find(t_end, 'right')
+        return start, max(start, end)
+
+    def read(self, group: str, t_start: float = None, t_end: float = None, columns=None):
+        """
+        Read the frames of a logger between t_start and t_end (inclusive).
+
+        Args:
+            group: the logger's name
+            t_start, t_end: the time window (defaults to the whole log)
+            columns: the columns to read (defaults to all of them)
+
+        Returns:
+            a dict of arrays, with t and each of the columns
+        """
+        if columns is None:
+            columns = self.columns(group)
+        start, end = self.window(group, t_start, t_end)
+
+        data = {'t': self.f[group]['t'][start:end]}
+        for column in columns:
+            data[column] = self.f[group][column][start:end]
+        return data
+
+    def read_aligned(self, columns, t_start: float, t_end: float, dt: float, method: str = 'previous'):
+        """
+        Read columns from several loggers, resampled onto a common time grid from
+        t_start to t_end with a step of dt.
+
+        Args:
+            columns: dict of the columns to read from each logger, e.g.
+                {'high_rate_log': ['position'], 'low_rate_log': ['e']}
+            t_start, t_end: the time window
+            dt: the grid step
+            method: 'previous' holds each logged value until the next one (which is
+                what the simulation does), and 'linear' interpolates between them
+
+        Returns:
+            a dict with the grid as t, and a "group/column" array for each column
+            (NaN where the grid is before a logger's first frame)
+        """
+        if method not in ('previous', 'linear'):
+            raise ValueError(f"unknown resampling method {method}")
+
+        grid = t_start + dt * np.arange(int(np.floor((t_end - t_start) / dt + 1e-9)) + 1)
+        data = {'t': grid}
+        for group, names in columns.items():
+            # Read one frame either side of the window, so we can fill in its edges
+            start, end = self.window(group, t_start, t_end)
+            start = max(start - 1, 0)
+            end = min(end + 1, self.time_index(group).length)
+            t = self.f[group]['t'][start:end]
+
+            # First frame after each grid point (frames within float noise of a grid
+            # point count as being at it)
+            after = np.searchsorted(t, grid + 1e-9 * dt, side='right')
+            before = np.clip(after - 1, 0, max(len(t) - 1, 0))
+            missing = after == 0
+
+            if method == 'linear':
+                following = np.clip(after, 0, max(len(t) - 1, 0))
+                span = t[following] - t[before]
+                weight = np.divide(grid - t[before], span, out=np.zeros_like(grid), where=span > 0)
+
+            for name in names:
+                values = self.f[group][name][start:end].astype(float)
+                if len(t) == 0:
+                    data[f"{group}/{name}"] = np.full(grid.shape + values.shape[1:], np.nan)
+                    continue
+
+                resampled = values[before]
+                if method == 'linear':
+                    w = weight.reshape(weight.shape + (1,) * (values.ndim - 1))
+                    resampled = resampled + w * (values[following] - resampled)
+                resampled[missing] = np.nan
+                data[f"{group}/{name}"] = resampled
+        return data
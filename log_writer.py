@@ -0,0 +1,63 @@
+import queue
+import threading
+
+class LogWriter(threading.Thread):
+    """
+    Background thread which does all of the writing to the world's hdf5 file, so that
+    the simulation loop doesn't have to stop and wait for the disk when a logger's
+    buffer fills up.
+
+    Loggers hand over their full buffers (without copying them) along with where they
+    go in the file, and get the buffers back once they've been written, so each
+    logger only ever needs a fixed number of buffers. The queue of pending writes is
+    bounded: if the writer falls too far behind, submit() blocks until it catches up.
+
+    Note that h5py doesn't release the GIL while writing, so this is for throughput
+    (the simulation can carry on with other work while a buffer is compressed and
+    written, given a spare core), not latency: the simulation thread still has to
+    wait for the GIL while the writer is in h5py, so the worst-case cycle time is
+    about the same as writing synchronously, and yielding more often (e.g. between
+    columns) only spreads the waiting over more cycles. Synchronous writes are the
+    default for that reason.
+    """
+    def __init__(self, max_queued: int = 8):
+        super().__init__(name="log_writer", daemon=True)
+        self.queue = queue.Queue(maxsize=max_queued)
+        self.error = None # first exception raised while writing, if any
+
+    def submit(self, logger, t_buffer, block, start: int, count: int):
+        """
+        Queue count frames from the given buffers to be written to the logger's
+        datasets starting at frame start. The buffers get returned to
+        logger.free_buffers once they've been written.
+        """
+        self.check()
+        self.queue.put((logger, t_buffer, block, start, count))
+
+    def run(self):
+        while True:
+            job = self.queue.get()
+            if job is None: # time to stop
+                self.queue.task_done()
+                break
+
+            logger, t_buffer, block, start, count = job
+            try:
+                logger.write(t_buffer, block, start, count)
+            except BaseException as e:
+                if self.error is None:
+                    self.error = e
+            finally:
+                logger.free_buffers.put((t_buffer, block))
+                self.queue.task_done()
+
+    def check(self):
+        """Raise any error that's happened on the writer thread."""
+        if self.error is not None:
+            raise IOError("log writer failed") from self.error
+
+    def stop(self):
+        """Finish writing everything that's been submitted, then stop the thread."""
+        self.queue.put(None)
+        self.join()
+        self.check()
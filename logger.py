@@ -2,7 +2,42 @@ from typing import Dict
 import numpy as np
 from model import Model
 
+import operator
+import queue
 import re
+import types
+
+MAX_CHUNK_BYTES = 1024 * 1024 # the most a default chunk of one column can take up
+
+def as_slice(indices):
+    """
+    Turn a sequence of indices into the equivalent slice if they're evenly spaced
+    and increasing (so indexing with it gives a view), or else an array.
+    """
+    indices = list(indices)
+    step = indices[1] - indices[0] if len(indices) > 1 else 1
+    if step > 0 and indices == list(range(indices[0], indices[-1] + 1, step)):
+        return slice(indices[0], indices[-1] + 1, step)
+    return np.array(indices)
+
+def substep_reader(signal: str, elements, batch_shape):
+    """
+    Make a function which gets the given elements of a dynamic model's x or y at each
+    of its substeps, as (substep, element) + batch shape, or of its u (which is held
+    over the substeps) as (element,) + batch shape, to go straight into a logger's
+    buffer (see Logger.plan_substeps).
+    """
+    if signal == 'u':
+        if batch_shape:
+            return lambda model: (model.u if model.u.ndim > len(batch_shape) else model.u[..., None])[..., elements].swapaxes(0, -1)
+        return lambda model: model.u if model.u.ndim == 0 else model.u[elements]
+
+    def read(model):
+        value = model.substep_x if signal == 'x' else model.substep_outputs()
+        if value.ndim == 1 + len(batch_shape): # a scalar per substep
+            value = value[..., None]
+        return value[..., elements].swapaxes(1, -1)
+    return read
 
 class Logger(Model):
     """
@@ -11,15 +46,65 @@ class Logger(Model):
 
     The important functions here are the constructor and the update() method, as with
     most of the other models I've created.
+
+    In a batched world, each column (other than t) gets a second dimension with one
+    value per instance.
+
+    With dt=None, the logger isn't scheduled at all, and only logs the frames it's
+    given (see append_frames), e.g. a dynamic model's substeps (see
+    DynamicModel.log_substeps).
+
+    If the world has a background log writer (see World.setup_logging), full buffers
+    are handed off to the writer thread instead of being written here, and we carry
+    on logging into a spare buffer.
     """
-    def __init__(self, world, name: str, buffer_size: int = 10000, dt: float = 0.1):
+    def __init__(
+            self,
+            world,
+            name: str,
+            buffer_size: int = 10000,
+            dt: float = 0.1,
+            dtype: str = 'f',
+            t_dtype: str = 'f8',
+            chunk_size: int = None,
+            compression: str = None,
+            compression_opts=None,
+            shuffle: bool = False,
+    ):
+        """
+        Args:
+            world: the registry of models
+            name: the name of the logger (and of its group in the hdf5 file)
+            buffer_size: number of frames to buffer before writing to the file
+            dt: the logging period (or None to only log what we're given)
+            dtype: the dtype for the logged columns (float32 by default)
+            t_dtype: the dtype for the time column (float64 by default, since float32
+                runs out of precision on long runs)
+            chunk_size: hdf5 chunk length in frames (by default, the buffer size when
+                the log gets created, so that each flush writes whole chunks, unless
+                that would make a column's chunks bigger than MAX_CHUNK_BYTES)
+            compression: None, 'gzip', or 'lzf' (the filters that come with h5py)
+            compression_opts: compression level for gzip (0-9)
+            shuffle: whether to use the shuffle filter (which usually helps
+                compression of floating point data)
+        """
+        if compression not in (None, 'gzip', 'lzf'):
+            raise ValueError(f"unsupported compression {compression}")
+
         super().__init__(world, name, dt=dt)
 
         self.buffer_size = buffer_size
-        self.buffer = {}
+        self.dtype = np.dtype(dtype)
+        self.t_dtype = np.dtype(t_dtype)
+        self.chunk_size = chunk_size
+        self.compression = compression
+        self.compression_opts = compression_opts
+        self.shuffle = shuffle
         self.index = 0  # Index in the current buffer
         self.total_logged = 0  # Total number of points logged
         self.labels = {} # Maps input names to display names
+        self.restored_state = None # from set_state() before the log was created
+        self.substep_plans = {} # how to log each model's substeps, by model name
 
     def add_input(self, input_name, model_id_attribute, index=None, label=None):
         """
@@ -38,7 +123,11 @@ class Logger(Model):
 
     def create_log(self, model_id):
         """
-        Make some room in the file for logging data under this model.
+        Make some room in the file for logging data under this model. This creates
+        all of the datasets (empty, but resizable) and the buffer we log into.
+
+        Since the world is compiled before this is called, this is also where we
+        grab the accessors for our inputs.
         """
         self.group = self.world.f.create_group(model_id)
         
@@ -46,46 +135,299 @@ class Logger(Model):
         for input_name, display_name in self.labels.items():
             self.group.attrs[input_name] = display_name
 
-        # Initialize buffers for 't' and each input
-        self.buffer['t'] = np.zeros(self.buffer_size, dtype='f')
-        for column in self.inputs:
-            self.buffer[column] = np.zeros(self.buffer_size, dtype='f')
+        # The buffer is one preallocated block, with a row per frame and a column per
+        # input (plus a separate column for t).
+        self.columns = list(self.inputs)
+        self.column_index = {column: i for i, column in enumerate(self.columns)}
+        self.read_frame = self.frame_reader()
+
+        batch_shape = self.world.batch_shape
+        self.t_buffer = np.zeros(self.buffer_size, dtype=self.t_dtype)
+        self.block = np.zeros((self.buffer_size, len(self.columns)) + batch_shape, dtype=self.dtype)
+
+        # Chunks hold a whole buffer, unless that's too much of a (batched) column
+        self.chunk_frames = self.chunk_size
+        if self.chunk_frames is None:
+            frame_bytes = max(int(np.prod(batch_shape)) * self.dtype.itemsize, self.t_dtype.itemsize)
+            self.chunk_frames = max(1, min(self.buffer_size, MAX_CHUNK_BYTES // frame_bytes))
+
+        self.t_dataset = self.create_dataset('t', (), self.t_dtype)
+        self.datasets = [self.create_dataset(column, batch_shape, self.dtype) for column in self.columns]
+
+        # Work out how to log the substeps of any models we get them from
+        for model in self.world.models.values():
+            if self in getattr(model, 'loggers', ()):
+                self.plan_substeps(model)
+
+        # Spare buffers, for when the writer thread is busy with a full one
+        self.free_buffers = queue.Queue()
+        if self.world.writer is not None:
+            for i in range(self.world.spare_buffers):
+                self.free_buffers.put((np.zeros_like(self.t_buffer), np.zeros_like(self.block)))
+
+        if self.restored_state is not None:
+            self.set_state(self.restored_state)
+            self.restored_state = None
+
+    def frame_reader(self):
+        """
+        Make a function which copies the current value of every input into a row of
+        the buffer. Whole attributes get fetched all at once (by one attrgetter on the
+        world's models), so a frame is one row assignment, plus one for each input
+        with an index. In a batched world, the inputs might not all have the batch
+        shape, so each one gets broadcast into its column separately.
+        """
+        getters = [self.accessors[column] for column in self.columns]
+        if self.world.batch_shape:
+            def read(row):
+                for i, getter in enumerate(getters):
+                    row[i] = getter()
+            return read
+
+        whole = [i for i, (model_id, attribute, index) in enumerate(self.inputs.values()) if index is None]
+        indexed = [(i, getters[i]) for i in range(len(getters)) if i not in whole]
+        if len(whole) == 0:
+            def read(row):
+                for i, getter in indexed:
+                    row[i] = getter()
+            return read
+
+        models = types.SimpleNamespace(**self.world.models)
+        fetch = operator.attrgetter(*[".".join(self.inputs[self.columns[i]][:2]) for i in whole])
+        columns = whole[0] if len(whole) == 1 else as_slice(whole) # a value, or a tuple of them
+
+        def read(row):
+            row[columns] = fetch(models)
+            for i, getter in indexed:
+                row[i] = getter()
+        return read
+
+    def create_dataset(self, name: str, shape, dtype):
+        """
+        Create an empty, resizable dataset in our group with the storage layout for
+        this logger. Shape is the shape of a single frame (so () for a scalar).
+        """
+        return self.group.create_dataset(
+            name,
+            shape=(0,) + shape,
+            maxshape=(None,) + shape,
+            chunks=(self.chunk_frames,) + shape,
+            dtype=dtype,
+            compression=self.compression,
+            compression_opts=self.compression_opts,
+            shuffle=self.shuffle,
+        )
 
     def dump_buffers(self):
-        # Resize datasets if total logged exceeds current size
-        new_size = self.total_logged + self.index  # New size after dump
-        for name, buffer in self.buffer.items():
-            dataset = self.group.require_dataset(name, shape=(new_size,), dtype='f', maxshape=(None,))
-            dataset[self.total_logged:new_size] = buffer[:self.index]
+        """
+        Write the buffered frames to the file (or hand them to the writer thread).
+        """
+        writer = self.world.writer
+        if writer is None:
+            self.write(self.t_buffer, self.block, self.total_logged, self.index)
+        else:
+            writer.submit(self, self.t_buffer, self.block, self.total_logged, self.index)
+            # This blocks if the writer still has all of our spare buffers.
+            self.t_buffer, self.block = self.free_buffers.get()
 
         self.total_logged += self.index
         self.index = 0  # Reset buffer index
 
+    def write(self, t_buffer, block, start: int, count: int):
+        """
+        Write the first count frames of the given buffers into the datasets, starting
+        at frame start.
+        """
+        # Resize datasets to fit the new data, then write each column in one go
+        new_size = start + count  # New size after dump
+        self.t_dataset.resize(new_size, axis=0)
+        self.t_dataset[start:new_size] = t_buffer[:count]
+        for i, dataset in enumerate(self.datasets):
+            dataset.resize(new_size, axis=0)
+            dataset[start:new_size] = block[:count,i]
+
     def append_frame(self, t: float, frame: Dict[str, float]):
+        """
+        Log a frame given as a dict of column values (columns which aren't included
+        are logged as zero).
+        """
         if self.index == self.buffer_size:
             self.dump_buffers()  # Dump and resize if buffer is full
 
-        self.buffer['t'][self.index] = t
+        row = self.block[self.index]
+        row[...] = 0.0
         for column, value in frame.items():
-            self.buffer[column][self.index] = value
+            row[self.column_index[column]] = value
+        self.t_buffer[self.index] = t
 
         self.index += 1
 
-    def update(self, t):
-        frame = {}  # Collect data for this timestep
+    def append_frames(self, t, frames: Dict[str, np.ndarray]):
+        """
+        Log many frames at once: t is an array of times, and frames is a dict of
+        column values, each with a row per frame (columns which aren't included are
+        logged as zero). The rows get copied into the buffer a slice at a time.
+        """
+        t = np.asarray(t)
+        count = len(t)
+        columns = [(self.column_index[column], np.asarray(values)) for column, values in frames.items()]
+
+        start = 0
+        while start < count:
+            if self.index == self.buffer_size:
+                self.dump_buffers()  # Dump and resize if buffer is full
 
-        for column in self.inputs:
-            model_id, attribute, index = self.inputs[column]
-            value = getattr(self.world.models[model_id], attribute)
+            n = min(count - start, self.buffer_size - self.index)
+            rows = self.block[self.index:self.index + n]
+            if len(columns) < len(self.columns):
+                rows[...] = 0.0
+            for i, values in columns:
+                rows[:,i] = values[start:start + n]
+            self.t_buffer[self.index:self.index + n] = t[start:start + n]
+
+            self.index += n
+            start += n
+
+        if count > 0:
+            self.t = float(t[-1])
+
+    def plan_substeps(self, model):
+        """
+        Work out once how to log a dynamic model's substeps (see log_substeps): which
+        of our columns come from its x, u, and y (and which elements of them), and
+        which are other inputs, with the columns and elements as slices where they
+        can be. Returns the plan, which is a list of (columns, read, per_substep),
+        where read(model) gets the values for those columns, either with a row per
+        substep or (if per_substep is False) held over all of them.
+        """
+        batch_shape = self.world.batch_shape
+        sources = {'x': [], 'u': [], 'y': []}
+        others = []
+        for i, (column, (model_id, attribute, index)) in enumerate(self.inputs.items()):
+            if model_id == model.name and attribute in sources:
+                if index is None:
+                    value = model.input_vector() if attribute == 'u' else getattr(model, attribute)
+                    if value is not None and np.shape(value)[len(batch_shape):] not in ((), (1,)):
+                        raise ValueError(f"logger {self.name} needs an index into {model_id}.{attribute} for column {column}")
+                    index = 0
+                sources[attribute].append((i, index))
+            else:
+                others.append((i, self.accessors[column]))
 
-            if index is None:
-                frame[column] = value
+        plan = []
+        for signal, pairs in sources.items():
+            if len(pairs) == 0:
+                continue
+            columns, elements = zip(*pairs)
+            plan.append((as_slice(columns), substep_reader(signal, as_slice(elements), batch_shape), signal != 'u'))
+        if len(others) > 0:
+            columns, getters = zip(*others)
+            if batch_shape:
+                read = lambda model: np.array([np.broadcast_to(getter(), batch_shape) for getter in getters])
             else:
-                frame[column] = value[index]
+                read = lambda model: [getter() for getter in getters]
+            plan.append((as_slice(columns), read, False))
+
+        self.substep_plans[model.name] = plan
+        return plan
+
+    def log_substeps(self, model):
+        """
+        Log every substep of a dynamic model's last update (see
+        DynamicModel.log_substeps). Inputs from the model's x, u, or y get the value at
+        each substep (u is held over the update), and any other inputs get their
+        current value. Each signal goes into the buffer in one slice assignment (see
+        plan_substeps).
+        """
+        t = model.substep_t
+        if t is None: # hasn't taken any substeps
+            return
+        plan = self.substep_plans.get(model.name)
+        if plan is None:
+            plan = self.plan_substeps(model)
+
+        count = len(t)
+        if self.index + count <= self.buffer_size: # the usual case: it all fits
+            rows = self.block[self.index:self.index + count]
+            for columns, read, per_substep in plan:
+                rows[:, columns] = read(model)
+            self.t_buffer[self.index:self.index + count] = t
+            self.index += count
+            self.t = float(t[-1])
+            return
+
+        values = [(columns, read(model), per_substep) for columns, read, per_substep in plan]
+        start = 0
+        while start < count:
+            if self.index == self.buffer_size:
+                self.dump_buffers()  # Dump and resize if buffer is full
+
+            n = min(count - start, self.buffer_size - self.index)
+            rows = self.block[self.index:self.index + n]
+            for columns, value, per_substep in values:
+                rows[:, columns] = value[start:start + n] if per_substep else value
+            self.t_buffer[self.index:self.index + n] = t[start:start + n]
 
-        self.append_frame(t, frame)
+            self.index += n
+            start += n
+
+        self.t = float(t[-1])
+
+    def update(self, t):
+        if self.index == self.buffer_size:
+            self.dump_buffers()  # Dump and resize if buffer is full
+
+        # Gather the inputs straight into the buffer (see frame_reader)
+        self.read_frame(self.block[self.index])
+        self.t_buffer[self.index] = t
+
+        self.index += 1
         self.t = t
 
+    def get_state(self):
+        """
+        Get the logger's state, including the frames it has buffered but not yet
+        written, and how many frames it had written.
+        """
+        state = super().get_state()
+        state['total_logged'] = np.array(self.total_logged)
+        if hasattr(self, 'block'):
+            state['t_buffer'] = self.t_buffer[:self.index].copy()
+            state['block'] = self.block[:self.index].copy()
+        return state
+
+    def set_state(self, state):
+        """
+        Put back a state from get_state(): the buffered frames go back into the buffer,
+        to be written with everything logged from here on.
+
+        If we're writing to the same file the state came from, we rewind to where the
+        state was taken (and anything logged after that gets overwritten).
+
+        In a new file, the log is a new segment: it starts with the buffered frames,
+        and the frames which had already been written to the old file before the state
+        was taken don't get copied over (the old file might not even be around). The
+        group's first_frame attribute says how many of those there were, i.e. where
+        the new file's first frame goes in the old file's log.
+        """
+        super().set_state(state)
+        if not hasattr(self, 'block'):
+            self.restored_state = state # we'll come back to this in create_log
+            return
+
+        logged = self.t_dataset.shape[0]
+        self.total_logged = min(int(state['total_logged']), logged)
+        if int(state['total_logged']) > logged: # a new segment
+            self.group.attrs['first_frame'] = int(state['total_logged']) - logged
+
+        count = len(state['t_buffer']) if 't_buffer' in state else 0
+        if count > self.buffer_size:
+            raise ValueError(f"logger {self.name} has more buffered frames than fit in its buffer")
+        if count > 0:
+            self.t_buffer[:count] = state['t_buffer']
+            self.block[:count] = state['block']
+        self.index = count
+
     def finalize(self):
         """Call this method when logging is complete to dump any remaining data."""
         if self.index > 0:
@@ -1,14 +1,23 @@
 import numpy as np
 
-from dynamic_model import DynamicModel
+from linear_state_space_model import LinearStateSpaceModel
 
-class MassSpringDamper(DynamicModel):
+class MassSpringDamper(LinearStateSpaceModel):
     """
     Model of a mass-spring-damper system.
 
     It does not know how close it is to the fixed surface, so does not protect against
     collisions. It does not include any units, so you can use whatever units you like.
+
+    Since it's linear, by default it's integrated exactly using a zero-order hold
+    (pass integrator='solve_ivp' or 'persistent' to use an ODE solver instead). The
+    matrices (and the discretization) get rebuilt whenever you assign m, k, or b.
+
+    In a batched world, m, k, and b can each be either a scalar or an array with one
+    value per instance.
     """
+    parameters = ('m', 'k', 'b')
+
     def __init__(
             self,
             world,
@@ -19,6 +28,11 @@ class MassSpringDamper(DynamicModel):
             m: float = 1.0,
             k: float = 1.0,
             b: float = 1.0,
+            integrator: str = None,
+            method: str = 'RK45',
+            rtol: float = 1e-3,
+            atol: float = 1e-6,
+            substep: float = None,
     ):
         """
         Args:
@@ -30,14 +44,23 @@ class MassSpringDamper(DynamicModel):
             k: the spring constant
             b: the damping constant
             dt: the time step for integration and updating
+            integrator: 'zoh' (the default), 'solve_ivp', or 'persistent'
+            method: ODE solver for the solve_ivp and persistent integrators
+            rtol, atol: ODE solver tolerances
+            substep: if given, the longest step to take in between updates (so dt can
+                be the rate of the force, and substep the rate we want to simulate at)
         """
-        super().__init__(world, name, x, u, dt)
+        super().__init__(world, name, dt=dt, x=x, u=u, integrator=integrator,
+                         method=method, rtol=rtol, atol=atol, substep=substep)
 
         # set the model parameters
         self.m = m
         self.k = k
         self.b = b
 
+        # initialize the outputs
+        self.compute_outputs()
+
     def compute_inputs(self):
         """
         Pre-integration step of update().
@@ -46,32 +69,22 @@ class MassSpringDamper(DynamicModel):
         # is defined in the world setup)
         self.u = self.get_input('force')
 
-    def dynamics(self, t, x):
+    def build_matrices(self):
         """
-        The dynamics of the model. For some time t and state vector x, returns the
-        derivative of the state, xdot. We'll use state-space form for this model,
-        so this method returns the state derivative.
-
-        Note that in this particular model, it's independent of t. We still
-        need to include it in the signature because the solver expects it.
+        Returns the (A, B, C, D) matrices, with leading batch dimensions if any of the
+        parameters are arrays. Our output is just our state, so C = 1 and D = 0.
         """
+        m, k, b = np.broadcast_arrays(
+            np.asarray(self.m, dtype=float),
+            np.asarray(self.k, dtype=float),
+            np.asarray(self.b, dtype=float),
+        )
         # Define dynamics matrix
-        A = np.array([[0.0, 1.0],
-                      [-self.k / self.m, -self.b / self.m]])
+        A = np.zeros(m.shape + (2, 2))
+        A[...,0,1] = 1.0
+        A[...,1,0] = -k / m
+        A[...,1,1] = -b / m
         # Define control matrix
-        B = np.array([0.0, 1.0 / self.m])
-        u = self.u
-        
-        return A.dot(x) + B.dot(u)
-    
-    def compute_outputs(self):
-        """
-        Post-integration step of update().
-
-        Ordinarily, this is where we define y = Cx + Du. In this case, our output is
-        just our state, so C = 1 and D = 0. We've actually defined it thusly in our base
-        class, but let's go ahead and simplify the expression here.
-        """
-        self.y = np.array(self.x)
-    
-
+        B = np.zeros(m.shape + (2, 1))
+        B[...,1,0] = 1.0 / m
+        return A, B, np.eye(2), np.zeros((2, 1))
@@ -1,8 +1,78 @@
+from functools import partial
+
+import numpy as np
+
+def make_accessor(model, attribute: str, index=None, batched: bool = False):
+    """
+    Make a function of no arguments which returns model.attribute (or
+    model.attribute[index], if an index is given). This does the name resolution
+    once, rather than every time we read the input.
+
+    In a batched world, the index applies to the last axis (since the first is the
+    batch dimension).
+    """
+    if index is None:
+        return partial(getattr, model, attribute)
+    if batched:
+        return lambda: getattr(model, attribute)[..., index]
+    return lambda: getattr(model, attribute)[index]
+
+def make_delayed_accessor(latch, index=None, batched: bool = False):
+    """
+    Like make_accessor, but for an input with delay=True, which reads through a Latch.
+    """
+    if index is None:
+        return latch.get
+    if batched:
+        return lambda: latch.get()[..., index]
+    return lambda: latch.get()[index]
+
+class Latch:
+    """
+    Keeps the value a model's attribute had before the model updated in the current
+    frame, for inputs that read it with delay=True (see Model.add_input). Until the
+    model updates in a frame, get() gives the attribute itself, so delayed inputs see
+    the value from before the frame wherever their model is in the update order.
+    """
+    def __init__(self, model, attribute: str):
+        self.model = model
+        self.attribute = attribute
+        self.value = None
+        self.frame = None # the frame we're holding a value for
+
+    def hold(self, frame: int):
+        if self.frame == frame: # already holding this frame's value
+            return
+        value = getattr(self.model, self.attribute)
+        if isinstance(value, np.ndarray):
+            # Copy it into the array we already have, if it still fits
+            held = self.value
+            if not isinstance(held, np.ndarray) or held.shape != value.shape or held.dtype != value.dtype:
+                held = self.value = np.empty_like(value)
+            np.copyto(held, value)
+        else:
+            self.value = value
+        self.frame = frame
+
+    def get(self):
+        if self.frame == self.model.world.frame:
+            return self.value
+        return getattr(self.model, self.attribute)
 
 class Model:
     """
     Pure base class for all models.
+
+    The attributes named in state_attributes are everything it takes to pick the
+    model up where it left off (see get_state and World.checkpoint), so subclasses
+    with more state should add to it.
     """
+    state_attributes = ('t', 'valid')
+
+    # Whether the model draws from world.rng (so partitioned runs keep such models
+    # together, and the draws happen in the same order). Models with a generator of
+    # their own (see World.spawn_rng) don't need to.
+    uses_rng = False
 
     def __init__(
             self,
@@ -13,7 +83,10 @@ class Model:
         if "." in name: # need this for when we setup inputs, which use '.' as a delimiter
             raise ValueError(f"model name {name} contains illegal character '.'")
 
-        self.inputs = {}                
+        self.inputs = {}
+        self.delayed = set() # names of inputs which read the previous value (see add_input)
+        self.latches = {} # attribute: Latch, for other models' delayed inputs from this one
+        self.accessors = {} # filled in by compile_inputs()
         self.name = name
         self.world = world
         self.t = 0.0
@@ -28,7 +101,7 @@ class Model:
         """Get the next time the model needs updating."""
         return self.t + self.dt
 
-    def add_input(self, input_name, model_id_attribute, index=None):
+    def add_input(self, input_name, model_id_attribute, index=None, delay: bool = False):
         """
         This method connects the output of another model to this model's input.
 
@@ -36,7 +109,15 @@ class Model:
         * input_name: the name of the input in this model
         * model_id_attribute: a string of the form "model_id.attribute" giving the outputting
             model and its attribute
+        * index: index into the attribute, if we only want one element of it
+        * delay: if True, this is a unit delay: this input always reads the value from
+            before the frame, even if the outputting model has already updated in it, and
+            the connection doesn't constrain the update order. Every feedback loop needs
+            one of these (see World.execution_order).
         """
+        if self.world.compiled:
+            raise ValueError(f"can't add input {input_name} after the world has been compiled")
+
         model_id, attribute = model_id_attribute.split('.')
 
         if model_id not in self.world.models:
@@ -45,18 +126,101 @@ class Model:
         if input_name in self.inputs:
             raise KeyError(f"input {input_name} already exists")
         self.inputs[input_name] = (model_id, attribute, index)
+        if delay:
+            self.delayed.add(input_name)
+            self.world.models[model_id].latch(attribute)
+
+        # The update order may have to change
+        self.world.reset_schedule()
+
+    def latch(self, attribute: str):
+        """Get the Latch for a delayed input reading the given attribute of this model."""
+        if attribute not in self.latches:
+            self.latches[attribute] = Latch(self, attribute)
+        return self.latches[attribute]
+
+    def hold(self, frame: int):
+        """
+        Hold on to the values our delayed readers need, since we're about to update in
+        the given frame. Whatever updates models (e.g. World.cycle) calls this first.
+        """
+        for latch in self.latches.values():
+            latch.hold(frame)
 
     def get_input(self, input_name):
         """
         Locally-called function which retrieves an input value from the outputting model.
         """
+        accessor = self.accessors.get(input_name)
+        if accessor is not None:
+            return accessor()
+
+        # Not compiled yet, so look everything up by name
         model_id, attribute, index = self.inputs[input_name]
-        value = getattr(self.world.models[model_id], attribute)
+        if input_name in self.delayed:
+            value = self.world.models[model_id].latches[attribute].get()
+        else:
+            value = getattr(self.world.models[model_id], attribute)
         if index is None:
             return value
+        elif self.world.batch_shape:
+            return value[..., index]
         else:
             return value[index]
         
+    def compile_inputs(self):
+        """
+        Resolve each input connection into an accessor, checking that the outputting
+        model has the attribute (and index) we're expecting. An index into an output
+        which hasn't been set yet can't be checked until the simulation runs.
+        """
+        accessors = {}
+        for input_name, (model_id, attribute, index) in self.inputs.items():
+            if model_id not in self.world.models:
+                raise KeyError(f"model {model_id} does not exist (input {input_name} of {self.name})")
+            source = self.world.models[model_id]
+
+            if not hasattr(source, attribute):
+                raise AttributeError(f"model {model_id} has no attribute {attribute} (input {input_name} of {self.name})")
+
+            if input_name in self.delayed:
+                accessor = make_delayed_accessor(source.latch(attribute), index, batched=bool(self.world.batch_shape))
+            else:
+                accessor = make_accessor(source, attribute, index, batched=bool(self.world.batch_shape))
+            # Check the index against the current value, unless there isn't one yet
+            # (e.g. a dynamic model's y before its first update)
+            if index is not None and getattr(source, attribute) is not None:
+                try:
+                    accessor()
+                except (IndexError, TypeError) as e:
+                    raise IndexError(f"can't index {model_id}.{attribute} with {index} (input {input_name} of {self.name})") from e
+
+            accessors[input_name] = accessor
+
+        self.accessors = accessors
+
+    def get_state(self):
+        """
+        Get a copy of the model's state (its state_attributes), as a dict of arrays.
+        Attributes which are still None are left out.
+        """
+        state = {}
+        for name in self.state_attributes:
+            value = getattr(self, name)
+            if value is not None:
+                state[name] = np.array(value)
+        return state
+
+    def set_state(self, state):
+        """
+        Put back a state from get_state(). Scalars come back as Python scalars.
+        """
+        for name in self.state_attributes:
+            if name not in state:
+                continue
+            value = np.asarray(state[name])
+            setattr(self, name, value.item() if value.ndim == 0 else value.copy())
+
     def compute_inputs(self):
         """
         Setup all inputs for the model. When this method is finished, self.u should be
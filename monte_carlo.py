@@ -0,0 +1,64 @@
+import numpy as np
+import numpy.random as npr
+import sys
+
+from world import World
+from scenario import build_scenario
+
+def run_batch(
+        duration: float,
+        desired_x,
+        basename: str = "monte_carlo",
+        seed: int = 0,
+        logging: bool = True,
+        **params,
+):
+    """
+    Run a batch of dispersed instances of the example scenario in a single batched
+    world, so all of the instances get stepped in one vectorized pass.
+
+    Args:
+        duration: simulation duration
+        desired_x: setpoint (a scalar, or one per instance)
+        basename: name of the log file (without .h5)
+        seed: seed for the world's random number generator
+        logging: whether to log (each logged column gets one value per instance)
+        params: any of build_scenario's parameters (m, k, b, kp, ki, kd, sigma),
+            each either a scalar or an array with one value per instance
+
+    Returns:
+        a dict of the models, by name (so you can pull out the final states)
+    """
+    batch_size = np.broadcast_shapes(np.shape(desired_x), *[np.shape(value) for value in params.values()])
+    if len(batch_size) != 1:
+        raise ValueError("expected the dispersed parameters to be 1-D arrays")
+
+    world = World(basename, rng=npr.default_rng(seed=seed), batch_size=batch_size[0])
+    models = build_scenario(world, desired_x, logging=logging, **params)
+    world.setup_logging()
+
+    while world.t < duration:
+        world.cycle()
+
+    world.finish_logging()
+    return models
+
+
+if __name__ == "__main__":
+    # Disperse the plant parameters by 10% around the example's values
+    if len(sys.argv) != 4:
+        raise SyntaxError("Usage: python monte_carlo.py <duration> <desired_x> <count>")
+    duration = float(sys.argv[1])
+    desired_x = float(sys.argv[2])
+    count = int(sys.argv[3])
+
+    rng = npr.default_rng(seed=1)
+    models = run_batch(
+        duration, desired_x,
+        m=rng.normal(4.0, 0.4, count),
+        k=rng.normal(2.0, 0.2, count),
+        b=rng.normal(3.0, 0.3, count),
+    )
+
+    x = models['mass_spring_damper'].x[:,0]
+    print(f"final position: mean {np.mean(x)}, std {np.std(x)}, min {np.min(x)}, max {np.max(x)}")
@@ -0,0 +1,323 @@
+from multiprocessing import get_context, shared_memory
+from queue import Empty
+from threading import BrokenBarrierError
+import os
+import traceback
+
+import h5py
+import numpy as np
+import numpy.random as npr
+
+from logger import Logger
+from scheduler import RateGroupScheduler
+from world import World
+
+def connections(world):
+    """
+    Get the (source, destination) model names of every input connection.
+    """
+    edges = []
+    for name in world.order:
+        for model_id, attribute, index in world.models[name].inputs.values():
+            edges.append((model_id, name))
+    return edges
+
+def partition(world, workers: int = None, min_dt: float = None):
+    """
+    Split a world's models into groups which can be stepped in separate processes.
+
+    Models connected by an input end up in the same group, so each group is one (or
+    more) of the independent subgraphs of the connection graph, unless min_dt is given:
+    then connections into models with a dt of at least min_dt (slow-rate signals) are
+    allowed to cross between groups, at the cost of the groups synchronizing every time
+    one of those models updates. Models which draw from world.rng (see uses_rng) all go
+    in the same group, so the random numbers come out in the same order as they would
+    in a serial run. (Noise models draw from generators of their own, so they can go
+    anywhere.)
+
+    The groups are then packed into at most workers partitions (by default, one per
+    CPU), balancing the number of model updates per second in each.
+
+    Returns:
+        a list of partitions, each a list of model names (in world order)
+    """
+    if workers is None:
+        workers = os.cpu_count()
+
+    # Union-find over the models
+    parent = {name: name for name in world.order}
+    def find(name):
+        while parent[name] != name:
+            parent[name] = parent[parent[name]]
+            name = parent[name]
+        return name
+
+    for source, destination in connections(world):
+        dt = world.models[destination].dt
+        if min_dt is None or dt is None or dt < min_dt:
+            parent[find(source)] = find(destination)
+
+    random = [name for name in world.order if world.models[name].uses_rng]
+    for name in random[1:]:
+        parent[find(name)] = find(random[0])
+
+    groups = {}
+    for name in world.order:
+        groups.setdefault(find(name), []).append(name)
+
+    # Pack the biggest groups first, each into the partition with the least work so far
+    def load(names):
+        return sum(1.0 / world.models[name].dt for name in names if world.models[name].dt is not None)
+
+    bins = [[] for i in range(min(workers, len(groups)))]
+    loads = [0.0] * len(bins)
+    for group in sorted(groups.values(), key=load, reverse=True):
+        i = loads.index(min(loads))
+        bins[i].extend(group)
+        loads[i] += load(group)
+
+    position = {name: i for i, name in enumerate(world.order)}
+    return [sorted(names, key=position.get) for names in bins]
+
+def frame_plans(world, frames, partitions):
+    """
+    Work out how each frame of a rate-group schedule runs when its models are split
+    across partitions.
+
+    Any input which crosses partitions is read from a copy of the outputting model
+    (kept up to date through shared memory), and it has to see the value the serial
+    run would: the new one if its model updates earlier in the frame, or the old one
+    if it updates later (or if it's a delayed input). So a frame in which a crossing
+    input gets read is split into stages, where a model goes in a later stage than
+    any model in another partition it reads from (without a delay) that updates
+    before it in the frame. Partitions run a stage at the same time, and line up
+    between stages (at a barrier) to swap outputs. Delayed inputs get refreshed in
+    the first stage, before anything updates. Frames without any crossing inputs to
+    read run without stopping.
+
+    Returns:
+        the cross-partition signals, as a set of (model name, attribute), and a list of
+        plans for each frame (one per partition), where a plan is a list of
+        (sync, reads, models, writes) stages: sync is whether to line up before the stage,
+        reads are the signals to refresh then, models are the models to update, and
+        writes are the signals to share afterwards
+    """
+    owner = {name: i for i, names in enumerate(partitions) for name in names}
+    crossing = {} # model name: [(source, attribute, delayed)] it reads from other partitions
+    signals = set()
+    for name in world.order:
+        model = world.models[name]
+        for input_name, (model_id, attribute, index) in model.inputs.items():
+            if owner[model_id] != owner[name]:
+                crossing.setdefault(name, []).append((model_id, attribute, input_name in model.delayed))
+                signals.add((model_id, attribute))
+    sources = {}
+    for model_id, attribute in signals:
+        sources.setdefault(model_id, []).append(attribute)
+
+    plans = []
+    for offset, models in frames:
+        names = [model.name for model in models]
+        exchange = any(name in crossing for name in names)
+
+        stage = {}
+        last = [0] * len(partitions)
+        for name in names:
+            s = last[owner[name]]
+            if exchange:
+                for model_id, attribute, delayed in crossing.get(name, ()):
+                    if model_id in stage and not delayed:
+                        s = max(s, stage[model_id] + 1)
+            stage[name] = last[owner[name]] = s
+        count = max(stage.values(), default=0) + 1
+
+        frame = []
+        for i in range(len(partitions)):
+            stages = [(exchange, [], [], []) for k in range(count)]
+            for name in names:
+                if owner[name] != i:
+                    continue
+                sync, reads, updates, writes = stages[stage[name]]
+                for model_id, attribute, delayed in crossing.get(name, ()):
+                    stages[0 if delayed else stage[name]][1].append((model_id, attribute))
+                updates.append(name)
+                writes.extend((name, attribute) for attribute in sources.get(name, ()))
+            frame.append(stages)
+        plans.append(frame)
+
+    return signals, plans
+
+def set_signal(model, attribute: str, value: np.ndarray):
+    setattr(model, attribute, value.item() if value.ndim == 0 else value.copy())
+
+def step_partition(factory, params, basename, seed, partitions, index, views, barrier, duration):
+    """
+    Build the world and step one partition of it up to duration, reading and sharing
+    the cross-partition signals through views (shared arrays by (model name,
+    attribute)). Every worker builds the whole world, but only updates its own
+    models, so the others are just copies to read inputs from.
+
+    Returns:
+        the final time, and the states of the partition's models
+    """
+    world = World(basename, rng=npr.default_rng(seed))
+    try:
+        factory(world, **params)
+        if not world.logging_ready:
+            world.setup_logging()
+
+        scheduler = RateGroupScheduler(world.scheduled_models(), t=world.t)
+        signals, plans = frame_plans(world, scheduler.frames, partitions)
+
+        # Resolve this partition's plans into models and shared arrays
+        def resolve(pairs):
+            return [(world.models[name], attribute, views[(name, attribute)]) for name, attribute in pairs]
+        stages = [
+            [(sync, resolve(reads), [world.models[name] for name in updates], resolve(writes))
+             for sync, reads, updates, writes in plan[index]]
+            for plan in plans
+        ]
+
+        # Share our starting outputs, so the others see them until we first update
+        own = set(partitions[index])
+        for (name, attribute), view in views.items():
+            if name in own:
+                view[...] = getattr(world.models[name], attribute)
+
+        while world.t < duration:
+            frame = scheduler.frame
+            t, models = scheduler.next_frame()
+            world.frame += 1
+            for k, (sync, reads, updates, writes) in enumerate(stages[frame]):
+                if sync:
+                    barrier.wait() # everyone's outputs from before are in
+                    for model, attribute, view in reads:
+                        if k > 0 and model.latches: # its owner has updated it this frame
+                            model.hold(world.frame)
+                        set_signal(model, attribute, view)
+                    barrier.wait() # nobody overwrites them until we've all read
+                for model in updates:
+                    if model.latches:
+                        model.hold(world.frame)
+                    model.update(t)
+                for model, attribute, view in writes:
+                    view[...] = getattr(model, attribute)
+            world.t = t
+    finally:
+        world.finish_logging()
+
+    return world.t, {name: world.models[name].get_state() for name in partitions[index]}
+
+def run_partition(factory, params, basename, seed, partitions, index, layout, barrier, results, duration):
+    """
+    Worker process for run_partitioned: attach to the shared signals, step the
+    partition, and send back its final states (or what went wrong).
+    """
+    blocks = []
+    views = {}
+    try:
+        for key, (block_name, shape) in layout.items():
+            block = shared_memory.SharedMemory(name=block_name)
+            blocks.append(block)
+            views[key] = np.ndarray(shape, dtype=float, buffer=block.buf)
+
+        t, states = step_partition(factory, params, basename, seed, partitions, index, views, barrier, duration)
+        results.put((index, t, states, None))
+    except BrokenBarrierError:
+        results.put((index, None, None, "stopped because another partition failed"))
+    except BaseException:
+        barrier.abort() # don't leave the others waiting for us
+        results.put((index, None, None, traceback.format_exc()))
+    finally:
+        views.clear() # the blocks can't close while arrays still point into them
+        for block in blocks:
+            block.close()
+
+def run_partitioned(factory, duration: float, basename: str = "data", seed: int = 0,
+                    workers: int = None, min_dt: float = None, **params):
+    """
+    Run a world split across worker processes (see partition), with the same results
+    as running it serially.
+
+    Each worker builds the world with factory (which has to be a module-level function,
+    so it can be sent to the workers, e.g. scenario.build_scenario), runs its own
+    partition, and logs its own loggers to a file of its own. Signals which cross
+    partitions go through shared memory, and at the end, the logs get put back together
+    into basename.h5.
+
+    Args:
+        factory: function which adds the models to a world, called as
+            factory(world, **params)
+        duration: how long to run
+        basename: the log file name (without .h5)
+        seed: seed for the world's random number generator
+        workers: at most how many processes to use (defaults to one per CPU)
+        min_dt: see partition
+
+    Returns:
+        the world (with its file closed), with the final state of every model
+    """
+    world = World(basename, rng=npr.default_rng(seed))
+    try:
+        factory(world, **params)
+        if world.event_driven or world.coupled:
+            raise ValueError("partitioned runs need the rate-group scheduler without coupling")
+        partitions = partition(world, workers=workers, min_dt=min_dt)
+        signals, plans = frame_plans(world, RateGroupScheduler(world.scheduled_models()).frames, partitions)
+
+        context = get_context('spawn')
+        barrier = context.Barrier(len(partitions))
+        results = context.Queue()
+
+        blocks = []
+        processes = []
+        try:
+            layout = {}
+            for name, attribute in sorted(signals):
+                shape = np.shape(getattr(world.models[name], attribute))
+                block = shared_memory.SharedMemory(create=True, size=max(8, 8 * int(np.prod(shape))))
+                blocks.append(block)
+                layout[(name, attribute)] = (block.name, shape)
+
+            part_basenames = [f"{basename}_part{i}" for i in range(len(partitions))]
+            for i in range(len(partitions)):
+                process = context.Process(target=run_partition, args=(
+                    factory, params, part_basenames[i], seed, partitions, i, layout, barrier, results, duration))
+                process.start()
+                processes.append(process)
+
+            outcomes = {}
+            while len(outcomes) < len(processes):
+                try:
+                    i, t, states, error = results.get(timeout=1.0)
+                    outcomes[i] = (t, states, error)
+                except Empty:
+                    for process in processes:
+                        if not process.is_alive() and process.exitcode != 0:
+                            barrier.abort()
+                            raise RuntimeError(f"partition worker exited with code {process.exitcode}")
+        finally:
+            for process in processes:
+                process.join()
+            for block in blocks:
+                block.close()
+                block.unlink()
+
+        errors = [error for t, states, error in outcomes.values() if error is not None]
+        if len(errors) > 0:
+            raise RuntimeError(f"partitioned run failed:\n{errors[0]}")
+
+        # Put the final states and the logs together
+        for i, (t, states, error) in sorted(outcomes.items()):
+            world.t = t
+            for name, state in states.items():
+                world.models[name].set_state(state)
+            with h5py.File(f"{part_basenames[i]}.h5", 'r') as f:
+                for name in partitions[i]:
+                    if isinstance(world.models[name], Logger) and name in f:
+                        f.copy(f[name], world.f, name)
+            os.remove(f"{part_basenames[i]}.h5")
+    finally:
+        world.finish_logging()
+
+    return world
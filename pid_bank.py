@@ -0,0 +1,159 @@
+import numpy as np
+
+from discrete_model import DiscreteModel
+
+class PIDBank(DiscreteModel):
+    """
+    A bank of PID controllers, one per channel, all updated together with array
+    operations, so a 100-channel controller costs about the same as a single one
+    (and takes up one slot in the schedule rather than a hundred).
+
+    The process input is an array with one value per channel (e.g. connect it to
+    a vector output without an index), and an optional 'setpoint' input can drive
+    the setpoints in the same way. Every gain and limit can be a scalar (for all of
+    the channels) or an array with one value per channel.
+
+    On top of what PIDController does, each channel can have:
+
+    * output saturation, between u_min and u_max
+    * back-calculation anti-windup: while the output is saturated, the integral gets
+      pulled back by (y - v) / (ki tt) per unit time, where v is the unsaturated
+      output and tt is the tracking time constant
+    * a first-order low-pass filter on the derivative, with time constant tau
+
+    With no saturation and tau = 0, each channel does exactly what a PIDController
+    with the same gains would. In a batched world, the arrays get a leading batch
+    dimension.
+
+    The filter and anti-windup coefficients get worked out once, and again whenever
+    one of the attributes named in parameters is assigned (like the matrices of a
+    LinearStateSpaceModel).
+    """
+    state_attributes = DiscreteModel.state_attributes + ('E', 'ep', 'e', 'de')
+
+    # Attributes that the coefficients depend on
+    parameters = ('kp', 'ki', 'kd', 'tau', 'tt')
+
+    def __init__(
+            self,
+            world,
+            name: str,
+            channels: int,
+            dt: float = 0.1,
+            kp = 1.0,
+            ki = 1.0,
+            kd = 1.0,
+            setpoint = 1.0,
+            u_min = -np.inf,
+            u_max = np.inf,
+            tau = 0.0,
+            tt = None,
+    ):
+        """
+        Args:
+            world: the registry of models
+            name: the name of the model
+            channels: the number of control loops
+            dt: the update period
+            kp, ki, kd: PID gains
+            setpoint: the setpoints (unless there's a 'setpoint' input)
+            u_min, u_max: output limits
+            tau: time constant of the derivative filter (0 for no filtering)
+            tt: tracking time constant for anti-windup (defaults to sqrt(Ti Td), or Ti
+                if there's no derivative term, where Ti = kp / ki and Td = kd / kp)
+        """
+        self.cached = None # see coefficients()
+        super().__init__(world, name, dt=dt)
+        self.channels = channels
+        shape = world.batch_shape + (channels,)
+
+        self.kp = kp
+        self.ki = ki
+        self.kd = kd
+        self.setpoint = np.array(np.broadcast_to(setpoint, shape), dtype=float)
+        self.u_min = u_min
+        self.u_max = u_max
+        self.tau = tau
+        self.tt = tt
+
+        # The signals, which get updated in place
+        self.x = np.zeros(shape)
+        self.y = np.zeros(shape)
+        self.E = np.zeros(shape) # integral of the error
+        self.ep = np.zeros(shape) # previous error
+        self.e = np.zeros(shape)
+        self.de = np.zeros(shape) # (filtered) derivative of the error
+        self.v = np.zeros(shape) # output before saturation
+        self.scratch = np.zeros(shape)
+        self.valid = False
+
+    def __setattr__(self, name, value):
+        super().__setattr__(name, value)
+        if name in self.parameters:
+            super().__setattr__('cached', None) # work them out again next time
+
+    def coefficients(self):
+        """
+        Get the per-channel (derivative filter, anti-windup) coefficients for a step:
+        the fraction of the last derivative the filter keeps, and how much of (y - v)
+        goes back into the integral.
+        """
+        if self.cached is not None:
+            return self.cached
+
+        shape = self.e.shape
+        alpha = np.broadcast_to(np.asarray(self.tau, dtype=float) / (np.asarray(self.tau, dtype=float) + self.dt), shape)
+
+        kp = np.broadcast_to(np.asarray(self.kp, dtype=float), shape)
+        ki = np.broadcast_to(np.asarray(self.ki, dtype=float), shape)
+        kd = np.broadcast_to(np.asarray(self.kd, dtype=float), shape)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            if self.tt is None:
+                Ti = kp / ki
+                Td = kd / kp
+                tt = np.where(Td > 0, np.sqrt(Ti * Td), Ti)
+            else:
+                tt = np.broadcast_to(np.asarray(self.tt, dtype=float), shape)
+            kb = np.where((ki != 0) & np.isfinite(tt) & (tt > 0), self.dt / (ki * tt), 0.0)
+        self.cached = (alpha, kb)
+        return self.cached
+
+    def compute_inputs(self):
+        self.x[...] = self.get_input('process')
+        if 'setpoint' in self.inputs:
+            self.setpoint[...] = self.get_input('setpoint')
+
+    def compute_outputs(self):
+        self.ep[...] = self.e
+        np.subtract(self.setpoint, self.x, out=self.e) # calculate the errors
+
+        if not self.valid: # like PIDController, the output stays zero the first time
+            self.y[...] = 0.0
+            self.valid = True
+            return
+
+        alpha, kb = self.coefficients()
+        e, E, de, v, y, scratch = self.e, self.E, self.de, self.v, self.y, self.scratch
+
+        # integral
+        np.multiply(e, self.dt, out=scratch)
+        E += scratch
+
+        # filtered derivative: de = alpha de + (1 - alpha) (e - ep) / dt
+        np.subtract(e, self.ep, out=scratch)
+        scratch /= self.dt
+        scratch -= de
+        scratch *= 1.0 - alpha
+        de += scratch
+
+        # unsaturated output, then saturate
+        np.multiply(self.kp, e, out=v)
+        v += np.multiply(self.ki, E, out=scratch)
+        v += np.multiply(self.kd, de, out=scratch)
+        np.minimum(v, self.u_max, out=y) # (np.clip is a lot slower for small arrays)
+        np.maximum(y, self.u_min, out=y)
+
+        # back-calculation: unwind the integral by how much we're saturated
+        np.subtract(y, v, out=scratch)
+        scratch *= kb
+        E += scratch
@@ -3,7 +3,11 @@ from discrete_model import DiscreteModel
 class PIDController(DiscreteModel):
     """
     A discrete model that implements a PID controller.
+
+    Everything here is plain arithmetic, so in a batched world the gains and setpoint
+    can be arrays with one value per instance.
     """
+    state_attributes = DiscreteModel.state_attributes + ('E', 'ep', 'e', 'de')
 
     def __init__(
             self, 
@@ -42,7 +46,7 @@ class PIDController(DiscreteModel):
         if self.valid: # This prevents weird stuff from happening with the derivative term.
             # calculate the integral (trapezoidal approximation)
             self.E += self.e * self.dt
-            # TODO: Consider adding anti-windup protection here.
+            # (See PIDBank for a version with anti-windup protection.)
 
             # calculate the derivative
             self.de = (self.e - self.ep) / self.dt
@@ -1,9 +1,18 @@
+from concurrent.futures import ProcessPoolExecutor
 import h5py
 import sys
 import numpy as np
 
 import matplotlib.pyplot as plt
 
+from log_reader import TimeIndex, logger_groups
+
+# About how many frames analyze() reads at a time
+DEFAULT_BLOCK_SIZE = 1 << 20
+
+# Where build_pyramid() puts the decimated copies of each logger
+PYRAMID = '_pyramid'
+
 class Plotter:
     """
     Loads logged hdf5 data for plotting.
@@ -11,9 +20,15 @@ class Plotter:
     def __init__(self, file_id):
         self.f = h5py.File(f"{file_id}.h5", 'r')
 
-    def plot(self, group):
+    def plot(self, group, t_start: float = None, t_end: float = None, width: int = None):
         """
-        Plot a single logger.
+        Plot a single logger, optionally just between t_start and t_end.
+
+        Long logs get decimated to about width buckets (by default, one per pixel of
+        the figure), and we plot the min and max of each bucket so that peaks don't
+        disappear. Only the frames in the time window get read, and if the file has a
+        pyramid (see build_pyramid), those come from the coarsest level that's still
+        finer than the buckets, so plotting doesn't depend on the length of the log.
         """
         # Get columns for group
         if group not in self.f:
@@ -31,14 +46,21 @@ class Plotter:
             raise IOError(f"dataset {group} contained no columns except time")
         
         # Create subplots for each column except t
-        self.fig, self.ax = plt.subplots(len(columns), 1)
+        self.fig, self.ax = plt.subplots(len(columns), 1, squeeze=False)
+        self.ax = self.ax[:,0]
         self.fig.suptitle(group)
+        if width is None:
+            width = int(self.fig.get_figwidth() * self.fig.dpi)
+
+        # Find the window
+        t_dataset = self.f[group]['t']
+        index = TimeIndex(t_dataset) if t_start is not None or t_end is not None else None
+        start = 0 if t_start is None else index.find(t_start, 'left')
+        end = t_dataset.shape[0] if t_end is None else index.find(t_end, 'right')
 
-        t = self.f[group]['t'][:]
         for i, column in enumerate(columns):
-            if column == 't':
-                continue
-            self.ax[i].plot(t, self.f[group][column][:])
+            t, lo, hi = self.decimated(group, column, start, end, width)
+            self.ax[i].plot(*interleave(t, lo, hi))
 
             # Optionally set the label (if a label is given)
             if column in labels:
@@ -48,53 +70,226 @@ class Plotter:
 
         self.ax[-1].set_xlabel('t')
 
+    def decimated(self, group, column, start: int, end: int, width: int, block_size=DEFAULT_BLOCK_SIZE):
+        """
+        Get (t, min, max) for frames start through end - 1 of a column, in about width
+        buckets (or every frame, if there aren't many more frames than that).
+        """
+        count = max(end - start, 0)
+        bucket = max(1, count // width)
+
+        # Start from the coarsest level of the pyramid that fits in a bucket
+        size = 1
+        source = (self.f[group]['t'], self.f[group][column], self.f[group][column])
+        levels = self.f.get(f"{PYRAMID}/{group}")
+        if levels is not None and levels.attrs['frames'] == self.f[group]['t'].shape[0]:
+            for level in levels.values():
+                if level.attrs['size'] <= bucket and level.attrs['size'] > size:
+                    size = int(level.attrs['size'])
+                    source = (level['t'], level[f"{column}_min"], level[f"{column}_max"])
+        start, end = start // size, -(-end // size)
+        bucket = max(1, bucket // size)
+
+        # Stream through the window, bucketing as we go
+        t_dataset, lo_dataset, hi_dataset = source
+        block_size = max(1, block_size // bucket) * bucket
+        pieces = []
+        for block_start in range(start, end, block_size):
+            block_end = min(block_start + block_size, end)
+            lo, hi = read_minmax(lo_dataset, hi_dataset, block_start, block_end)
+            pieces.append(minmax_buckets(t_dataset[block_start:block_end], lo, hi, bucket))
+        if len(pieces) == 0:
+            return np.zeros(0), np.zeros(0), np.zeros(0)
+        return tuple(np.concatenate(arrays) for arrays in zip(*pieces))
+
     def show(self):
         plt.show()
 
+    def close(self):
+        self.f.close()
+
     def analyze(
             self,
             group='low_rate_log',
             error_column='e',
             setpoint_column='setpoint',
             settling_threshold=0.05,
+            block_size=DEFAULT_BLOCK_SIZE,
         ):
         """
-        Compute and display performance metrics on an error signal.
-        
-        This method is a bit of a hack. It would be nice 
+        Compute performance metrics on an error signal, returning them as a dict with
+        rmse, peak_response_time, settling_time (None if it never settles), and
+        overshoot (the fraction of the time the error is negative).
+
+        The columns are streamed through in blocks of about block_size frames
+        (rounded to a whole number of hdf5 chunks), so this works on logs that are
+        too big to fit in memory.
         """
-        e = self.f[group][error_column][:]  # Assuming 'e' is the error signal
-        setpoint = self.f[group][setpoint_column][:]  # Assuming 'setpoint' is the setpoint signal
-        t = self.f[group]['t'][:]
-        
-        # Calculate RMSE from error
-        rmse = np.sqrt(np.mean(e ** 2))
-        
-        # Settling time: find the time it takes for the error to fall to within settling_threshold
-        # percent of the setpoint.
-        threshold = np.max(np.abs(setpoint)) * settling_threshold
-        within_threshold_indices = np.abs(e) <= threshold
-        # Start at the end of within_threshold_indices and work backwards until we find
-        # one that isn't True
-        for index in range(len(within_threshold_indices) - 1, -1, -1):
-            if not within_threshold_indices[index]:
+        e_dataset = self.f[group][error_column]
+        setpoint_dataset = self.f[group][setpoint_column]
+        t_dataset = self.f[group]['t']
+        n = e_dataset.shape[0]
+        if n == 0:
+            raise ValueError(f"no data in {group}/{error_column}")
+
+        sum_squares = 0.0
+        negative = 0
+        peak = -1.0
+        peak_index = 0
+        max_setpoint = 0.0
+        block_max = [] # (start, end, max |e|) of each block, for the settling time
+
+        for start, end in blocks(e_dataset, block_size):
+            e = e_dataset[start:end].astype(float)
+            abs_e = np.abs(e)
+
+            sum_squares += np.dot(e, e)
+            negative += np.count_nonzero(e < 0)
+
+            index = np.argmax(abs_e)
+            if abs_e[index] > peak: # strictly, so we keep the first peak
+                peak = abs_e[index]
+                peak_index = start + index
+
+            max_setpoint = max(max_setpoint, np.max(np.abs(setpoint_dataset[start:end])))
+            block_max.append((start, end, np.max(abs_e)))
+
+        # Settling time: the start of the run of samples at the end where the error is
+        # within settling_threshold of the setpoint. So we want the last sample that's
+        # outside the threshold, which is in the last block whose max is outside it.
+        threshold = max_setpoint * settling_threshold
+        settling_index = 0
+        for start, end, block_peak in reversed(block_max):
+            if block_peak > threshold:
+                outside = np.flatnonzero(np.abs(e_dataset[start:end].astype(float)) > threshold)
+                settling_index = start + outside[-1] + 1
                 break
-            else:
-                threshold_index = index
 
-        settling_time = t[threshold_index] if len(within_threshold_indices) > 0 else None
+        return {
+            'rmse': float(np.sqrt(sum_squares / n)),
+            'peak_response_time': float(t_dataset[peak_index]),
+            'settling_time': float(t_dataset[settling_index]) if settling_index < n else None,
+            'overshoot': negative / n,
+        }
 
-        # Peak response time: find first peak in error signal
-        peak_response_time = t[np.argmax(np.abs(e))]
-        
-        # Overshoot: find percentage of time points where e is less than zero
-        overshoot = np.sum(e < 0) / len(e)
-        
-        # Print the metrics
-        print(f"RMSE: {rmse}")
-        print(f"Peak Response Time: {peak_response_time} time units")
-        print(f"Settling Time: {settling_time} time units (within {100 * settling_threshold}% of setpoint)")
-        print(f"Overshoot: {100 * overshoot}%")
+def read_minmax(lo_dataset, hi_dataset, start: int, end: int):
+    """
+    Read frames start through end - 1 of the min and max datasets, only reading once
+    if they're the same dataset (as they are for raw data).
+    """
+    lo = lo_dataset[start:end]
+    hi = lo if hi_dataset == lo_dataset else hi_dataset[start:end]
+    return lo, hi
+
+def minmax_buckets(t, lo, hi, size: int):
+    """
+    Combine every size frames of (t, min, max) into one, with the time of the first.
+    The min and max arrays can have more dimensions (e.g. a batch dimension) after
+    the first.
+    """
+    starts = np.arange(0, len(t), size)
+    if len(starts) == 0:
+        return t, lo, hi
+    return t[starts], np.minimum.reduceat(lo, starts, axis=0), np.maximum.reduceat(hi, starts, axis=0)
+
+def interleave(t, lo, hi):
+    """
+    Turn buckets of (t, min, max) into one line which goes to the min and then the
+    max of each bucket.
+    """
+    if np.array_equal(lo, hi):
+        return t, lo
+    return np.repeat(t, 2), np.stack([lo, hi], axis=1).reshape((-1,) + lo.shape[1:])
+
+def build_pyramid(basename: str, groups=None, factor: int = 16, min_length: int = 1000, block_size=DEFAULT_BLOCK_SIZE):
+    """
+    Write a multi-resolution pyramid of a log file's groups into the file, for fast
+    plotting of long logs (see Plotter.plot). Level k has the (t, min, max) of each
+    run of factor ** k frames, and we keep adding levels until they get shorter
+    than min_length. The pyramid goes in the _pyramid group, so rebuild it if the
+    log changes.
+
+    Args:
+        basename: the log file name (without .h5)
+        groups: names of the logger groups (defaults to all of them, see logger_groups)
+        factor: how many frames of each level go into one frame of the next
+        min_length: don't make levels shorter than this
+        block_size: about how many frames to read at a time
+    """
+    with h5py.File(f"{basename}.h5", 'a') as f:
+        if groups is None:
+            groups = logger_groups(f)
+        for group in groups:
+            path = f"{PYRAMID}/{group}"
+            if path in f:
+                del f[path]
+            levels = f.require_group(path)
+            frames = f[group]['t'].shape[0]
+            levels.attrs['frames'] = frames
+
+            columns = [name for name in f[group] if name != 't']
+            sources = {'t': f[group]['t']}
+            for column in columns:
+                sources[f"{column}_min"] = f[group][column]
+                sources[f"{column}_max"] = f[group][column]
+
+            size = factor
+            length = -(-frames // factor)
+            while length >= min_length:
+                level = levels.create_group(f"level_{len(levels) + 1}")
+                level.attrs['size'] = size
+                for name, source in sources.items():
+                    level.create_dataset(name, shape=(length,) + source.shape[1:], dtype=source.dtype)
+
+                # Fill the level in from the one before it, a block at a time
+                step = max(1, block_size // factor) * factor
+                for start in range(0, sources['t'].shape[0], step):
+                    end = min(start + step, sources['t'].shape[0])
+                    out = slice(start // factor, -(-end // factor))
+                    t = sources['t'][start:end]
+                    level['t'][out] = t[::factor]
+                    for column in columns:
+                        lo, hi = read_minmax(sources[f"{column}_min"], sources[f"{column}_max"], start, end)
+                        t_out, lo, hi = minmax_buckets(t, lo, hi, factor)
+                        level[f"{column}_min"][out] = lo
+                        level[f"{column}_max"][out] = hi
+
+                sources = {name: level[name] for name in sources}
+                size *= factor
+                length = -(-length // factor)
+
+def blocks(dataset, block_size: int):
+    """
+    Split a dataset's first axis into (start, end) ranges of about block_size rows,
+    lined up with the dataset's chunks (if it has any) so every read covers whole
+    chunks.
+    """
+    n = dataset.shape[0]
+    if dataset.chunks is not None:
+        chunk = dataset.chunks[0]
+        block_size = max(1, round(block_size / chunk)) * chunk
+    for start in range(0, n, block_size):
+        yield start, min(start + block_size, n)
+
+def analyze_file(basename: str, **kwargs):
+    """
+    Analyze a single log file (see Plotter.analyze for the arguments).
+    """
+    plotter = Plotter(basename)
+    try:
+        return plotter.analyze(**kwargs)
+    finally:
+        plotter.close()
+
+def analyze_files(basenames, max_workers: int = None, **kwargs):
+    """
+    Analyze many log files in parallel over a process pool, returning a list with the
+    metrics dict for each file (in the same order as basenames).
+    """
+    basenames = list(basenames)
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        futures = [pool.submit(analyze_file, basename, **kwargs) for basename in basenames]
+        return [future.result() for future in futures]
 
 
 if __name__ == "__main__":
@@ -105,6 +300,10 @@ if __name__ == "__main__":
         p.plot(log)
 
     # Can also print out a few performance metrics for the PID controller.
-    p.analyze('low_rate_log', 'e')
+    metrics = p.analyze('low_rate_log', 'e')
+    print(f"RMSE: {metrics['rmse']}")
+    print(f"Peak Response Time: {metrics['peak_response_time']} time units")
+    print(f"Settling Time: {metrics['settling_time']} time units (within 5.0% of setpoint)")
+    print(f"Overshoot: {100 * metrics['overshoot']}%")
 
     p.show()
@@ -0,0 +1,114 @@
+from array import array
+import time
+
+import numpy as np
+
+# Methods we time (in addition to update) if a model has them. The logger's flush is
+# dump_buffers, and write is the part of it that actually hits the file (which
+# happens on the writer thread if we're writing asynchronously).
+PHASES = ('compute_inputs', 'integrate', 'compute_outputs', 'generate', 'dump_buffers', 'write')
+
+class Profiler:
+    """
+    Opt-in instrumentation for the simulation loop. When attached to a world, this
+    wraps World.cycle, each model's update(), and the phases of update() listed in
+    PHASES, recording the wall time (from time.perf_counter_ns) of every call.
+
+    The wrappers are installed as instance attributes, so when the profiler isn't
+    attached there's nothing left in the way and no overhead at all. Note that only
+    models which are in the world when it's attached get profiled.
+
+    Phases are nested inside update(), so their times are included in the update
+    times, and update times are included in the cycle times.
+    """
+    def __init__(self, world):
+        self.world = world
+        self.samples = {} # array of call durations (ns) by (model name, method name)
+        self.wrapped = [] # (object, method name) pairs we've wrapped
+
+    def wrap(self, obj, method: str, key):
+        """
+        Replace obj.method with a version that times itself.
+        """
+        fn = getattr(obj, method)
+        samples = self.samples.setdefault(key, array('q'))
+        append = samples.append
+        clock = time.perf_counter_ns
+
+        def timed(*args, **kwargs):
+            start = clock()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                append(clock() - start)
+
+        setattr(obj, method, timed)
+        self.wrapped.append((obj, method))
+
+    def attach(self):
+        """Start profiling."""
+        if len(self.wrapped) > 0:
+            raise ValueError("profiler already attached")
+
+        self.wrap(self.world, 'cycle', ('world', 'cycle'))
+        for name in self.world.order:
+            model = self.world.models[name]
+            self.wrap(model, 'update', (name, 'update'))
+            for phase in PHASES:
+                if callable(getattr(model, phase, None)):
+                    self.wrap(model, phase, (name, phase))
+
+    def detach(self):
+        """Stop profiling (the samples so far are kept)."""
+        for obj, method in self.wrapped:
+            delattr(obj, method) # uncovers the original method on the class
+        self.wrapped = []
+
+    def summary(self):
+        """
+        Get statistics on each profiled method that's been called, as a dict by
+        (model name, method name). Times are in seconds.
+        """
+        summary = {}
+        for key, samples in self.samples.items():
+            if len(samples) == 0:
+                continue
+            ns = np.array(samples, dtype=np.int64)
+            p50, p90, p99 = np.percentile(ns, [50, 90, 99]) * 1e-9
+            summary[key] = {
+                'calls': len(ns),
+                'total': ns.sum() * 1e-9,
+                'mean': ns.mean() * 1e-9,
+                'p50': p50,
+                'p90': p90,
+                'p99': p99,
+                'max': ns.max() * 1e-9,
+            }
+        return summary
+
+    def report(self) -> str:
+        """
+        Get a text table of the summary, sorted by total time.
+        """
+        summary = self.summary()
+        lines = [f"{'model':<24} {'method':<16} {'calls':>10} {'total ms':>10} "
+                 f"{'mean us':>10} {'p50 us':>10} {'p99 us':>10} {'max us':>10}"]
+        for (name, method), stats in sorted(summary.items(), key=lambda item: -item[1]['total']):
+            lines.append(f"{name:<24} {method:<16} {stats['calls']:>10} {1e3 * stats['total']:>10.2f} "
+                         f"{1e6 * stats['mean']:>10.2f} {1e6 * stats['p50']:>10.2f} "
+                         f"{1e6 * stats['p99']:>10.2f} {1e6 * stats['max']:>10.2f}")
+        return "\n".join(lines)
+
+    def write(self, group, samples: bool = True):
+        """
+        Write the profile into an (empty) hdf5 group, with a subgroup per model and
+        the summary statistics of each method as attributes of a dataset holding the
+        call durations in ns (the dataset is left empty if samples is False).
+        """
+        summary = self.summary()
+        for (name, method), stats in summary.items():
+            model_group = group.require_group(name)
+            data = np.array(self.samples[(name, method)], dtype=np.int64) if samples else np.zeros(0, dtype=np.int64)
+            dataset = model_group.create_dataset(method, data=data)
+            for stat, value in stats.items():
+                dataset.attrs[stat] = value
@@ -0,0 +1,155 @@
+from array import array
+import time
+
+import numpy as np
+
+class RateGroupStats:
+    """
+    Timing statistics for one rate group (all of the models with the same dt).
+
+    A rate group's deadline for a frame is its next release, i.e. the models which
+    fire at time t have to finish before the wall clock reaches t + dt (scaled by the
+    speed factor). Anything later is a deadline miss, and how much later is the
+    overrun.
+    """
+    def __init__(self, dt: float):
+        self.dt = dt
+        self.frames = 0
+        self.misses = 0
+        self.t_missed = array('d')  # frame times of the misses
+        self.overruns = array('d')  # how late each miss was (wall clock seconds)
+
+    @property
+    def max_overrun(self) -> float:
+        return max(self.overruns) if len(self.overruns) > 0 else 0.0
+
+class RealTimePacer:
+    """
+    Paces the world against the wall clock (time.perf_counter, which is monotonic),
+    optionally sped up or slowed down by a speed factor, and keeps track of how well
+    we're keeping up.
+
+    To wait for a frame, we sleep until shortly before it's due and then spin for the
+    rest, since sleep() alone can wake up late by much more than we'd like.
+
+    If we fall behind, frames run as soon as possible until we catch back up to the
+    original timeline (we never skip frames).
+    """
+    def __init__(self, speed: float = 1.0, spin: float = 0.001):
+        """
+        Args:
+            speed: how many simulated time units per wall clock second (e.g. 10.0 runs
+                ten times faster than real time)
+            spin: how long before a frame is due (in seconds) to stop sleeping and
+                start spinning
+        """
+        if speed <= 0.0:
+            raise ValueError("speed must be positive")
+        self.speed = speed
+        self.spin = spin
+
+        self.wall_start = None # wall clock time corresponding to t_start
+        self.t_start = 0.0
+
+        # Per-frame records
+        self.t = array('d')         # simulation time of each frame
+        self.lateness = array('d')  # how late each frame started (jitter), in seconds
+        self.duration = array('d')  # how long each frame took to run, in seconds
+
+        self.rate_groups = {} # RateGroupStats by dt
+        self.frame_groups = {} # cache of which rate groups fire in a frame (by its models' dts)
+
+    def deadline(self, t: float) -> float:
+        """Wall clock time at which simulation time t is due."""
+        return self.wall_start + (t - self.t_start) / self.speed
+
+    def start(self, t: float):
+        """Anchor simulation time t to the current wall clock time."""
+        self.wall_start = time.perf_counter()
+        self.t_start = t
+
+    def wait(self, t: float) -> float:
+        """
+        Wait until it's time to run the frame at simulation time t, returning the wall
+        clock time at which the frame starts.
+        """
+        deadline = self.deadline(t)
+        remaining = deadline - time.perf_counter()
+        if remaining > self.spin:
+            time.sleep(remaining - self.spin)
+
+        now = time.perf_counter()
+        while now < deadline:
+            now = time.perf_counter()
+        return now
+
+    def record(self, t: float, models, started: float):
+        """
+        Record the timing of a frame that started at wall clock time started, and in
+        which the given models were updated.
+        """
+        finished = time.perf_counter()
+        self.t.append(t)
+        self.lateness.append(started - self.deadline(t))
+        self.duration.append(finished - started)
+
+        # Look up (or work out) the rate groups for this frame. This is keyed on the
+        # dts rather than the frame itself, since the event-driven scheduler makes a
+        # new tuple of models every frame, and there are only so many mixes of rates.
+        key = tuple(model.dt for model in models)
+        groups = self.frame_groups.get(key)
+        if groups is None:
+            groups = []
+            # (models with no dt only run on events, so they don't have deadlines)
+            for dt in sorted({dt for dt in key if dt is not None}):
+                if dt not in self.rate_groups:
+                    self.rate_groups[dt] = RateGroupStats(dt)
+                groups.append(self.rate_groups[dt])
+            self.frame_groups[key] = groups
+
+        for group in groups:
+            group.frames += 1
+            overrun = finished - self.deadline(t + group.dt)
+            if overrun > 0.0:
+                group.misses += 1
+                group.t_missed.append(t)
+                group.overruns.append(overrun)
+
+    def summary(self):
+        """
+        Get the timing statistics as a dict (times are in seconds).
+        """
+        lateness = np.array(self.lateness) if len(self.lateness) > 0 else np.zeros(1)
+        duration = np.array(self.duration) if len(self.duration) > 0 else np.zeros(1)
+        return {
+            'speed': self.speed,
+            'frames': len(self.t),
+            'max_lateness': float(np.max(lateness)),
+            'p99_lateness': float(np.percentile(lateness, 99)),
+            'max_duration': float(np.max(duration)),
+            'rate_groups': {
+                dt: {
+                    'frames': group.frames,
+                    'misses': group.misses,
+                    'max_overrun': group.max_overrun,
+                }
+                for dt, group in self.rate_groups.items()
+            },
+        }
+
+    def write(self, group):
+        """
+        Write the timing records into an (empty) hdf5 group for post-run analysis.
+        """
+        group.attrs['speed'] = self.speed
+        group['t'] = np.array(self.t)
+        group['lateness'] = np.array(self.lateness)
+        group['duration'] = np.array(self.duration)
+
+        for dt, stats in self.rate_groups.items():
+            subgroup = group.create_group(f"dt_{dt:g}")
+            subgroup.attrs['dt'] = dt
+            subgroup.attrs['frames'] = stats.frames
+            subgroup.attrs['misses'] = stats.misses
+            subgroup['t_missed'] = np.array(stats.t_missed)
+            subgroup['overrun'] = np.array(stats.overruns)
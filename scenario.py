@@ -0,0 +1,66 @@
+from mass_spring_damper import MassSpringDamper
+from pid_controller import PIDController
+from gaussian_noise import GaussianNoise
+from logger import Logger
+
+def build_scenario(
+        world,
+        desired_x: float,
+        m: float = 4.0,
+        k: float = 2.0,
+        b: float = 3.0,
+        kp: float = 40.0,
+        ki: float = 2.0,
+        kd: float = 4.0,
+        sigma: float = 0.01,
+        logging: bool = True,
+):
+    """
+    Set up the example closed loop (a mass-spring-damper with a noisy position sensor
+    and a PID controller) in the given world, along with its loggers.
+
+    In a batched world, any of the numeric arguments may be arrays with one value per
+    instance.
+
+    Args:
+        world: the (empty) world to add the models to
+        desired_x: the desired position of the mass (PID controller setpoint)
+        m, k, b: mass, spring constant, and damping constant
+        kp, ki, kd: PID gains
+        sigma: standard deviation of the sensor noise
+        logging: whether to add the loggers
+
+    Returns:
+        a dict of the models, by name
+    """
+    # Add the models to the world. The plant only needs updating when the force
+    # changes (at the controller's rate), but we simulate and log it at 100 Hz.
+    msd = MassSpringDamper(world, 'mass_spring_damper', m=m, k=k, b=b, dt=0.1, substep=0.01)
+    sensor = GaussianNoise(world, 'sensor', sigma=sigma, dt=0.1)
+    pid = PIDController(world, 'pid', dt=0.1, kp=kp, ki=ki, kd=kd, setpoint=desired_x)
+
+    # Define the connections between the model inputs and outputs (the force is what
+    # the controller put out last frame, which closes the loop)
+    msd.add_input('force', 'pid.y', delay=True)
+    sensor.add_input('process', 'mass_spring_damper.y', 0)
+    pid.add_input('process', 'sensor.y')
+
+    if logging:
+        # Now add the loggers (the high rate one gets every substep of the plant)
+        high_rate_log = Logger(world, 'high_rate_log', dt=None)
+        low_rate_log  = Logger(world, 'low_rate_log', dt=0.1)
+        msd.log_substeps(high_rate_log)
+
+        # Now define logging inputs
+        high_rate_log.add_input('position', 'mass_spring_damper.y', 0)
+        high_rate_log.add_input('velocity', 'mass_spring_damper.x', 1)
+        high_rate_log.add_input('force', 'mass_spring_damper.u')
+        low_rate_log.add_input('E', 'pid.E', label="E(t)")
+        low_rate_log.add_input('e', 'pid.e', label="e(t)")
+        low_rate_log.add_input('de', 'pid.de', label="de(t)/dt")
+        low_rate_log.add_input('pid_y', 'pid.y', label="PID output")
+        low_rate_log.add_input('mu', 'sensor.mu', label="sensor noise")
+        low_rate_log.add_input('sensor_y', 'sensor.y', label="sensor output")
+        low_rate_log.add_input('setpoint', 'pid.setpoint')
+
+    return dict(world.models)
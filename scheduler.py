@@ -0,0 +1,235 @@
+from bisect import bisect_right
+import heapq
+from fractions import Fraction
+import math
+
+# Most rates we care about are "nice" decimals like 0.01 or 0.1, but we allow for
+# anything representable as a fraction with a reasonable denominator.
+MAX_DENOMINATOR = 1000000
+
+# Largest hyperperiod (in base ticks) that we're willing to build a table for.
+MAX_HYPERPERIOD = 1000000
+
+# The "period" of a one-shot event in the event scheduler's queue
+ONE_SHOT = 0
+
+def to_fraction(dt: float) -> Fraction:
+    """
+    Convert a model time step into an exact fraction, complaining if it can't be
+    represented accurately.
+    """
+    if dt <= 0.0:
+        raise ValueError(f"time step {dt} must be positive")
+    fraction = Fraction(dt).limit_denominator(MAX_DENOMINATOR)
+    if not math.isclose(float(fraction), dt, rel_tol=1e-9):
+        raise ValueError(f"time step {dt} is not a rational multiple of a usable base rate")
+    return fraction
+
+class RateGroupScheduler:
+    """
+    Static rate-group scheduler.
+
+    All of the model time steps are converted into integer multiples of a base tick
+    (the GCD of the time steps), and the update schedule for one hyperperiod (the LCM
+    of the time steps) is precomputed as a table of minor frames. Only frames in which
+    at least one model fires go into the table, so each cycle costs the number of
+    models that actually update, and since time is computed from an integer tick
+    count, there's no floating point drift and no missed updates.
+
+    Models are scheduled from tick zero, i.e. a model with period n ticks fires on
+    ticks n, 2n, 3n, ..., which matches starting every model at t = 0.
+    """
+    def __init__(self, models, t: float = 0.0):
+        """
+        Args:
+            models: the models to schedule, in the order they should be updated within
+                a frame
+            t: the current time (the first frame will be the first one after t)
+        """
+        self.models = list(models)
+        if len(self.models) == 0:
+            raise ValueError("no models to schedule")
+        for model in self.models:
+            if model.dt is None:
+                raise ValueError(f"model {model.name} has no dt, so it needs the event-driven scheduler")
+
+        fractions = [to_fraction(model.dt) for model in self.models]
+
+        # Put everything over a common denominator so that we can work in integers.
+        denominator = math.lcm(*[fraction.denominator for fraction in fractions])
+        numerators = [fraction.numerator * (denominator // fraction.denominator) for fraction in fractions]
+        base = math.gcd(*numerators)
+
+        # Each base tick lasts base / denominator time units.
+        self.tick_numerator = base
+        self.tick_denominator = denominator
+        self.periods = [numerator // base for numerator in numerators]
+        self.hyperperiod = math.lcm(*self.periods)
+
+        if self.hyperperiod > MAX_HYPERPERIOD:
+            raise ValueError(f"hyperperiod of {self.hyperperiod} ticks is too long to schedule")
+
+        # Build the table of (tick offset, models) for the frames in one hyperperiod.
+        # Ticks run from 1 to hyperperiod inclusive, since nothing fires at tick 0.
+        firing = {}
+        for model, period in zip(self.models, self.periods):
+            for offset in range(period, self.hyperperiod + 1, period):
+                firing.setdefault(offset, []).append(model)
+        self.frames = [(offset, tuple(firing[offset])) for offset in sorted(firing)]
+
+        self.seek(t)
+
+    @property
+    def base_dt(self) -> float:
+        """Length of the base tick."""
+        return self.tick_numerator / self.tick_denominator
+
+    def time(self, tick: int) -> float:
+        """Get the time corresponding to a tick count (exact up to one rounding)."""
+        return tick * self.tick_numerator / self.tick_denominator
+
+    def seek(self, t: float):
+        """
+        Position the scheduler so that the next frame is the first one after time t.
+        """
+        self.tick = round(t * self.tick_denominator / self.tick_numerator) # most recent tick
+        self.cycles, offset = divmod(self.tick, self.hyperperiod) # complete hyperperiods so far
+        self.frame = bisect_right([frame[0] for frame in self.frames], offset) # next frame
+        if self.frame == len(self.frames):
+            self.frame = 0
+            self.cycles += 1
+
+    def next_frame(self):
+        """
+        Advance to the next frame, returning its time and the models that should be
+        updated (in order).
+        """
+        offset, models = self.frames[self.frame]
+        self.tick = self.cycles * self.hyperperiod + offset
+
+        self.frame += 1
+        if self.frame == len(self.frames):
+            self.frame = 0
+            self.cycles += 1
+
+        return self.time(self.tick), models
+
+class EventScheduler:
+    """
+    Event-driven scheduler.
+
+    Instead of a table of frames, this keeps a priority queue of (time, model) events,
+    so each frame costs O(log n) in the number of events that are actually due, no
+    matter how many models are in the world or how different their rates are.
+
+    Periodic models (with a dt) put their next update back on the queue every time
+    they fire. Models can also be updated at any other time with schedule(), e.g. a
+    setpoint change or a fault, and models with dt = None only ever run when they're
+    scheduled. A model that's due more than once at the same time is only updated
+    once.
+
+    Like the rate-group scheduler, event times are kept as integer ticks (of 1 /
+    denominator time units, where the denominator grows if an event needs a finer
+    tick), so periodic models don't drift, and models which are due at the same time
+    always end up in the same frame, in the order they were given.
+    """
+    def __init__(self, models, t: float = 0.0, events=()):
+        """
+        Args:
+            models: the models to schedule, in the order they should be updated within
+                a frame
+            t: the current time (the first frame will be the first one after t)
+            events: (time, model) pairs for one-shot updates
+        """
+        self.models = list(models)
+        self.priority = {id(model): i for i, model in enumerate(self.models)}
+
+        # Models that are part of a group (e.g. a CoupledGroup) get updated by it.
+        self.units = {}
+        for model in self.models:
+            for member in getattr(model, 'models', ()):
+                self.units[id(member)] = model
+
+        fractions = [None if model.dt is None else to_fraction(model.dt) for model in self.models]
+        self.denominator = math.lcm(1, *[fraction.denominator for fraction in fractions if fraction is not None])
+        self.periods = [None if fraction is None else int(fraction * self.denominator) for fraction in fractions]
+
+        self.seek(t)
+        for event_t, model in events:
+            self.schedule(model, event_t)
+
+    def to_tick(self, t: float) -> int:
+        """
+        Convert a time into ticks, making the ticks finer first if we need to.
+        """
+        fraction = Fraction(t).limit_denominator(MAX_DENOMINATOR)
+        if self.denominator % fraction.denominator != 0:
+            factor = math.lcm(self.denominator, fraction.denominator) // self.denominator
+            self.denominator *= factor
+            self.tick *= factor
+            self.periods = [None if period is None else period * factor for period in self.periods]
+            self.queue = [(fire * factor, i, period * factor) for fire, i, period in self.queue]
+            heapq.heapify(self.queue)
+        return int(fraction * self.denominator)
+
+    def seek(self, t: float):
+        """
+        Position the scheduler so that the next frame is the first one after time t.
+        This drops any one-shot events.
+        """
+        self.tick = 0
+        self.queue = []
+        self.tick = self.to_tick(t)
+        for i, period in enumerate(self.periods):
+            if period is not None:
+                # Periodic models fire on multiples of their period, like they would
+                # have if we'd started at zero.
+                fire = (self.tick // period + 1) * period
+                heapq.heappush(self.queue, (fire, i, period))
+
+    def schedule(self, model, t: float):
+        """
+        Update the model at time t (which has to be after the current frame).
+        """
+        model = self.units.get(id(model), model)
+        if id(model) not in self.priority:
+            raise KeyError(f"model {model.name} isn't scheduled")
+        fire = self.to_tick(t)
+        if fire <= self.tick:
+            raise ValueError(f"can't schedule {model.name} at {t}, which isn't after the current time {self.tick / self.denominator}")
+        heapq.heappush(self.queue, (fire, self.priority[id(model)], ONE_SHOT))
+
+    def pending(self):
+        """
+        Get the one-shot events which haven't happened yet, as (time, model) pairs
+        (for a group, that's its first model).
+        """
+        events = []
+        for fire, i, period in sorted(self.queue):
+            if period == ONE_SHOT:
+                model = self.models[i]
+                events.append((fire / self.denominator, getattr(model, 'models', [model])[0]))
+        return events
+
+    def next_frame(self):
+        """
+        Advance to the next frame, returning its time and the models that should be
+        updated (in order).
+        """
+        queue = self.queue
+        if len(queue) == 0:
+            raise ValueError("nothing left to schedule")
+
+        tick = queue[0][0]
+        indices = []
+        while len(queue) > 0 and queue[0][0] == tick:
+            fire, i, period = queue[0]
+            if len(indices) == 0 or indices[-1] != i: # the heap gives them to us in order
+                indices.append(i)
+            if period == ONE_SHOT:
+                heapq.heappop(queue)
+            else:
+                heapq.heapreplace(queue, (fire + period, i, period))
+
+        self.tick = tick
+        return tick / self.denominator, tuple(self.models[i] for i in indices)
@@ -0,0 +1,46 @@
+import numpy as np
+
+from dynamic_model import DynamicModel
+
+SIGNALS = ('x', 'u', 'y')
+
+class StateStore:
+    """
+    One contiguous array each for the states (x), inputs (u), and outputs (y) of all
+    of the dynamic models in the world, with each model's x, u, and y bound to a view
+    of its piece (see DynamicModel.bind). The models update their views in place, so
+    everything that reads them (connections, loggers, checkpoints) reads the same
+    memory, and nothing gets allocated from step to step.
+
+    The world builds this when it's compiled, in model order. (Coupled models get
+    their states moved again, into their group's stacked state vector, when the
+    schedule gets built; see CoupledGroup.)
+
+    Discrete models aren't in here: their x, u, and y are Python scalars that get
+    rebound every step rather than arrays that get written into, so there's no
+    memory of theirs to share.
+    """
+    def __init__(self, models):
+        self.models = [model for model in models if isinstance(model, DynamicModel)]
+        self.slices = {} # slice of each store array by (model name, signal)
+
+        for signal in SIGNALS:
+            values = [(model, getattr(model, signal)) for model in self.models]
+            values = [(model, value) for model, value in values if value is not None]
+
+            size = sum(value.size for model, value in values)
+            store = np.zeros(size)
+            offset = 0
+            for model, value in values:
+                piece = slice(offset, offset + value.size)
+                model.bind(signal, store[piece].reshape(value.shape))
+                self.slices[(model.name, signal)] = piece
+                offset += value.size
+
+            setattr(self, signal, store)
+
+    def view(self, name: str, signal: str):
+        """
+        Get the flat piece of the store holding a model's x, u, or y.
+        """
+        return getattr(self, signal)[self.slices[(name, signal)]]
@@ -0,0 +1,200 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+import itertools
+import os
+import sys
+
+import h5py
+import numpy as np
+import numpy.random as npr
+
+METRICS = ('rmse', 'peak_response_time', 'settling_time', 'overshoot')
+
+def grid(**axes):
+    """
+    Make a list of parameter sets from the cartesian product of the given values,
+    e.g. grid(kp=[10.0, 40.0], kd=[1.0, 4.0]) gives four parameter sets.
+    """
+    names = list(axes)
+    return [dict(zip(names, values)) for values in itertools.product(*axes.values())]
+
+def run_case(basename: str, params: dict, duration: float, seed_sequence, checkpoint: bytes = None):
+    """
+    Run a single case of the example scenario in its own world (and its own hdf5
+    file), and analyze it. This is what runs in the worker processes.
+
+    Args:
+        basename: the log file name for this case (without .h5)
+        params: build_scenario arguments (must include desired_x)
+        duration: simulation duration
+        seed_sequence: numpy SeedSequence for this case's random number generator
+        checkpoint: if given, start from this checkpoint (see World.checkpoint) rather
+            than from the beginning
+
+    Returns:
+        the dict of metrics from Plotter.analyze
+    """
+    # Import here so the parent process doesn't need these just to hand out work.
+    from world import World
+    from scenario import build_scenario
+    from plotter import analyze_file
+
+    world = World(basename, rng=npr.default_rng(seed_sequence))
+    try:
+        build_scenario(world, **params)
+        world.setup_logging()
+        if checkpoint is not None:
+            world.restore(checkpoint, restore_rng=False)
+        while world.t < duration:
+            world.cycle()
+    finally:
+        world.finish_logging()
+
+    return analyze_file(basename)
+
+def run_sweep(
+        param_sets,
+        duration: float,
+        prefix: str = "sweep",
+        seed: int = 0,
+        max_workers: int = None,
+        retries: int = 1,
+        checkpoint: bytes = None,
+):
+    """
+    Run the example scenario for each parameter set, in parallel over a process pool.
+
+    Each case logs to its own file ({prefix}_00000.h5, {prefix}_00001.h5, ...) and gets
+    its own random number generator, spawned from a SeedSequence so the sweep is
+    reproducible no matter which worker runs which case. When everything's done,
+    {prefix}_index.h5 gets a summary of every case: its file, parameters, status,
+    and metrics.
+
+    A case that raises an exception is recorded as failed without affecting the rest.
+    If a worker process dies outright (which breaks the whole pool), the cases that
+    didn't finish are rerun one at a time, each in a pool of its own, up to retries
+    times, so only the case that kills its worker ends up failed.
+
+    If the cases share a warm-up (e.g. they only differ in parameters that don't
+    matter until later), run it once, take a checkpoint, and pass it in, and every
+    case forks from there instead of starting from the beginning.
+
+    Args:
+        param_sets: list of dicts of build_scenario arguments (each with desired_x)
+        duration: simulation duration for each case
+        prefix: prefix for the output file names
+        seed: root seed for the sweep
+        max_workers: number of worker processes (defaults to the number of cores)
+        retries: how many times to rerun a case after its worker dies
+        checkpoint: optional checkpoint (from World.checkpoint) to start every case from
+
+    Returns:
+        a list of dicts, one per case, with keys basename, params, status, error, and
+        metrics
+    """
+    param_sets = list(param_sets)
+    seed_sequences = np.random.SeedSequence(seed).spawn(len(param_sets))
+
+    results = [
+        {
+            'basename': f"{prefix}_{index:05d}",
+            'params': params,
+            'status': 'pending',
+            'error': '',
+            'metrics': None,
+        }
+        for index, params in enumerate(param_sets)
+    ]
+
+    def run_pool(indices, workers):
+        """Run the given cases in a new pool, returning the ones whose worker died."""
+        broken = []
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {}
+            for index in indices:
+                future = pool.submit(run_case, results[index]['basename'], results[index]['params'],
+                                     duration, seed_sequences[index], checkpoint)
+                futures[future] = index
+
+            for future in as_completed(futures):
+                index = futures[future]
+                try:
+                    results[index]['metrics'] = future.result()
+                    results[index]['status'] = 'ok'
+                except BrokenProcessPool as e:
+                    broken.append(index)
+                    results[index]['status'] = 'failed'
+                    results[index]['error'] = f"worker died: {e}"
+                except Exception as e:
+                    results[index]['status'] = 'failed'
+                    results[index]['error'] = f"{type(e).__name__}: {e}"
+        return sorted(broken)
+
+    broken = run_pool(range(len(results)), max_workers)
+
+    # A worker dying takes every case that was still running down with it, so rerun
+    # those one at a time, which finds the one that did it without taking the others
+    # down again.
+    for index in broken:
+        for attempt in range(retries):
+            if len(run_pool([index], 1)) == 0:
+                break
+
+    write_index(f"{prefix}_index", results)
+    return results
+
+def param_column(values):
+    """
+    Turn the values of one parameter across the cases (None for cases without it)
+    into an array for the index. Numbers and booleans keep their own dtype if every
+    case has them, and otherwise become floats with NaN for the missing ones.
+    Anything else gets stored as strings (empty for the missing ones).
+    """
+    if all(value is None or isinstance(value, (bool, int, float, np.bool_, np.number)) for value in values):
+        if None not in values:
+            return np.array(values)
+        return np.array([np.nan if value is None else float(value) for value in values])
+    return np.array(["" if value is None else str(value) for value in values], dtype=h5py.string_dtype())
+
+def write_index(basename: str, results):
+    """
+    Write the summary of a sweep to {basename}.h5, with one row per case: a column
+    for the file name, status, and error message, one for each parameter (see
+    param_column for their dtypes), and one for each metric (metrics that don't
+    apply to a case are NaN).
+    """
+    param_names = sorted({name for result in results for name in result['params']})
+
+    with h5py.File(f"{basename}.h5", 'w') as f:
+        f['basename'] = [result['basename'] for result in results]
+        f['status'] = [result['status'] for result in results]
+        f['error'] = [result['error'] for result in results]
+
+        params = f.create_group('params')
+        for name in param_names:
+            params[name] = param_column([result['params'].get(name) for result in results])
+
+        metrics = f.create_group('metrics')
+        for name in METRICS:
+            values = []
+            for result in results:
+                value = result['metrics'][name] if result['metrics'] is not None else None
+                values.append(np.nan if value is None else float(value))
+            metrics[name] = values
+
+
+if __name__ == "__main__":
+    # Sweep the proportional and derivative gains
+    if len(sys.argv) not in (3, 4):
+        raise SyntaxError("Usage: python sweep.py <duration> <desired_x> [max_workers]")
+    duration = float(sys.argv[1])
+    desired_x = float(sys.argv[2])
+    max_workers = int(sys.argv[3]) if len(sys.argv) == 4 else os.cpu_count()
+
+    param_sets = grid(desired_x=[desired_x], kp=[10.0, 20.0, 40.0, 80.0], kd=[1.0, 2.0, 4.0, 8.0])
+    results = run_sweep(param_sets, duration, max_workers=max_workers)
+
+    for result in results:
+        metrics = result['metrics'] or {}
+        print(f"{result['basename']}: {result['status']} {result['params']} "
+              f"rmse={metrics.get('rmse')} settling_time={metrics.get('settling_time')}")
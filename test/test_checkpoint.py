@@ -0,0 +1,142 @@
+import numpy as np
+import numpy.random as npr
+import os
+import tempfile
+import unittest
+
+import h5py
+
+from world import World
+from scenario import build_scenario
+
+class TestCheckpoint(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.worlds = []
+
+    def tearDown(self) -> None:
+        for world in self.worlds:
+            world.finish_logging()
+        self.tmpdir.cleanup()
+
+    def make_world(self, name: str, seed: int = 0, **params):
+        world = World(os.path.join(self.tmpdir.name, name), rng=npr.default_rng(seed=seed))
+        build_scenario(world, 5.0, **params)
+        world.setup_logging()
+        self.worlds.append(world)
+        return world
+
+    def run_until(self, world, t: float):
+        while world.t < t - 1e-9:
+            world.cycle()
+
+    def assert_same_state(self, a, b):
+        self.assertAlmostEqual(a.t, b.t)
+        for name in a.order:
+            for attribute, value in a.models[name].get_state().items():
+                np.testing.assert_array_equal(value, b.models[name].get_state()[attribute],
+                                              err_msg=f"{name}.{attribute}")
+
+    def test_resume(self):
+        reference = self.make_world("reference")
+        self.run_until(reference, 6.0)
+
+        first = self.make_world("first")
+        self.run_until(first, 3.0)
+        checkpoint = first.checkpoint()
+        self.assertIsInstance(checkpoint, bytes)
+
+        # A fresh world, built the same way, picks up where the first one left off
+        resumed = self.make_world("resumed", seed=1) # the rng state comes from the checkpoint
+        resumed.restore(checkpoint)
+        self.assertEqual(resumed.t, first.t)
+        self.run_until(resumed, 6.0)
+        self.assert_same_state(reference, resumed)
+
+        # Its log starts with the frames that were still buffered at the checkpoint
+        resumed.finish_logging()
+        reference.finish_logging()
+        with h5py.File(os.path.join(self.tmpdir.name, "resumed.h5"), 'r') as f:
+            t = f['low_rate_log']['t'][:]
+        np.testing.assert_allclose(t[0], 0.1)
+        np.testing.assert_allclose(t[-1], 6.0)
+
+    def test_new_segment(self):
+        """A log restored into a new file starts with the frames that were buffered"""
+        def make_world(name):
+            world = World(os.path.join(self.tmpdir.name, name), rng=npr.default_rng(seed=0))
+            build_scenario(world, 5.0)
+            world.models['low_rate_log'].buffer_size = 8 # so some frames get written
+            world.setup_logging()
+            self.worlds.append(world)
+            return world
+
+        first = make_world("first")
+        self.run_until(first, 3.0)
+        checkpoint = first.checkpoint()
+        self.run_until(first, 4.0)
+        first.finish_logging()
+
+        resumed = make_world("resumed")
+        resumed.restore(checkpoint)
+        self.run_until(resumed, 4.0)
+        resumed.finish_logging()
+
+        with h5py.File(os.path.join(self.tmpdir.name, "first.h5"), 'r') as f:
+            t_first = f['low_rate_log']['t'][:]
+            self.assertNotIn('first_frame', f['low_rate_log'].attrs)
+        with h5py.File(os.path.join(self.tmpdir.name, "resumed.h5"), 'r') as f:
+            t_resumed = f['low_rate_log']['t'][:]
+            first_frame = f['low_rate_log'].attrs['first_frame']
+
+        # 30 frames by the checkpoint, 24 of them written (three full buffers)
+        self.assertEqual(first_frame, 24)
+        np.testing.assert_allclose(t_resumed, t_first[first_frame:])
+
+    def test_rewind(self):
+        world = self.make_world("rewind")
+        self.run_until(world, 1.0)
+        checkpoint = world.checkpoint()
+        self.run_until(world, 2.0)
+        state = {name: world.models[name].get_state() for name in world.order}
+
+        world.restore(checkpoint)
+        self.assertAlmostEqual(world.t, 1.0)
+        self.run_until(world, 2.0)
+        for name in world.order:
+            for attribute, value in state[name].items():
+                np.testing.assert_array_equal(value, world.models[name].get_state()[attribute])
+
+    def test_file(self):
+        path = os.path.join(self.tmpdir.name, "checkpoint.npz")
+        world = self.make_world("file")
+        self.run_until(world, 1.0)
+        world.checkpoint(path)
+
+        restored = self.make_world("restored", kp=80.0)
+        restored.restore(path)
+        self.assert_same_state(world, restored)
+        self.assertEqual(restored.models['pid'].kp, 80.0) # parameters aren't part of the state
+
+    def test_restore_rng(self):
+        world = self.make_world("rng")
+        self.run_until(world, 1.0)
+        checkpoint = world.checkpoint()
+
+        fork = self.make_world("fork", seed=5)
+        state = fork.rng.bit_generator.state
+        fork.restore(checkpoint, restore_rng=False)
+        self.assertEqual(fork.rng.bit_generator.state, state)
+
+    def test_mismatched_world(self):
+        world = self.make_world("mismatched")
+        checkpoint = world.checkpoint()
+
+        other = World(os.path.join(self.tmpdir.name, "other"))
+        self.worlds.append(other)
+        with self.assertRaises(KeyError):
+            other.restore(checkpoint)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import numpy as np
+import unittest
+
+from world import World
+from dynamic_model import DynamicModel
+from discrete_model import DiscreteModel
+
+from test.test_pid_controller import InputHarness # input.y = 5
+
+class Pendulum(DynamicModel):
+    """
+    A damped pendulum with a torque input (which is nonlinear, so no zoh for us).
+    """
+    def compute_inputs(self):
+        self.u = self.get_input('torque')
+
+    def dynamics(self, t, x):
+        return np.array([x[1], -np.sin(x[0]) - 0.5 * x[1] + self.u])
+
+    def compute_outputs(self):
+        self.y = np.array(self.x)
+
+class TestDynamicModel(unittest.TestCase):
+
+    def setUp(self):
+        self.world = World("test")
+        self.input = InputHarness(self.world, "input", dt=0.1)
+
+    def tearDown(self) -> None:
+        self.world.finish_logging()
+
+    def make_pendulum(self, name, **kwargs):
+        pendulum = Pendulum(self.world, name, x=np.array([1.0, 0.0]), u=0.0, dt=0.01, **kwargs)
+        pendulum.add_input('torque', 'input.u')
+        return pendulum
+
+    def step_models(self, *models, steps=500):
+        for i in range(1, steps + 1):
+            for model in models:
+                model.update(i * 0.01)
+
+    def test_integrator_selection(self):
+        self.assertEqual(self.make_pendulum("default").integrator, 'solve_ivp')
+
+        with self.assertRaises(ValueError):
+            self.make_pendulum("zoh", integrator='zoh') # not linear
+
+        with self.assertRaises(ValueError):
+            self.make_pendulum("euler", method='Euler')
+
+    def test_persistent(self):
+        """The persistent integrator should agree with solve_ivp, with fewer evaluations"""
+        reference = self.make_pendulum("reference", rtol=1e-8, atol=1e-10)
+        solve_ivp = self.make_pendulum("solve_ivp")
+        persistent = self.make_pendulum("persistent", integrator='persistent')
+        self.step_models(reference, solve_ivp, persistent)
+
+        np.testing.assert_allclose(persistent.x, reference.x, atol=1e-3)
+        self.assertLess(persistent.nfev, solve_ivp.nfev / 2)
+
+    def test_persistent_methods(self):
+        reference = self.make_pendulum("reference", rtol=1e-8, atol=1e-10)
+        models = [self.make_pendulum(method, integrator='persistent', method=method)
+                  for method in ['RK23', 'BDF', 'LSODA']]
+        self.step_models(reference, *models)
+
+        for model in models:
+            np.testing.assert_allclose(model.x, reference.x, atol=5e-3) # default rtol is 1e-3
+
+    def test_persistent_reset(self):
+        """The solver should only restart when u changes"""
+        persistent = self.make_pendulum("persistent", integrator='persistent')
+        self.step_models(persistent, steps=10)
+        solver = persistent.solver
+
+        self.step_models(persistent, steps=20)
+        self.assertIs(persistent.solver, solver)
+
+        self.input.u = 1.0
+        persistent.update(0.21)
+        self.assertIsNot(persistent.solver, solver)
+        self.assertEqual(persistent.t, 0.21)
+
+    def test_indexed_output_before_update(self):
+        """An indexed input on y, which a dynamic model doesn't have until it updates"""
+        pendulum = self.make_pendulum("pend")
+        self.assertIsNone(pendulum.y)
+        sensor = DiscreteModel(self.world, "sensor", dt=0.01)
+        sensor.add_input('process', 'pend.y', 0)
+        self.world.setup_logging()
+
+        for i in range(10):
+            self.world.cycle()
+        self.assertEqual(sensor.x, pendulum.y[0])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,12 @@
+import numpy as np
+import numpy.random as npr
+import os
+import tempfile
+import types
+
 import unittest
 
-from world import World
+from world import World, seed_sequence
 from gaussian_noise import GaussianNoise
 
 from test.test_pid_controller import InputHarness
@@ -16,8 +22,14 @@ class TestGaussianNoise(unittest.TestCase):
 
         self.input.update(0.1)
 
+        self.tmpdir = tempfile.TemporaryDirectory()
+
     def tearDown(self) -> None:
         self.world.finish_logging()
+        self.tmpdir.cleanup()
+
+    def make_world(self, name, seed=0, **kwargs):
+        return World(os.path.join(self.tmpdir.name, name), rng=npr.default_rng(seed), **kwargs)
 
     def test_compute_inputs_and_outputs(self):
         self.noise.compute_inputs()
@@ -25,5 +37,117 @@ class TestGaussianNoise(unittest.TestCase):
         self.noise.compute_outputs()
         self.assertNotEqual(self.noise.y, 5.0)
 
+    def make_noise(self, name, seed=0, **kwargs):
+        world = self.make_world("streams", seed)
+        noise = GaussianNoise(world, name, **kwargs)
+        samples = [noise.mu]
+        for i in range(99):
+            noise.generate()
+            samples.append(noise.mu)
+        world.finish_logging()
+        return np.array(samples)
+
+    def test_streams(self):
+        """Each noise source should get its own stream, whatever the block size"""
+        samples = self.make_noise("a", block_size=1024)
+        np.testing.assert_equal(self.make_noise("a", block_size=7), samples)
+        colored = self.make_noise("a", tau=1.0)
+        np.testing.assert_allclose(self.make_noise("a", tau=1.0, block_size=7), colored)
+        np.testing.assert_allclose(self.make_noise("a", tau=np.array([1.0, 1.0]), shape=(2,), block_size=7)[:,0],
+                                   self.make_noise("a", tau=1.0, shape=(2,))[:,0])
+        self.assertFalse(np.array_equal(self.make_noise("b"), samples))
+        self.assertFalse(np.array_equal(self.make_noise("a", seed=1), samples))
+
+        # Other models (drawing from world.rng or not) don't change the stream, and
+        # noise sources never draw from world.rng
+        world = self.make_world("streams")
+        state = world.rng.bit_generator.state
+        GaussianNoise(world, "b")
+        self.assertEqual(world.rng.bit_generator.state, state)
+        world.rng.normal()
+        noise = GaussianNoise(world, "a")
+        self.assertEqual(noise.mu, samples[0])
+        world.finish_logging()
+
+    def test_seed_sequence(self):
+        """Each world gets a SeedSequence of its own, spawned from the generator's"""
+        rng = npr.default_rng(0)
+        first, second = seed_sequence(rng), seed_sequence(rng)
+        self.assertNotEqual(first.spawn_key, second.spawn_key)
+        self.assertEqual(first.spawn_key, seed_sequence(npr.default_rng(0)).spawn_key)
+
+        # Without one, the entropy gets drawn from the generator
+        seedless = types.SimpleNamespace(bit_generator=types.SimpleNamespace(state=None), integers=rng.integers)
+        self.assertNotEqual(seed_sequence(seedless).entropy, seed_sequence(seedless).entropy)
+
+    def test_separate_worlds(self):
+        """Worlds which aren't seeded the same shouldn't get the same noise"""
+        def noise(world):
+            noise = GaussianNoise(world, "noise")
+            world.finish_logging()
+            return noise.samples
+
+        defaults = [noise(World(os.path.join(self.tmpdir.name, f"default{i}"))) for i in range(2)]
+        self.assertFalse(np.array_equal(defaults[0], defaults[1]))
+
+        rng = npr.default_rng(0)
+        shared = [noise(World(os.path.join(self.tmpdir.name, f"shared{i}"), rng=rng)) for i in range(2)]
+        self.assertFalse(np.array_equal(shared[0], shared[1]))
+
+        # but the same seed still gives the same noise
+        np.testing.assert_equal(noise(self.make_world("seeded")), shared[0])
+
+    def test_shape(self):
+        """Vector-valued noise should take per-element sigmas"""
+        samples = self.make_noise("a", shape=(3,), sigma=np.array([0.0, 1.0, 2.0]))
+        self.assertEqual(samples.shape, (100, 3))
+        np.testing.assert_equal(samples[:,0], 0.0)
+        unit = self.make_noise("a", shape=(3,))
+        np.testing.assert_allclose(samples[:,1:], unit[:,1:] * [1.0, 2.0])
+
+        world = self.make_world("batched", batch_size=4)
+        noise = GaussianNoise(world, "a", shape=(3,))
+        self.assertEqual(noise.mu.shape, (4, 3))
+        world.finish_logging()
+
+        with self.assertRaises(ValueError):
+            GaussianNoise(self.world, "negative", sigma=-1.0)
+        with self.assertRaises(ValueError):
+            GaussianNoise(self.world, "white", tau=0.0)
+
+    def test_gauss_markov(self):
+        """Gauss-Markov noise should have sigma and phi = exp(-dt / tau)"""
+        world = self.make_world("streams")
+        noise = GaussianNoise(world, "a", dt=0.1, sigma=2.0, tau=0.5, shape=(2000,))
+        first = noise.mu.copy()
+        noise.generate()
+        world.finish_logging()
+
+        phi = np.exp(-0.2)
+        self.assertAlmostEqual(np.std(noise.mu), 2.0, delta=0.1)
+        self.assertAlmostEqual(np.corrcoef(first, noise.mu)[0,1], phi, delta=0.05)
+
+    def test_state(self):
+        """Restoring a state should pick the stream up where it left off"""
+        noise = GaussianNoise(self.world, "restored", dt=0.1, tau=1.0, block_size=4)
+        for i in range(5):
+            noise.generate()
+        state = noise.get_state()
+        samples = []
+        for i in range(5):
+            noise.generate()
+            samples.append(noise.mu)
+
+        noise.set_state(state)
+        for i in range(5):
+            noise.generate()
+            self.assertEqual(noise.mu, samples[i])
+
+        # Without the generator's state, we carry on with our own samples
+        del state['rng']
+        noise.set_state(state)
+        noise.generate()
+        self.assertNotEqual(noise.mu, samples[0])
+
 if __name__ == '__main__':
     unittest.main()
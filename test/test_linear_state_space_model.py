@@ -0,0 +1,56 @@
+import numpy as np
+
+import unittest
+
+from world import World
+from linear_state_space_model import LinearStateSpaceModel
+from mass_spring_damper import MassSpringDamper
+
+from test.test_pid_controller import InputHarness # input.y = 5
+
+class TestLinearStateSpaceModel(unittest.TestCase):
+
+    def setUp(self):
+        self.world = World("test")
+        self.input = InputHarness(self.world, "input", dt=0.1)
+
+        # A first-order lag, xdot = -2 x + 2 u, with y = 3 x + u
+        self.lag = LinearStateSpaceModel(self.world, "lag", A=[[-2.0]], B=[[2.0]],
+                                         C=[[3.0]], D=[[1.0]], dt=0.1)
+        self.lag.add_input('u', 'input.y')
+        self.input.update(0.1)
+
+    def tearDown(self) -> None:
+        self.world.finish_logging()
+
+    def test_update(self):
+        self.assertEqual(self.lag.integrator, 'zoh')
+        self.lag.update(0.1)
+
+        x = 5.0 * (1.0 - np.exp(-0.2))
+        np.testing.assert_allclose(self.lag.x, [x])
+        np.testing.assert_allclose(self.lag.y, [3.0 * x + 5.0])
+
+    def test_dynamics(self):
+        self.lag.u = 5.0
+        x = np.array([1.0])
+        np.testing.assert_allclose(self.lag.dynamics(0.0, x), [8.0])
+
+        # We get a new array every time (the solvers need that)
+        self.assertIsNot(self.lag.dynamics(0.0, x), self.lag.dynamics(0.0, x))
+
+    def test_parameter_change(self):
+        msd = MassSpringDamper(self.world, "msd", dt=0.1, m=2.0, k=4.0, b=6.0)
+        msd.add_input('force', 'input.y')
+        msd.update(0.1)
+
+        A, B = msd.state_space()
+        self.assertIs(msd.state_space()[0], A) # cached
+        self.assertEqual(A[1,0], -2.0)
+        self.assertIn(("msd", 0.1), self.world.discretizations)
+
+        # Assigning a parameter rebuilds the matrices and forgets the discretization
+        msd.k = 8.0
+        self.assertNotIn(("msd", 0.1), self.world.discretizations)
+        A, B = msd.state_space()
+        self.assertEqual(A[1,0], -4.0)
@@ -0,0 +1,69 @@
+import h5py
+import numpy as np
+import os
+import tempfile
+import unittest
+
+from log_reader import LogReader, TimeIndex
+
+class TestLogReader(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.basename = os.path.join(self.tmpdir.name, "log")
+
+        # A 100 Hz and a 10 Hz logger, like the example's
+        self.t_high = np.arange(1, 10001) * 0.01
+        self.t_low = np.arange(1, 1001) * 0.1
+        with h5py.File(f"{self.basename}.h5", 'w') as f:
+            high = f.create_group('high_rate_log')
+            high.create_dataset('t', data=self.t_high, chunks=(64,))
+            high.create_dataset('position', data=np.sin(self.t_high), chunks=(64,))
+            high.create_dataset('velocity', data=np.cos(self.t_high), chunks=(64,))
+            low = f.create_group('low_rate_log')
+            low.create_dataset('t', data=self.t_low, chunks=(64,))
+            low.create_dataset('e', data=self.t_low * 2.0, chunks=(64,))
+            # and the timing stats of a paced run, which aren't a logger
+            realtime = f.create_group('realtime')
+            realtime.create_dataset('t', data=self.t_high[:10])
+            realtime.create_group('dt_0.01').create_dataset('overrun', data=np.zeros(10))
+
+        self.reader = LogReader(self.basename)
+
+    def tearDown(self) -> None:
+        self.reader.close()
+        self.tmpdir.cleanup()
+
+    def test_time_index(self):
+        index = TimeIndex(self.reader.f['high_rate_log']['t'], max_entries=10)
+        self.assertEqual(index.stride, 1024) # whole chunks
+        self.assertEqual(len(index.t), 10)
+        for t in [0.0, 0.01, 0.015, 10.24, 50.0, 100.0, 200.0]:
+            self.assertEqual(index.find(t), np.searchsorted(self.t_high, t, side='left'))
+            self.assertEqual(index.find(t, 'right'), np.searchsorted(self.t_high, t, side='right'))
+
+    def test_read(self):
+        self.assertEqual(sorted(self.reader.groups()), ['high_rate_log', 'low_rate_log'])
+        with self.assertRaises(KeyError):
+            self.reader.read('realtime')
+
+        data = self.reader.read('high_rate_log', 35.0, 36.0, columns=['position'])
+        self.assertEqual(sorted(data), ['position', 't'])
+        np.testing.assert_allclose(data['t'][[0, -1]], [35.0, 36.0])
+        self.assertEqual(len(data['t']), 101)
+        np.testing.assert_allclose(data['position'], np.sin(data['t']))
+
+        # Empty and whole windows
+        self.assertEqual(len(self.reader.read('low_rate_log', 500.0, 600.0)['e']), 0)
+        self.assertEqual(len(self.reader.read('low_rate_log')['e']), 1000)
+
+    def test_read_aligned(self):
+        columns = {'high_rate_log': ['position'], 'low_rate_log': ['e']}
+        data = self.reader.read_aligned(columns, 9.95, 10.3, 0.05)
+        np.testing.assert_allclose(data['t'], [9.95, 10.0, 10.05, 10.1, 10.15, 10.2, 10.25, 10.3])
+        np.testing.assert_allclose(data['high_rate_log/position'], np.sin(data['t']))
+        # The 10 Hz logger holds its value until the next frame
+        np.testing.assert_allclose(data['low_rate_log/e'], [19.8, 20.0, 20.0, 20.2, 20.2, 20.4, 20.4, 20.6])
+
+        data = self.reader.read_aligned(columns, 0.0, 0.2, 0.05, method='linear')
+        # NaN before the first frame, and interpolated after that
+        np.testing.assert_allclose(data['low_rate_log/e'], [np.nan, np.nan, 0.2, 0.3, 0.4])
@@ -1,7 +1,186 @@
+import h5py
+import numpy as np
+import os
+import tempfile
 import unittest
 
+from world import World
+from logger import Logger, MAX_CHUNK_BYTES
+
+from test.test_pid_controller import InputHarness # input.y = 5
+
 class TestLogger(unittest.TestCase):
-    @unittest.skip("needs logger tests")
-    def test_plot(self):
-        # TODO
-        pass
\ No newline at end of file
+
+    def setUp(self):
+        self.world = World("test")
+        self.input = InputHarness(self.world, "input", dt=0.1)
+        self.logger = Logger(self.world, "log", buffer_size=3, dt=0.1)
+
+        self.logger.add_input('y', 'input.y', label="input output")
+        self.logger.add_input('t_input', 'input.t')
+
+    def tearDown(self) -> None:
+        self.world.finish_logging()
+
+    def test_add_input(self):
+        with self.assertRaises(ValueError):
+            self.logger.add_input('bad name', 'input.x')
+
+    def test_create_log(self):
+        self.world.setup_logging()
+        group = self.world.f['log']
+        self.assertEqual(set(group.keys()), {'t', 'y', 't_input'})
+        self.assertEqual(group.attrs['y'], "input output")
+        self.assertEqual(group['y'].shape, (0,))
+        self.assertEqual(self.logger.block.shape, (3, 2))
+
+    def test_update(self):
+        """Frames should get buffered, and written out when the buffer fills"""
+        self.world.setup_logging()
+        for i in range(7):
+            self.world.cycle()
+
+        group = self.world.f['log']
+        self.assertEqual(group['t'].shape, (6,)) # two full buffers dumped
+        self.assertEqual(self.logger.index, 1)
+
+        self.logger.finalize()
+        self.assertEqual(self.logger.total_logged, 7)
+        np.testing.assert_allclose(group['t'][:], np.arange(1, 8) * 0.1, rtol=1e-6)
+        np.testing.assert_allclose(group['t_input'][:], group['t'][:])
+        np.testing.assert_equal(group['y'][:], 5.0)
+
+    def test_append_frames(self):
+        """Bulk frames should go in across buffer boundaries"""
+        self.world.setup_logging()
+        self.logger.append_frames(np.arange(1, 8) * 0.1, {'y': np.arange(7.0)})
+        self.assertEqual(self.logger.index, 1)
+        self.assertAlmostEqual(self.logger.t, 0.7)
+        self.logger.finalize()
+
+        group = self.world.f['log']
+        np.testing.assert_allclose(group['t'][:], np.arange(1, 8) * 0.1)
+        np.testing.assert_equal(group['y'][:], np.arange(7.0))
+        np.testing.assert_equal(group['t_input'][:], 0.0) # not given
+
+    def test_log_substeps(self):
+        """A substepping model's logger gets every substep, with other inputs held"""
+        from mass_spring_damper import MassSpringDamper
+        msd = MassSpringDamper(self.world, "msd", dt=0.1, substep=0.025)
+        msd.add_input('force', 'input.y')
+        substeps = Logger(self.world, "substeps", dt=None)
+        substeps.add_input('position', 'msd.y', 0)
+        substeps.add_input('velocity', 'msd.x', 1)
+        substeps.add_input('force', 'msd.u')
+        substeps.add_input('input', 'input.y')
+        msd.log_substeps(substeps)
+
+        with self.assertRaises(ValueError):
+            msd.log_substeps(self.logger) # scheduled
+        stepped = MassSpringDamper(self.world, "stepped", dt=0.1)
+        stepped.add_input('force', 'input.y')
+        with self.assertRaises(ValueError):
+            stepped.log_substeps(substeps) # no substeps
+
+        self.world.setup_logging()
+        for i in range(3):
+            self.world.cycle()
+        self.assertEqual(self.world.t, 0.3)
+        substeps.finalize()
+
+        group = self.world.f['substeps']
+        np.testing.assert_allclose(group['t'][:], np.arange(1, 13) * 0.025)
+        np.testing.assert_allclose(group['velocity'][-4:], msd.substep_x[:,1], rtol=1e-6)
+        np.testing.assert_allclose(group['position'][-1], msd.x[0], rtol=1e-6)
+        np.testing.assert_equal(group['force'][:], 5.0)
+        np.testing.assert_equal(group['input'][:], 5.0)
+
+    def test_async_writes(self):
+        """The writer thread should write exactly what the synchronous path would"""
+        self.world.setup_logging(async_writes=True)
+        self.assertTrue(self.world.writer.is_alive())
+
+        for i in range(10):
+            self.world.cycle()
+        self.world.finish_logging()
+        self.assertIsNone(self.world.writer)
+
+        with h5py.File("test.h5", 'r') as f:
+            np.testing.assert_allclose(f['log']['t'][:], np.arange(1, 11) * 0.1)
+            np.testing.assert_allclose(f['log']['t_input'][:], f['log']['t'][:])
+            np.testing.assert_equal(f['log']['y'][:], 5.0)
+
+    def test_async_write_error(self):
+        """Errors on the writer thread should come back to the main thread"""
+        self.world.setup_logging(async_writes=True)
+
+        def broken_write(*args):
+            raise RuntimeError("disk on fire")
+        self.logger.write = broken_write
+
+        for i in range(4):
+            self.world.cycle()
+        with self.assertRaises(IOError):
+            self.world.finish_logging()
+
+    def test_storage_options(self):
+        compressed = Logger(self.world, "compressed", buffer_size=4, dt=0.1, dtype='f8',
+                            compression='gzip', compression_opts=4, shuffle=True)
+        compressed.add_input('y', 'input.y')
+        self.world.setup_logging()
+
+        group = self.world.f['compressed']
+        self.assertEqual(group['y'].dtype, np.float64)
+        self.assertEqual(group['y'].chunks, (4,))
+        self.assertEqual(group['y'].compression, 'gzip')
+        self.assertTrue(group['y'].shuffle)
+
+        # Defaults: float32 columns, float64 time, chunks match the buffer
+        group = self.world.f['log']
+        self.assertEqual(group['y'].dtype, np.float32)
+        self.assertEqual(group['t'].dtype, np.float64)
+        self.assertEqual(group['t'].chunks, (3,))
+        self.assertIsNone(group['t'].compression)
+
+        with self.assertRaises(ValueError):
+            Logger(self.world, "bad", compression='zstd')
+
+    def test_default_chunks(self):
+        """The default chunks follow the buffer size at create_log, not at __init__"""
+        self.logger.buffer_size = 8
+        resized = Logger(self.world, "resized", dt=0.1)
+        resized.add_input('y', 'input.y')
+        resized.buffer_size = 5
+        self.world.setup_logging()
+        self.assertEqual(self.world.f['log']['y'].chunks, (8,))
+        self.assertEqual(self.world.f['resized']['y'].chunks, (5,))
+        self.assertEqual(self.world.f['resized']['t'].chunks, (5,))
+
+    def test_batched_chunks(self):
+        """Wide batched columns get shorter chunks, so that they stay a sensible size"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            world = World(os.path.join(tmpdir, "batched"), batch_size=1000)
+            InputHarness(world, "input", dt=0.1)
+            logger = Logger(world, "log", buffer_size=10000, dt=0.1)
+            logger.add_input('y', 'input.y')
+            world.setup_logging()
+            chunks = world.f['log']['y'].chunks
+            self.assertEqual(chunks, (MAX_CHUNK_BYTES // 4000, 1000))
+            self.assertEqual(world.f['log']['t'].chunks, (chunks[0],))
+            world.finish_logging()
+
+    def test_time_precision(self):
+        """float32 can't tell 100000.01 from 100000.0, but t shouldn't lose it"""
+        self.world.setup_logging()
+        self.logger.update(100000.01)
+        self.logger.finalize()
+        self.assertEqual(self.world.f['log']['t'][0], 100000.01)
+
+    def test_append_frame(self):
+        self.world.setup_logging()
+        self.logger.append_frame(0.5, {'y': 2.0})
+        self.logger.finalize()
+
+        group = self.world.f['log']
+        self.assertEqual(group['y'][0], 2.0)
+        self.assertEqual(group['t_input'][0], 0.0)
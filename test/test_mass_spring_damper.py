@@ -4,6 +4,7 @@ import unittest
 
 from world import World
 from mass_spring_damper import MassSpringDamper
+from dynamic_model import DynamicModel
 
 from test.test_pid_controller import InputHarness # input.y = 5
 
@@ -32,6 +33,60 @@ class TestMassSpringDamper(unittest.TestCase):
         np.testing.assert_equal(first_x, self.msd.x) # x should not change, it's not an input
         self.assertEqual(self.msd.u, 5.0) # u should get set to input.y (which is 5)
 
+    def test_integrators(self):
+        """The exact zoh step should agree with solve_ivp"""
+        self.assertEqual(self.msd.integrator, 'zoh')
+        msd_ivp = MassSpringDamper(self.world, "msd_ivp", dt=0.1,
+                                   m=self.m, k=self.k, b=self.b,
+                                   integrator='solve_ivp')
+        msd_ivp.add_input('force', 'input.y')
+
+        for i in range(1, 101):
+            self.msd.update(i * 0.1)
+            msd_ivp.update(i * 0.1)
+
+        np.testing.assert_allclose(self.msd.x, msd_ivp.x, rtol=1e-3, atol=1e-4)
+
+        # Should settle toward the static deflection u / k
+        self.assertAlmostEqual(self.msd.x[0], 5.0 / self.k, places=2)
+
+    def test_substeps(self):
+        """Substeps should match updating at the substep rate"""
+        fine = MassSpringDamper(self.world, "fine", dt=0.01, m=self.m, k=self.k, b=self.b)
+        fine.add_input('force', 'input.y')
+        for integrator in ['zoh', 'solve_ivp', 'persistent']:
+            coarse = MassSpringDamper(self.world, f"coarse_{integrator}", dt=0.1, substep=0.01,
+                                      m=self.m, k=self.k, b=self.b, integrator=integrator,
+                                      rtol=1e-9, atol=1e-12)
+            coarse.add_input('force', 'input.y')
+            coarse.update(0.1)
+            self.assertEqual(len(coarse.substep_t), 10)
+
+            fine.x = np.zeros(2)
+            fine.t = 0.0
+            for i in range(1, 11):
+                fine.update(i * 0.01)
+                np.testing.assert_allclose(coarse.substep_t[i - 1], fine.t)
+                np.testing.assert_allclose(coarse.substep_x[i - 1], fine.x, atol=1e-9)
+            np.testing.assert_allclose(coarse.x, fine.x, atol=1e-9)
+
+        # Steps that don't divide evenly get split into equal substeps no longer
+        # than substep
+        self.msd.substep = 0.03
+        self.msd.update(0.1)
+        np.testing.assert_allclose(self.msd.substep_t, [0.025, 0.05, 0.075, 0.1])
+        np.testing.assert_allclose(self.msd.substep_outputs(), self.msd.substep_x)
+
+        with self.assertRaises(ValueError):
+            MassSpringDamper(self.world, "bad_substep", substep=0.0)
+
+    def test_zoh_requires_linear_model(self):
+        with self.assertRaises(ValueError):
+            DynamicModel(self.world, "nonlinear", integrator='zoh')
+
+        with self.assertRaises(ValueError):
+            MassSpringDamper(self.world, "bad_integrator", integrator='euler')
+
     @unittest.skip("needs dynamics tests")
     def test_dynamics(self):
         # ... TODO: finish this test
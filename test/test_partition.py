@@ -0,0 +1,137 @@
+import numpy as np
+import numpy.random as npr
+import os
+import tempfile
+import unittest
+
+import h5py
+
+from world import World
+from mass_spring_damper import MassSpringDamper
+from gaussian_noise import GaussianNoise
+from pid_controller import PIDController
+from logger import Logger
+from scheduler import RateGroupScheduler
+from partition import partition, frame_plans, run_partitioned
+from test.test_pid_controller import InputHarness
+
+def build_plants(world, plants: int = 2, noise: bool = True):
+    """
+    Several copies of the example loop, which only meet in a slow logger.
+    """
+    for i in range(plants):
+        msd = MassSpringDamper(world, f"msd_{i}", dt=0.01, k=2.0 + i)
+        pid = PIDController(world, f"pid_{i}", dt=0.1, kp=40.0, ki=2.0, kd=4.0, setpoint=1.0 + i)
+        msd.add_input('force', f"pid_{i}.y", delay=True)
+        if noise:
+            sensor = GaussianNoise(world, f"sensor_{i}", dt=0.1, sigma=0.01)
+            sensor.add_input('process', f"msd_{i}.y", 0)
+            pid.add_input('process', f"sensor_{i}.y")
+        else:
+            pid.add_input('process', f"msd_{i}.y", 0)
+
+        log = Logger(world, f"log_{i}", dt=0.01)
+        log.add_input('position', f"msd_{i}.y", 0)
+
+    slow_log = Logger(world, "slow_log", dt=0.5)
+    for i in range(plants):
+        slow_log.add_input(f"e_{i}", f"pid_{i}.e")
+
+class Fault(InputHarness):
+    def compute_inputs(self):
+        if self.t >= 0.5:
+            raise RuntimeError("fault")
+        super().compute_inputs()
+
+def build_faulty(world):
+    build_plants(world, noise=False)
+    Fault(world, "fault", dt=0.1)
+
+class TestPartition(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self) -> None:
+        self.tmpdir.cleanup()
+
+    def test_partition(self):
+        world = World(os.path.join(self.tmpdir.name, "plants"))
+        build_plants(world, plants=3, noise=False)
+        world.finish_logging()
+
+        # The slow logger ties everything together, unless it's allowed to cross
+        self.assertEqual(len(partition(world, workers=4)), 1)
+        partitions = partition(world, workers=4, min_dt=0.5)
+        self.assertEqual(len(partitions), 4)
+        self.assertIn(["msd_0", "pid_0", "log_0"], partitions)
+        self.assertIn(["slow_log"], partitions)
+
+        # Fewer workers than subgraphs
+        self.assertEqual(sorted(len(names) for names in partition(world, workers=2, min_dt=0.5)), [4, 6])
+
+        # Noise models have their own generators, but models that use world.rng stay
+        # together
+        world = World(os.path.join(self.tmpdir.name, "noisy"))
+        build_plants(world, plants=2)
+        world.finish_logging()
+        partitions = partition(world, workers=4, min_dt=0.1)
+        self.assertFalse(any("sensor_0" in names and "sensor_1" in names for names in partitions))
+        world.models["sensor_0"].uses_rng = True
+        world.models["sensor_1"].uses_rng = True
+        partitions = partition(world, workers=4, min_dt=0.1)
+        self.assertIn(["sensor_0", "sensor_1"], partitions)
+
+    def test_frame_plans(self):
+        world = World(os.path.join(self.tmpdir.name, "plants"))
+        build_plants(world, plants=1)
+        world.finish_logging()
+        partitions = [["msd_0", "pid_0", "log_0", "slow_log"], ["sensor_0"]]
+        frames = RateGroupScheduler(world.scheduled_models()).frames
+        signals, plans = frame_plans(world, frames, partitions)
+        self.assertEqual(signals, {("msd_0", "y"), ("sensor_0", "y")})
+        self.assertEqual(len(plans), len(frames))
+
+        # Nothing crosses at 0.01 s, so no need to line up
+        self.assertEqual([model.name for model in frames[0][1]], ["msd_0", "log_0"])
+        self.assertEqual(plans[0][0], [(False, [], ["msd_0", "log_0"], [("msd_0", "y")])])
+        self.assertEqual(plans[0][1], [(False, [], [], [])])
+
+        # At 0.1 s the sensor comes after the plant and before the controller, so it
+        # waits for the new position, and the controller waits for the new reading
+        self.assertEqual([model.name for model in frames[9][1]], ["msd_0", "sensor_0", "pid_0", "log_0"])
+        self.assertEqual(plans[9][0], [(True, [], ["msd_0"], [("msd_0", "y")]),
+                                       (True, [], [], []),
+                                       (True, [("sensor_0", "y")], ["pid_0", "log_0"], [])])
+        self.assertEqual(plans[9][1], [(True, [], [], []),
+                                       (True, [("msd_0", "y")], ["sensor_0"], [("sensor_0", "y")]),
+                                       (True, [], [], [])])
+
+    def test_matches_serial(self):
+        duration = 1.5
+        serial = World(os.path.join(self.tmpdir.name, "serial"), rng=npr.default_rng(3))
+        build_plants(serial)
+        serial.setup_logging()
+        while serial.t < duration:
+            serial.cycle()
+        serial.finish_logging()
+
+        basename = os.path.join(self.tmpdir.name, "partitioned")
+        world = run_partitioned(build_plants, duration, basename=basename, seed=3, workers=4, min_dt=0.1)
+        self.assertEqual(world.t, serial.t)
+        for name in serial.order:
+            for attribute, value in serial.models[name].get_state().items():
+                if isinstance(serial.models[name], Logger) and attribute != 't':
+                    continue # buffers, which are in the file
+                np.testing.assert_array_equal(world.models[name].get_state()[attribute], value,
+                                              err_msg=f"{name}.{attribute}")
+
+        with h5py.File(f"{basename}.h5", 'r') as f, h5py.File(os.path.join(self.tmpdir.name, "serial.h5"), 'r') as g:
+            for name in ["log_0", "log_1", "slow_log"]:
+                for column in g[name]:
+                    np.testing.assert_array_equal(f[name][column][:], g[name][column][:])
+        self.assertFalse(os.path.exists(f"{basename}_part0.h5"))
+
+    def test_failure(self):
+        basename = os.path.join(self.tmpdir.name, "failed")
+        with self.assertRaises(RuntimeError):
+            run_partitioned(build_faulty, 1.0, basename=basename, workers=2, min_dt=0.5)
@@ -0,0 +1,143 @@
+import numpy as np
+import os
+import tempfile
+
+import unittest
+
+from world import World
+from discrete_model import DiscreteModel
+from pid_controller import PIDController
+from pid_bank import PIDBank
+
+from test.test_pid_controller import InputHarness # input.y = 5
+
+class VectorHarness(DiscreteModel):
+    """
+    A simple model that provides a vector input, one value per channel.
+    """
+    def compute_inputs(self):
+        pass
+
+class TestPIDBank(unittest.TestCase):
+
+    def setUp(self):
+        self.world = World("test")
+        self.input = VectorHarness(self.world, "input", dt=0.1)
+        self.input.y = np.array([5.0, 4.0, 3.0])
+        self.bank = PIDBank(self.world, "bank", 3, dt=0.1, setpoint=0.1)
+
+        self.bank.add_input('process', 'input.y')
+
+    def tearDown(self) -> None:
+        self.world.finish_logging()
+
+    def test_matches_pid_controller(self):
+        """With no limits or filtering, each channel should be a PIDController"""
+        scalar_input = InputHarness(self.world, "scalar_input", dt=0.1)
+        scalar_input.update(0.1)
+        bank = PIDBank(self.world, "single", 1, dt=0.1, kp=2.0, ki=0.5, kd=0.3, setpoint=0.1)
+        pid = PIDController(self.world, "pid", dt=0.1, kp=2.0, ki=0.5, kd=0.3, setpoint=0.1)
+        bank.add_input('process', 'scalar_input.y')
+        pid.add_input('process', 'scalar_input.y')
+
+        for i in range(1, 11):
+            scalar_input.y = 5.0 - 0.3 * i
+            bank.update(i * 0.1)
+            pid.update(i * 0.1)
+            self.assertEqual(bank.y.shape, (1,))
+            self.assertAlmostEqual(bank.y[0], pid.y)
+            self.assertAlmostEqual(bank.E[0], pid.E)
+            self.assertAlmostEqual(bank.de[0], pid.de)
+
+    def test_channels(self):
+        """Each channel should get its own error and gains"""
+        self.bank.kp = np.array([1.0, 2.0, 3.0])
+        self.bank.update(0.1)
+        np.testing.assert_equal(self.bank.y, np.zeros(3))
+        np.testing.assert_allclose(self.bank.e, [-4.9, -3.9, -2.9])
+
+        self.bank.update(0.2)
+        np.testing.assert_allclose(self.bank.E, [-0.49, -0.39, -0.29])
+        np.testing.assert_allclose(self.bank.y, [-4.9 - 0.49, -7.8 - 0.39, -8.7 - 0.29])
+
+    def test_setpoint_input(self):
+        """A setpoint input should override the setpoints"""
+        setpoint = VectorHarness(self.world, "setpoint", dt=0.1)
+        setpoint.y = np.array([5.0, 4.0, 3.0])
+        self.bank.add_input('setpoint', 'setpoint.y')
+        self.bank.update(0.1)
+        self.bank.update(0.2)
+        np.testing.assert_equal(self.bank.e, np.zeros(3))
+        np.testing.assert_equal(self.bank.y, np.zeros(3))
+
+    def test_saturation(self):
+        """The output should saturate, and back-calculation should limit windup"""
+        self.input.y = np.zeros(3)
+        self.bank.setpoint[...] = 10.0
+        self.bank.kd = 0.0
+        self.bank.u_max = np.array([np.inf, 5.0, 5.0])
+        self.bank.tt = np.array([1.0, 1.0, np.inf]) # no anti-windup on the last channel
+
+        for i in range(1, 51):
+            self.bank.update(i * 0.1)
+        self.assertGreater(self.bank.y[0], 5.0)
+        self.assertEqual(self.bank.y[1], 5.0)
+        self.assertEqual(self.bank.y[2], 5.0)
+
+        # With anti-windup, the integral settles where e = (v - y) / (ki tt), so
+        # v = 15 here; without it, the integral keeps growing
+        self.assertAlmostEqual(self.bank.E[0], 49 * 0.1 * 10.0)
+        self.assertAlmostEqual(self.bank.v[1], 15.0, delta=0.1)
+        self.assertAlmostEqual(self.bank.E[2], 49 * 0.1 * 10.0)
+
+        # So once the error changes sign, the anti-windup channel comes off the limit
+        # right away
+        self.input.y[...] = 11.0
+        self.bank.update(5.1)
+        self.assertLess(self.bank.y[1], 5.0)
+        self.assertEqual(self.bank.y[2], 5.0)
+
+    def test_derivative_filter(self):
+        """The filter should spread a step in the error over a few updates"""
+        self.bank.tau = np.array([0.0, 0.1, 1.0])
+        self.bank.update(0.1)
+        self.input.y = self.input.y - 1.0
+        self.bank.update(0.2)
+        np.testing.assert_allclose(self.bank.de, [10.0, 5.0, 10.0 / 11.0])
+        self.bank.update(0.3)
+        np.testing.assert_allclose(self.bank.de, [0.0, 2.5, 100.0 / 121.0])
+
+    def test_in_place(self):
+        """The signals should be updated in place"""
+        y, E = self.bank.y, self.bank.E
+        for i in range(1, 4):
+            self.bank.update(i * 0.1)
+        self.assertIs(self.bank.y, y)
+        self.assertIs(self.bank.E, E)
+
+    def test_batched(self):
+        """In a batched world, the arrays should get a leading batch dimension"""
+        tmpdir = tempfile.TemporaryDirectory()
+        world = World(os.path.join(tmpdir.name, "batched"), batch_size=4)
+        source = VectorHarness(world, "input", dt=0.1)
+        source.y = np.ones((4, 3))
+        bank = PIDBank(world, "bank", 3, dt=0.1, kp=np.array([1.0, 2.0, 3.0]), setpoint=2.0)
+        bank.add_input('process', 'input.y')
+        bank.update(0.1)
+        bank.update(0.2)
+        self.assertEqual(bank.y.shape, (4, 3))
+        np.testing.assert_allclose(bank.y, np.broadcast_to([1.1, 2.1, 3.1], (4, 3)))
+        world.finish_logging()
+        tmpdir.cleanup()
+
+    def test_state(self):
+        """get_state and set_state should pick up where we left off"""
+        self.bank.update(0.1)
+        self.bank.update(0.2)
+        state = self.bank.get_state()
+        self.bank.update(0.3)
+        y = self.bank.y.copy()
+
+        self.bank.set_state(state)
+        self.bank.update(0.3)
+        np.testing.assert_allclose(self.bank.y, y)
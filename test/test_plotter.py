@@ -1,12 +1,111 @@
+import h5py
+import numpy as np
+import os
+import tempfile
 import unittest
 
+import matplotlib
+matplotlib.use('Agg')
+import numpy.random as npr
+
+from plotter import Plotter, analyze_files, build_pyramid
+from scenario import build_scenario
+from world import World
+
+def write_log(basename: str, t, e, setpoint, chunk_size: int = 100):
+    with h5py.File(f"{basename}.h5", 'w') as f:
+        group = f.create_group('low_rate_log')
+        group.create_dataset('t', data=t, chunks=(chunk_size,))
+        group.create_dataset('e', data=e.astype('f'), chunks=(chunk_size,))
+        group.create_dataset('setpoint', data=setpoint.astype('f'), chunks=(chunk_size,))
+
 class TestPlotter(unittest.TestCase):
-    @unittest.skip("needs plotter tests")
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.basename = os.path.join(self.tmpdir.name, "log")
+
+        self.t = np.arange(1, 10001) * 0.01
+        self.e = 5.0 * np.exp(-self.t / 10.0) * np.cos(self.t)
+        write_log(self.basename, self.t, self.e, np.full(10000, 5.0))
+
+    def tearDown(self) -> None:
+        self.tmpdir.cleanup()
+
     def test_plot(self):
-        # TODO
-        pass
+        plotter = Plotter(self.basename)
+        plotter.plot('low_rate_log', width=100)
+        self.assertEqual(len(plotter.ax), 2) # e and setpoint
+
+        # Decimated to min/max pairs, with the peaks intact
+        t, e = plotter.ax[0].lines[0].get_data()
+        self.assertEqual(len(t), 200)
+        self.assertEqual(np.max(e), np.max(self.e.astype('f')))
+        self.assertEqual(np.min(e), np.min(self.e.astype('f')))
+
+        # Just a window, which is short enough to plot every frame
+        plotter.plot('low_rate_log', t_start=10.0, t_end=10.5, width=100)
+        t, e = plotter.ax[0].lines[0].get_data()
+        np.testing.assert_allclose(t, self.t[999:1050])
+        plotter.close()
+
+    def test_pyramid(self):
+        build_pyramid(self.basename, factor=4, min_length=100)
+
+        plotter = Plotter(self.basename)
+        levels = plotter.f['_pyramid']['low_rate_log']
+        self.assertEqual([levels[name].attrs['size'] for name in sorted(levels)], [4, 16, 64])
+        np.testing.assert_array_equal(levels['level_1']['e_max'][:2],
+                                      [np.max(self.e[:4].astype('f')), np.max(self.e[4:8].astype('f'))])
+
+        # Plotting from the pyramid gives the same picture as from the raw data
+        plotter.plot('low_rate_log', width=100)
+        t, e = plotter.ax[0].lines[0].get_data()
+        self.assertEqual(np.max(e), np.max(self.e.astype('f')))
+        self.assertEqual(np.min(e), np.min(self.e.astype('f')))
+        self.assertEqual(t[0], self.t[0])
+        plotter.close()
+
+    def test_pyramid_realtime(self):
+        """The realtime group from a paced run isn't a logger"""
+        basename = os.path.join(self.tmpdir.name, "paced")
+        world = World(basename, rng=npr.default_rng(0))
+        build_scenario(world, 5.0)
+        world.set_realtime(speed=1000.0)
+        world.setup_logging()
+        while world.t < 0.5:
+            world.cycle()
+        world.finish_logging()
+
+        build_pyramid(basename, factor=4, min_length=2)
+        with h5py.File(f"{basename}.h5", 'r') as f:
+            self.assertIn('realtime', f)
+            self.assertEqual(sorted(f['_pyramid']), ['high_rate_log', 'low_rate_log'])
 
-    @unittest.skip("needs analysis tests")
     def test_analysis(self):
-        # TODO
-        pass
\ No newline at end of file
+        e = self.e.astype('f').astype(float)
+        settled = np.flatnonzero(np.abs(e) > 0.25)[-1] + 1
+
+        plotter = Plotter(self.basename)
+        # Small blocks, so the metrics get put together from several of them
+        for block_size in [250, 10000]:
+            metrics = plotter.analyze(block_size=block_size)
+            self.assertAlmostEqual(metrics['rmse'], np.sqrt(np.mean(e ** 2)))
+            self.assertAlmostEqual(metrics['peak_response_time'], self.t[np.argmax(np.abs(e))])
+            self.assertAlmostEqual(metrics['settling_time'], self.t[settled])
+            self.assertAlmostEqual(metrics['overshoot'], np.mean(e < 0))
+        plotter.close()
+
+    def test_never_settles(self):
+        basename = os.path.join(self.tmpdir.name, "unsettled")
+        write_log(basename, self.t, np.ones(10000), np.full(10000, 5.0))
+        plotter = Plotter(basename)
+        self.assertIsNone(plotter.analyze(block_size=300)['settling_time'])
+        plotter.close()
+
+    def test_analyze_files(self):
+        other = os.path.join(self.tmpdir.name, "other")
+        write_log(other, self.t, 2.0 * self.e, np.full(10000, 5.0))
+
+        results = analyze_files([self.basename, other], max_workers=2)
+        self.assertEqual(len(results), 2)
+        self.assertAlmostEqual(results[1]['rmse'], 2.0 * results[0]['rmse'], places=5)
@@ -0,0 +1,64 @@
+import h5py
+import unittest
+
+from world import World
+from logger import Logger
+from mass_spring_damper import MassSpringDamper
+
+from test.test_pid_controller import InputHarness
+
+class TestProfiler(unittest.TestCase):
+
+    def setUp(self):
+        self.world = World("test")
+        self.input = InputHarness(self.world, "input", dt=0.1)
+        self.msd = MassSpringDamper(self.world, "msd", dt=0.01)
+        self.logger = Logger(self.world, "log", buffer_size=5, dt=0.1)
+
+        self.msd.add_input('force', 'input.y')
+        self.logger.add_input('x', 'msd.y', 0)
+
+    def tearDown(self) -> None:
+        self.world.finish_logging()
+
+    def test_profile(self):
+        profiler = self.world.enable_profiling()
+        self.world.setup_logging()
+        for i in range(100):
+            self.world.cycle()
+
+        summary = profiler.summary()
+        self.assertEqual(summary[('world', 'cycle')]['calls'], 100)
+        self.assertEqual(summary[('msd', 'update')]['calls'], 100)
+        self.assertEqual(summary[('msd', 'integrate')]['calls'], 100)
+        self.assertEqual(summary[('input', 'compute_outputs')]['calls'], 10)
+        self.assertEqual(summary[('log', 'dump_buffers')]['calls'], 1)
+        self.assertNotIn(('log', 'compute_inputs'), summary) # never called
+
+        stats = summary[('msd', 'update')]
+        self.assertGreater(stats['total'], 0.0)
+        self.assertLessEqual(stats['p50'], stats['max'])
+
+        report = profiler.report()
+        self.assertIn('integrate', report)
+
+        self.world.finish_logging()
+        with h5py.File("test.h5", 'r') as f:
+            dataset = f['profile']['msd']['update']
+            self.assertEqual(dataset.shape, (100,))
+            self.assertEqual(dataset.attrs['calls'], 100)
+
+    def test_detach(self):
+        self.world.enable_profiling()
+        self.assertIn('update', vars(self.msd))
+
+        self.world.disable_profiling()
+        self.assertNotIn('update', vars(self.msd))
+        self.assertNotIn('cycle', vars(self.world))
+
+        # Should still run fine, and not record anything
+        self.world.cycle()
+        self.assertEqual(self.world.profiler.summary(), {})
+
+if __name__ == '__main__':
+    unittest.main()
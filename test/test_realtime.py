@@ -0,0 +1,90 @@
+import h5py
+import os
+import tempfile
+import time
+import unittest
+
+from world import World
+from realtime import RealTimePacer
+
+from test.test_pid_controller import InputHarness
+
+class SlowModel(InputHarness):
+    """
+    A model that takes longer to update than its time step allows.
+    """
+    def update(self, t):
+        time.sleep(0.03)
+        super().update(t)
+
+class TestRealTimePacer(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.basename = os.path.join(self.tmpdir.name, "test")
+        self.world = World(self.basename)
+        self.fast = InputHarness(self.world, "fast", dt=0.01)
+        self.slow = InputHarness(self.world, "slow", dt=0.1)
+
+    def tearDown(self) -> None:
+        self.world.finish_logging()
+        self.tmpdir.cleanup()
+
+    def test_invalid_speed(self):
+        with self.assertRaises(ValueError):
+            RealTimePacer(speed=0.0)
+
+    def test_pacing(self):
+        """A speed of 10 should take about a tenth of the simulated time"""
+        self.world.set_realtime(speed=10.0)
+
+        start = time.perf_counter()
+        while self.world.t < 1.0:
+            self.world.cycle()
+        elapsed = time.perf_counter() - start
+
+        self.assertGreaterEqual(elapsed, 0.099) # the last frame is due 0.1 s after we start
+        self.assertLess(elapsed, 0.5)
+
+        summary = self.world.pacer.summary()
+        self.assertEqual(summary['frames'], 100)
+        self.assertEqual(summary['rate_groups'][0.01]['frames'], 100)
+        self.assertEqual(summary['rate_groups'][0.1]['frames'], 10)
+
+    def test_event_driven(self):
+        """The event-driven scheduler's frames shouldn't pile up in the cache"""
+        self.world.set_event_driven()
+        self.world.set_realtime(speed=1000.0)
+        for i in range(200):
+            self.world.cycle()
+
+        self.assertEqual(self.world.pacer.rate_groups[0.01].frames, 200)
+        self.assertEqual(self.world.pacer.rate_groups[0.1].frames, 20)
+        self.assertEqual(len(self.world.pacer.frame_groups), 2)
+
+    def test_deadline_misses(self):
+        SlowModel(self.world, "too_slow", dt=0.01)
+        self.world.set_realtime(speed=1.0)
+
+        for i in range(5):
+            self.world.cycle()
+
+        stats = self.world.pacer.rate_groups[0.01]
+        self.assertEqual(stats.frames, 5)
+        self.assertEqual(stats.misses, 5)
+        self.assertGreater(stats.max_overrun, 0.01)
+        self.assertGreater(max(self.world.pacer.lateness), 0.0)
+
+    def test_write(self):
+        self.world.set_realtime(speed=100.0)
+        for i in range(10):
+            self.world.cycle()
+        self.world.finish_logging()
+
+        with h5py.File(f"{self.basename}.h5", 'r') as f:
+            self.assertEqual(f['realtime']['t'].shape, (10,))
+            self.assertEqual(f['realtime']['dt_0.01'].attrs['frames'], 10)
+            self.assertEqual(f['realtime']['dt_0.1'].attrs['frames'], 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+import h5py
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+import numpy as np
+import numpy.random as npr
+
+from scenario import build_scenario
+from sweep import METRICS, grid, run_sweep, write_index
+from world import World
+
+def crash_case(basename: str, params: dict, duration: float, seed_sequence, checkpoint: bytes = None):
+    """Stands in for run_case, killing the worker for a case with crash=True."""
+    if params.get('crash'):
+        with open(f"{basename}.runs", 'a') as f:
+            f.write("run\n")
+        os._exit(1)
+    time.sleep(0.2) # so the others are still running when it crashes
+    return {name: params['desired_x'] for name in METRICS}
+
+class TestSweep(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.prefix = os.path.join(self.tmpdir.name, "sweep")
+
+    def tearDown(self) -> None:
+        self.tmpdir.cleanup()
+
+    def test_grid(self):
+        param_sets = grid(kp=[1.0, 2.0], kd=[3.0, 4.0, 5.0])
+        self.assertEqual(len(param_sets), 6)
+        self.assertEqual(param_sets[0], {'kp': 1.0, 'kd': 3.0})
+        self.assertEqual(param_sets[-1], {'kp': 2.0, 'kd': 5.0})
+
+    def test_run_sweep(self):
+        param_sets = grid(desired_x=[1.0], kp=[10.0, 40.0])
+        param_sets.append({'desired_x': 1.0, 'sigma': -1.0}) # negative noise should fail
+
+        results = run_sweep(param_sets, 1.0, prefix=self.prefix, max_workers=2)
+
+        self.assertEqual([result['status'] for result in results], ['ok', 'ok', 'failed'])
+        self.assertIn('ValueError', results[2]['error'])
+        self.assertIn('rmse', results[0]['metrics'])
+        self.assertTrue(os.path.exists(f"{self.prefix}_00000.h5"))
+
+        with h5py.File(f"{self.prefix}_index.h5", 'r') as f:
+            self.assertEqual(list(f['params']['kp'][:2]), [10.0, 40.0])
+            self.assertEqual(f['status'][2], b'failed')
+            self.assertEqual(f['metrics']['rmse'].shape, (3,))
+
+    def test_worker_crash(self):
+        """Only the case that kills its worker should fail"""
+        param_sets = [{'desired_x': float(i), 'crash': i == 2} for i in range(5)]
+        with mock.patch('sweep.run_case', crash_case):
+            results = run_sweep(param_sets, 1.0, prefix=self.prefix, max_workers=2, retries=2)
+
+        self.assertEqual([result['status'] for result in results], ['ok', 'ok', 'failed', 'ok', 'ok'])
+        self.assertIn("worker died", results[2]['error'])
+        for i in [0, 1, 3, 4]:
+            self.assertEqual(results[i]['metrics']['rmse'], float(i))
+
+        # crash is a boolean parameter, and stays one in the index
+        with h5py.File(f"{self.prefix}_index.h5", 'r') as f:
+            self.assertEqual(f['params']['crash'].dtype, np.bool_)
+            self.assertEqual(list(f['params']['crash'][:]), [False, False, True, False, False])
+
+        # The crashing case gets its retries, on its own
+        with open(f"{self.prefix}_00002.runs") as f:
+            self.assertEqual(len(f.readlines()), 3)
+
+    def test_index_dtypes(self):
+        """Parameters don't have to be floats"""
+        results = [
+            {'basename': "a", 'status': 'ok', 'error': "", 'metrics': None,
+             'params': {'kp': 10.0, 'steps': 3, 'method': 'RK45', 'coupled': True}},
+            {'basename': "b", 'status': 'ok', 'error': "", 'metrics': None,
+             'params': {'kp': 20.0, 'steps': 4, 'coupled': False}},
+        ]
+        write_index(self.prefix, results)
+
+        with h5py.File(f"{self.prefix}.h5", 'r') as f:
+            params = f['params']
+            self.assertEqual(list(params['kp'][:]), [10.0, 20.0])
+            self.assertEqual(params['steps'].dtype.kind, 'i')
+            self.assertEqual(list(params['steps'][:]), [3, 4])
+            self.assertEqual(params['coupled'].dtype, np.bool_)
+            self.assertEqual(list(params['method'].asstr()[:]), ['RK45', ''])
+            self.assertTrue(np.isnan(f['metrics']['rmse'][0]))
+
+    def test_reproducible(self):
+        param_sets = grid(desired_x=[1.0], sigma=[0.1, 0.1])
+        first = run_sweep(param_sets, 1.0, prefix=self.prefix, seed=3, max_workers=2)
+        second = run_sweep(param_sets, 1.0, prefix=self.prefix, seed=3, max_workers=1)
+
+        for a, b in zip(first, second):
+            self.assertEqual(a['metrics'], b['metrics'])
+
+        # The two cases should get different noise, though
+        self.assertNotEqual(first[0]['metrics']['rmse'], first[1]['metrics']['rmse'])
+
+    def test_checkpoint(self):
+        # Warm up once, then fork every case from there
+        world = World(f"{self.prefix}_warmup", rng=npr.default_rng(seed=0))
+        build_scenario(world, 1.0)
+        world.setup_logging()
+        while world.t < 1.0:
+            world.cycle()
+        checkpoint = world.checkpoint()
+        world.finish_logging()
+
+        param_sets = grid(desired_x=[1.0], kp=[10.0, 40.0])
+        results = run_sweep(param_sets, 2.0, prefix=self.prefix, max_workers=2, checkpoint=checkpoint)
+        self.assertEqual([result['status'] for result in results], ['ok', 'ok'])
+        self.assertNotEqual(results[0]['metrics']['rmse'], results[1]['metrics']['rmse'])
+
+        with h5py.File(f"{self.prefix}_00000.h5", 'r') as f:
+            self.assertAlmostEqual(f['low_rate_log']['t'][-1], 2.0, places=6)
+
+if __name__ == '__main__':
+    unittest.main()
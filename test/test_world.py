@@ -1,10 +1,36 @@
+import numpy as np
+import numpy.random as npr
+import os
+import tempfile
+import tracemalloc
 import unittest
 
 from world import World
+from discrete_model import DiscreteModel
 from mass_spring_damper import MassSpringDamper
 
+from scheduler import RateGroupScheduler, EventScheduler
+from scenario import build_scenario
+from pid_controller import PIDController
 from test.test_pid_controller import InputHarness
 
+class Clock(DiscreteModel):
+    """Outputs the time of its last update."""
+    def compute_inputs(self):
+        pass
+
+    def compute_outputs(self):
+        self.y = self.t
+
+class Recorder(DiscreteModel):
+    """Reads a process input and a previous input."""
+    def compute_inputs(self):
+        self.x = self.get_input('process')
+        self.previous = self.get_input('previous')
+
+    def compute_outputs(self):
+        self.y = self.x
+
 class TestWorld(unittest.TestCase):
     def setUp(self):
         self.world = World("test")
@@ -32,4 +58,466 @@ class TestWorld(unittest.TestCase):
             self.msd1.add_input('force', 'invalid.input.y') # too many dots
 
         with self.assertRaises(KeyError):
-            self.msd1.add_input('force', 'output.y') # output doesn't exist
\ No newline at end of file
+            self.msd1.add_input('force', 'output.y') # output doesn't exist
+
+    def test_discretize(self):
+        Phi, Gamma = self.world.discretize(self.msd1, 0.1)
+        self.assertEqual(Phi.shape, (2, 2))
+        self.assertEqual(Gamma.shape, (2, 1))
+
+        # Float noise in dt should still hit the cache
+        Phi2, Gamma2 = self.world.discretize(self.msd1, 0.3 - 0.2)
+        self.assertIs(Phi, Phi2)
+
+        self.world.clear_discretizations(self.msd1)
+        self.assertEqual(self.world.discretizations, {})
+
+    def test_cycle(self):
+        fast = InputHarness(self.world, "fast", dt=0.01)
+        self.msd1.add_input('force', 'input.y')
+
+        # 0.1 s worth of 0.01 s frames
+        for i in range(1, 11):
+            self.world.cycle()
+            self.assertEqual(self.world.t, i / 100)
+            self.assertEqual(fast.t, i / 100)
+        self.assertEqual(self.input.t, 0.1)
+        self.assertEqual(self.msd1.t, 0.1)
+
+        # Run a long time; the clock shouldn't drift and no updates should be missed
+        for i in range(10000):
+            self.world.cycle()
+        self.assertEqual(self.world.t, 100.1)
+        self.assertEqual(self.input.t, 100.1)
+
+    def test_scheduler(self):
+        slow = InputHarness(self.world, "slow", dt=0.25)
+        scheduler = RateGroupScheduler([self.input, self.msd1, slow])
+
+        self.assertAlmostEqual(scheduler.base_dt, 0.05)
+        self.assertEqual(scheduler.periods, [2, 2, 5])
+        self.assertEqual(scheduler.hyperperiod, 10)
+
+        # Only frames where something fires are in the table
+        self.assertEqual([offset for offset, models in scheduler.frames], [2, 4, 5, 6, 8, 10])
+        self.assertEqual(scheduler.frames[2][1], (slow,))
+        self.assertEqual(scheduler.frames[-1][1], (self.input, self.msd1, slow))
+
+        t, models = scheduler.next_frame()
+        self.assertAlmostEqual(t, 0.1)
+
+        # Seeking should put us on the first frame after the given time
+        scheduler.seek(0.5)
+        t, models = scheduler.next_frame()
+        self.assertAlmostEqual(t, 0.6)
+
+        # A zero time step is fine for the model, but not for the scheduler
+        InputHarness(self.world, "bad_rate", dt=0.0)
+        with self.assertRaises(ValueError):
+            RateGroupScheduler(self.world.models.values())
+
+    def test_execution_order(self):
+        # Added backwards: the plant reads the controller, which reads the sensor
+        world = World("test_order")
+        pid = PIDController(world, "pid", dt=0.1, setpoint=1.0)
+        sensor = InputHarness(world, "sensor", dt=0.1)
+        msd = MassSpringDamper(world, "msd", dt=0.01)
+        msd.add_input('force', 'pid.y')
+        pid.add_input('process', 'sensor.y')
+        self.assertEqual([model.name for model in world.execution_order()], ["sensor", "pid", "msd"])
+
+        # The controller sees the sensor's output from the same frame
+        world.cycle()
+        world.cycle()
+        self.assertEqual(world.scheduler.frames[-1][1], (sensor, pid, msd))
+
+        # Closing the loop needs a delay somewhere
+        sensor.add_input('process', 'msd.y', 0)
+        with self.assertRaises(ValueError) as context:
+            world.execution_order()
+        self.assertIn("pid, sensor, msd", str(context.exception))
+        world.finish_logging()
+
+        # With the plant reading last frame's force, it goes first
+        world = World("test_order")
+        pid = PIDController(world, "pid", dt=0.1, setpoint=1.0)
+        sensor = InputHarness(world, "sensor", dt=0.1)
+        msd = MassSpringDamper(world, "msd", dt=0.01)
+        msd.add_input('force', 'pid.y', delay=True)
+        pid.add_input('process', 'sensor.y')
+        sensor.add_input('process', 'msd.y', 0)
+        self.assertEqual([model.name for model in world.execution_order()], ["msd", "sensor", "pid"])
+        world.finish_logging()
+
+        # A delay doesn't order anything: a reads b with a delay and b through c, so
+        # b goes first, but a still gets b's value from before the frame
+        world = World("test_order")
+        a = Recorder(world, "a", dt=0.1)
+        b = Clock(world, "b", dt=0.1)
+        c = DiscreteModel(world, "c", dt=0.1)
+        a.add_input('previous', 'b.y', delay=True)
+        a.add_input('process', 'c.y')
+        c.add_input('process', 'b.y')
+        self.assertEqual([model.name for model in world.execution_order()], ["b", "c", "a"])
+        world.compile()
+        for i in range(3):
+            world.cycle()
+            self.assertAlmostEqual(a.x, world.t + 1.0)
+            self.assertAlmostEqual(a.previous, world.t - 0.1)
+        world.finish_logging()
+        os.remove("test_order.h5")
+
+    def test_compile(self):
+        self.msd1.add_input('force', 'input.y')
+        self.input.update(0.1)
+        self.assertEqual(self.msd1.get_input('force'), 5.0)
+
+        self.world.compile()
+        self.assertIn('force', self.msd1.accessors)
+        self.assertEqual(self.msd1.get_input('force'), 5.0)
+
+        # Accessors read the current value, not the value at compile time
+        self.input.y = 3.0
+        self.assertEqual(self.msd1.get_input('force'), 3.0)
+
+        with self.assertRaises(ValueError):
+            self.msd1.add_input('other_force', 'input.y')
+
+        with self.assertRaises(ValueError):
+            self.world.compile()
+
+    def test_compile_validation(self):
+        self.msd1.add_input('force', 'input.nonexistent')
+        with self.assertRaises(AttributeError):
+            self.world.compile()
+
+        self.msd1.inputs['force'] = ('input', 'y', 3) # y is a float
+        with self.assertRaises(IndexError):
+            self.world.compile()
+
+        self.msd1.inputs['force'] = ('msd', 'x', 2) # x only has two elements
+        with self.assertRaises(IndexError):
+            self.world.compile()
+
+    def test_state_store(self):
+        msd2 = MassSpringDamper(self.world, "msd2", dt=0.1, x=np.array([1.0, 2.0]))
+        self.msd1.add_input('force', 'input.y')
+        msd2.add_input('force', 'input.y')
+        self.world.compile()
+
+        # x, u, and y live in the store, in model order
+        store = self.world.store
+        self.assertEqual(store.x.shape, (4,))
+        np.testing.assert_equal(store.x, [0.0, 0.0, 1.0, 2.0])
+        self.assertIs(msd2.x.base, store.x)
+        np.testing.assert_equal(store.view("msd2", 'y'), [1.0, 2.0])
+
+        # and get updated there, in place
+        x, u, y = msd2.x, msd2.u, msd2.y
+        for i in range(3):
+            self.world.cycle()
+        self.assertIs(msd2.x, x)
+        self.assertIs(msd2.u, u)
+        self.assertIs(msd2.y, y)
+        self.assertEqual(msd2.u, 5.0)
+        np.testing.assert_equal(store.view("msd2", 'x'), msd2.x)
+        np.testing.assert_equal(msd2.y, msd2.x)
+
+
+class TestAllocations(unittest.TestCase):
+    def test_steady_state(self):
+        """Once it's warmed up, a tick of the example shouldn't allocate any arrays"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            world = World(os.path.join(tmpdir, "allocations"), rng=npr.default_rng(seed=0))
+            build_scenario(world, 5.0, logging=False)
+            # and a delayed read of an array, so there's an array latch too
+            probe = DiscreteModel(world, "probe", dt=0.1)
+            probe.add_input('process', 'mass_spring_damper.y', 0, delay=True)
+            world.compile()
+            for i in range(100):
+                world.cycle()
+            latch = world.models['mass_spring_damper'].latches['y']
+            held = latch.value
+
+            tracemalloc.start()
+            try:
+                peaks = []
+                for i in range(200): # (the noise doesn't draw a new block in here)
+                    before, peak = tracemalloc.get_traced_memory()
+                    tracemalloc.reset_peak()
+                    world.cycle()
+                    current, peak = tracemalloc.get_traced_memory()
+                    peaks.append(peak - before)
+            finally:
+                tracemalloc.stop()
+            world.finish_logging()
+
+        # A few Python floats and such, but not even one array
+        self.assertLess(max(peaks), 512)
+        self.assertIs(latch.value, held)
+
+class TestBatchedWorld(unittest.TestCase):
+    def setUp(self):
+        self.m = np.array([1.0, 4.0, 8.0])
+        self.kp = np.array([10.0, 40.0, 20.0])
+
+        self.world = World("test", rng=npr.default_rng(seed=0), batch_size=3)
+        self.models = build_scenario(self.world, 5.0, m=self.m, kp=self.kp, sigma=0.0)
+        self.world.setup_logging()
+
+    def tearDown(self) -> None:
+        self.world.finish_logging()
+
+    def test_batched_matches_unbatched(self):
+        while self.world.t < 2.0:
+            self.world.cycle()
+
+        msd = self.models['mass_spring_damper']
+        self.assertEqual(msd.x.shape, (3, 2))
+        self.assertEqual(self.models['pid'].y.shape, (3,))
+
+        for i in range(3):
+            world = World("test_unbatched")
+            models = build_scenario(world, 5.0, m=self.m[i], kp=self.kp[i], sigma=0.0, logging=False)
+            world.compile()
+            while world.t < 2.0:
+                world.cycle()
+            world.finish_logging()
+
+            np.testing.assert_allclose(msd.x[i], models['mass_spring_damper'].x)
+
+        os.remove("test_unbatched.h5")
+
+    def test_batched_noise(self):
+        sensor = self.models['sensor']
+        sensor.sigma = np.array([0.0, 1.0, 2.0])
+        sensor.generate()
+        self.assertEqual(sensor.mu.shape, (3,))
+        self.assertEqual(sensor.mu[0], 0.0)
+        self.assertNotEqual(sensor.mu[1], 0.0)
+
+    def test_batched_logging(self):
+        for i in range(10):
+            self.world.cycle()
+        self.world.models['high_rate_log'].finalize()
+
+        # Ten 0.1 s frames, with the plant's 0.01 s substeps
+        position = self.world.f['high_rate_log']['position']
+        self.assertEqual(position.shape, (100, 3))
+        self.assertEqual(self.world.f['high_rate_log']['t'].shape, (100,))
+
+class TestCoupledWorld(unittest.TestCase):
+    def build(self, basename: str):
+        world = World(basename)
+        InputHarness(world, "input", dt=0.01)
+        models = [
+            MassSpringDamper(world, f"msd_{i}", dt=0.01, x=np.array([1.0 + i, 0.0]),
+                             k=2.0 + i, integrator='solve_ivp', rtol=1e-8, atol=1e-10)
+            for i in range(3)
+        ]
+        models.append(MassSpringDamper(world, "slow", dt=0.1, x=np.array([1.0, 0.0]),
+                                       integrator='solve_ivp', rtol=1e-8, atol=1e-10))
+        models.append(MassSpringDamper(world, "linear", dt=0.01, x=np.array([1.0, 0.0])))
+        for model in models:
+            model.add_input('force', 'input.y')
+        world.compile()
+        return world
+
+    def test_coupled_matches_uncoupled(self):
+        coupled = self.build("test_coupled")
+        coupled.set_coupled()
+        uncoupled = self.build("test_uncoupled")
+        for i in range(100):
+            coupled.cycle()
+            uncoupled.cycle()
+        coupled.finish_logging()
+        uncoupled.finish_logging()
+
+        for name in coupled.order[1:]:
+            np.testing.assert_allclose(coupled.models[name].x, uncoupled.models[name].x, atol=1e-6)
+            np.testing.assert_allclose(coupled.models[name].y, uncoupled.models[name].y, atol=1e-6)
+            self.assertAlmostEqual(coupled.models[name].t, 1.0)
+
+        os.remove("test_coupled.h5")
+        os.remove("test_uncoupled.h5")
+
+    def test_groups(self):
+        world = self.build("test_coupled")
+        world.set_coupled()
+        world.cycle()
+        world.finish_logging()
+        os.remove("test_coupled.h5")
+
+        # Only the solve_ivp models at the same rate get grouped
+        names = [model.name for model in world.scheduler.frames[0][1]]
+        self.assertEqual(names, ["input", "msd_0+msd_1+msd_2", "linear"])
+
+        # and their states stay in the store
+        for i in range(3):
+            self.assertIs(world.models[f"msd_{i}"].x.base, world.store.x)
+        np.testing.assert_equal(world.store.view("msd_1", 'x'), world.models["msd_1"].x)
+
+    def test_finish_update(self):
+        """The members of a group still get their post-step work (e.g. their loggers)"""
+        world = self.build("test_coupled")
+        world.set_coupled()
+        calls = []
+        class Recorder:
+            def log_substeps(self, model):
+                calls.append((model.name, model.t))
+        world.models["msd_1"].loggers.append(Recorder())
+        for i in range(3):
+            world.cycle()
+        world.finish_logging()
+        os.remove("test_coupled.h5")
+
+        self.assertEqual([name for name, t in calls], ["msd_1"] * 3)
+        np.testing.assert_allclose([t for name, t in calls], [0.01, 0.02, 0.03])
+
+    def test_interleaved(self):
+        """A model in between two plants that feeds the second one keeps them apart"""
+        def build(basename):
+            world = World(basename)
+            InputHarness(world, "input", dt=0.01)
+            first = MassSpringDamper(world, "first", dt=0.01, x=np.array([1.0, 0.0]),
+                                     integrator='solve_ivp', rtol=1e-8, atol=1e-10)
+            probe = DiscreteModel(world, "probe", dt=0.01) # y = first's position + 1
+            second = MassSpringDamper(world, "second", dt=0.01,
+                                      integrator='solve_ivp', rtol=1e-8, atol=1e-10)
+            third = MassSpringDamper(world, "third", dt=0.01,
+                                     integrator='solve_ivp', rtol=1e-8, atol=1e-10)
+            first.add_input('force', 'input.y')
+            probe.add_input('process', 'first.y', 0)
+            second.add_input('force', 'probe.y')
+            third.add_input('force', 'input.y')
+            world.compile()
+            return world
+
+        coupled = build("test_coupled")
+        coupled.set_coupled()
+        uncoupled = build("test_uncoupled")
+        for i in range(20):
+            coupled.cycle()
+            uncoupled.cycle()
+        coupled.finish_logging()
+        uncoupled.finish_logging()
+        os.remove("test_coupled.h5")
+        os.remove("test_uncoupled.h5")
+
+        names = [model.name for model in coupled.scheduler.frames[0][1]]
+        self.assertEqual(names, ["input", "first", "probe", "second+third"])
+        for name in ["first", "second", "third"]:
+            np.testing.assert_allclose(coupled.models[name].x, uncoupled.models[name].x, atol=1e-6)
+
+class Setpoint(InputHarness):
+    """
+    Changes its output at scheduled times (and schedules its own next change).
+    """
+    def compute_inputs(self):
+        pass
+
+    def compute_outputs(self):
+        self.y = self.t
+        if self.t < 0.35:
+            self.world.schedule(self, self.t + 0.125)
+
+class TestEventDrivenWorld(unittest.TestCase):
+    def build(self, basename: str):
+        world = World(basename)
+        InputHarness(world, "input", dt=0.1)
+        InputHarness(world, "slow", dt=0.25)
+        msd = MassSpringDamper(world, "msd", dt=0.01, x=np.array([1.0, 0.0]))
+        msd.add_input('force', 'input.y')
+        return world
+
+    def tearDown(self) -> None:
+        for basename in ["test_event", "test_rate_group"]:
+            if os.path.exists(f"{basename}.h5"):
+                os.remove(f"{basename}.h5")
+
+    def test_matches_rate_group(self):
+        event = self.build("test_event")
+        event.set_event_driven()
+        rate_group = self.build("test_rate_group")
+        for i in range(300):
+            event.cycle()
+            rate_group.cycle()
+            self.assertEqual(event.t, rate_group.t)
+            for name in event.order:
+                self.assertEqual(event.models[name].t, rate_group.models[name].t)
+        event.finish_logging()
+        rate_group.finish_logging()
+
+        np.testing.assert_array_equal(event.models['msd'].x, rate_group.models['msd'].x)
+
+    def test_one_shot_events(self):
+        world = self.build("test_event")
+        setpoint = Setpoint(world, "setpoint", dt=None)
+
+        # Events need the event-driven scheduler
+        with self.assertRaises(ValueError):
+            world.schedule(setpoint, 0.125)
+        world.set_event_driven()
+        world.schedule(setpoint, 0.125)
+        world.schedule(setpoint, 0.125) # only updated once
+        with self.assertRaises(ValueError):
+            world.schedule(setpoint, 0.0) # not in the future
+
+        times = []
+        while world.t < 1.0:
+            world.cycle()
+            if setpoint.t == world.t:
+                times.append(world.t)
+        world.finish_logging()
+
+        # The first event, and then the ones the model scheduled itself
+        self.assertEqual(times, [0.125, 0.25, 0.375])
+        self.assertEqual(setpoint.y, 0.375)
+        self.assertEqual(world.models['slow'].t, 1.0)
+        self.assertEqual(world.pending_events(), [])
+
+    def test_pending_events(self):
+        world = self.build("test_event")
+        setpoint = Setpoint(world, "setpoint", dt=None)
+        world.set_event_driven()
+        world.schedule(setpoint, 0.5)
+        world.cycle()
+        self.assertEqual(world.pending_events(), [(0.5, setpoint)])
+
+        # Events survive the schedule being rebuilt (and a checkpoint)
+        checkpoint = world.checkpoint()
+        InputHarness(world, "other", dt=0.1)
+        self.assertEqual(world.pending_events(), [(0.5, setpoint)])
+        world.finish_logging()
+
+        restored = self.build("test_rate_group")
+        restored_setpoint = Setpoint(restored, "setpoint", dt=None)
+        restored.set_event_driven()
+        restored.restore(checkpoint)
+        self.assertEqual(restored.pending_events(), [(0.5, restored_setpoint)])
+        restored.finish_logging()
+
+    def test_no_dt(self):
+        world = self.build("test_event")
+        Setpoint(world, "setpoint", dt=None)
+        with self.assertRaises(ValueError):
+            world.cycle() # the rate-group scheduler can't run it
+        world.finish_logging()
+
+    def test_scheduler(self):
+        world = self.build("test_event")
+        models = [world.models[name] for name in world.order]
+        scheduler = EventScheduler(models, t=0.2)
+
+        t, models = scheduler.next_frame()
+        self.assertEqual(t, 0.21)
+        self.assertEqual([model.name for model in models], ["msd"])
+
+        scheduler.seek(0.49)
+        t, models = scheduler.next_frame()
+        self.assertEqual(t, 0.5)
+        self.assertEqual([model.name for model in models], ["input", "slow", "msd"])
+
+        with self.assertRaises(KeyError):
+            scheduler.schedule(InputHarness(world, "unscheduled", dt=0.1), 1.0)
+        world.finish_logging()
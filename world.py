@@ -1,35 +1,85 @@
 import h5py
+import heapq
 import numpy.random as npr
 import sys
 
-from mass_spring_damper import MassSpringDamper
-from pid_controller import PIDController
-from gaussian_noise import GaussianNoise
+from checkpoint import save_checkpoint, load_checkpoint
+from coupled import couple
+from dynamic_model import discretize_zoh
 from logger import Logger
+from log_writer import LogWriter
+from scenario import build_scenario
+from scheduler import RateGroupScheduler, EventScheduler
+from state_store import StateStore
+from realtime import RealTimePacer
+from profiler import Profiler
 
 BIGGEST_STEP = 1000000.0
 
+def seed_sequence(rng):
+    """
+    Get a new SeedSequence for a world, spawned from the one the generator was
+    seeded with (numpy only made it public in 1.25), so every world made from the
+    same generator gets one of its own, and worlds made from generators with the
+    same seed get the same ones in the same order. If the generator doesn't have a
+    SeedSequence (e.g. its bit generator was made from a saved state), the entropy
+    gets drawn from it instead.
+    """
+    bit_generator = rng.bit_generator
+    for attribute in ('seed_seq', '_seed_seq'):
+        seed_seq = getattr(bit_generator, attribute, None)
+        if isinstance(seed_seq, npr.SeedSequence):
+            return seed_seq.spawn(1)[0]
+    return npr.SeedSequence([int(value) for value in rng.integers(2**32, size=4)])
+
 class World:
     """
     This is the registry of all models in the world. It is responsible for
     making sure everything is synchronized and stepping all of the different 
     processes.
     """
-    def __init__(self, basename: str = "data", rng=npr.default_rng()):
+    def __init__(self, basename: str = "data", rng=None, batch_size: int = None):
+        """
+        Args:
+            basename: the log file name (without the .h5 extension)
+            rng: random number generator (a new, unseeded one if not given)
+            batch_size: if given, every model carries a leading batch dimension of this
+                size on its state and (optionally) its parameters, so that we can step
+                many instances of the same world (e.g. Monte Carlo runs) at once
+        """
         self.models = {}
         self.order = []
         self.t = 0.0
+        self.frame = 0 # counts frames, for delayed inputs (see Model.hold)
+        self.scheduler = None # built on the first cycle
+        self.plan = None # models in update order (see execution_order)
+        self.event_driven = False # see set_event_driven
+        self.events = [] # one-shot (time, model) events waiting for the scheduler to be built
+        self.compiled = False # see compile()
+        self.store = None # contiguous x, u, and y of the dynamic models (see compile)
+        self.pacer = None # for real-time mode (see set_realtime)
+        self.profiler = None # see enable_profiling
+        self.coupled = False # see set_coupled
 
         self.f = h5py.File(f'{basename}.h5', 'w')
         self.logging_ready = False
+        self.writer = None # background log writer, if any (see setup_logging)
+        self.spare_buffers = 0
+
+        # Noise models spawn generators of their own from our SeedSequence (see
+        # spawn_rng), so they don't draw from this one
+        self.rng = npr.default_rng() if rng is None else rng
+        self.seed_seq = seed_sequence(self.rng)
 
-        # Only needed if we use the noise model:
-        self.rng = rng
+        self.batch_shape = () if batch_size is None else (batch_size,)
+
+        # Cache of zero-order-hold discretizations, keyed on (model name, dt)
+        self.discretizations = {}
 
     def add_model(self, model):
         """
-        Add a model to the world (do this in order of model priority,
-        so dynamic models first generally).
+        Add a model to the world. Models get updated in the order their connections
+        call for (see execution_order), and otherwise in the order they were added.
         """
         if model.name in self.models:
             raise KeyError(f"model {model.name} already exists")
@@ -37,55 +87,350 @@ class World:
         self.models[model.name] = model
         self.order.append(model.name)
 
-    def setup_logging(self):
+        # The schedule needs rebuilding to include the new model.
+        self.reset_schedule()
+
+    def spawn_rng(self, name: str):
+        """
+        Make a random number generator of a model's own, seeded from the world's
+        SeedSequence (see seed_sequence) and the model's name. So the model gets the
+        same stream whatever else is in the world, whatever order things update in,
+        and in whichever process it runs (see partition.py), while different worlds
+        (unseeded, sharing a generator, or seeded differently, e.g. the cases of a
+        sweep) get different streams. This never draws from the world's generator.
+        """
+        key = self.seed_seq.spawn_key + (len(name),) + tuple(name.encode())
+        seed_seq = npr.SeedSequence(self.seed_seq.entropy, spawn_key=key)
+        return npr.Generator(type(self.rng.bit_generator)(seed_seq))
+
+    def reset_schedule(self):
+        """
+        Throw out the schedule, so it gets rebuilt on the next cycle (keeping any
+        one-shot events that haven't happened yet).
+        """
+        if isinstance(self.scheduler, EventScheduler):
+            self.events = self.scheduler.pending()
+        self.scheduler = None
+        self.plan = None
+
+    def execution_order(self):
+        """
+        Get the models in the order they should be updated within a frame: every
+        model after the models it reads inputs from, so that signals get through in
+        the same frame (e.g. the controller sees this frame's sensor reading).
+        Connections marked with delay=True (see Model.add_input) don't count, since
+        they read the value from before the frame wherever the models end up. Models
+        which don't depend on each other stay in the order they were added.
+
+        Since every frame's models are picked out of this one order, it works for
+        any mix of rates. It's worked out once and kept until the models or
+        connections change.
+
+        Raises ValueError if there's a loop of connections without a delay in it (an
+        algebraic loop), since there's no order that works for that.
+        """
+        if self.plan is not None:
+            return self.plan
+
+        position = {name: i for i, name in enumerate(self.order)}
+        after = {name: [] for name in self.order} # models which have to wait for each one
+        waiting = {name: 0 for name in self.order} # how many models each one waits for
+        for name in self.order:
+            model = self.models[name]
+            for input_name, (model_id, attribute, index) in model.inputs.items():
+                if model_id == name or input_name in model.delayed:
+                    continue # these see the value from before the frame anyway
+                after[model_id].append(name)
+                waiting[name] += 1
+
+        ready = [position[name] for name in self.order if waiting[name] == 0]
+        heapq.heapify(ready)
+        plan = []
+        while len(ready) > 0:
+            name = self.order[heapq.heappop(ready)]
+            plan.append(self.models[name])
+            for other in after[name]:
+                waiting[other] -= 1
+                if waiting[other] == 0:
+                    heapq.heappush(ready, position[other])
+
+        if len(plan) < len(self.order):
+            # Whatever's left is stuck in a loop, or downstream of one; trim the latter
+            loop = {name for name in self.order if waiting[name] > 0}
+            trimmed = True
+            while trimmed:
+                ends = {name for name in loop if not any(other in loop for other in after[name])}
+                loop -= ends
+                trimmed = len(ends) > 0
+            loop = [name for name in self.order if name in loop]
+            raise ValueError(f"algebraic loop through {', '.join(loop)} (mark one of its connections with delay=True)")
+
+        self.plan = plan
+        return plan
+
+    def set_event_driven(self, event_driven: bool = True):
+        """
+        Use the event-driven scheduler (see EventScheduler) instead of the rate-group
+        scheduler. This is the better choice when the rates are very different or the
+        hyperperiod is huge, and it's needed for models which schedule their own
+        one-shot updates (see schedule()) or which have no dt at all.
+        """
+        self.reset_schedule()
+        self.event_driven = event_driven
+
+    def schedule(self, model, t: float):
+        """
+        Update a model (on top of its regular updates, if it has any) at time t, which
+        has to be in the future. Models can call this on themselves, e.g. to change a
+        setpoint or inject a fault at some point. This needs the event-driven scheduler.
+        """
+        if not self.event_driven:
+            raise ValueError("one-shot events need the event-driven scheduler (see set_event_driven)")
+        if self.scheduler is None:
+            if t <= self.t:
+                raise ValueError(f"can't schedule {model.name} at {t}, which isn't after the current time {self.t}")
+            self.events.append((t, model))
+        else:
+            self.scheduler.schedule(model, t)
+
+    def pending_events(self):
+        """
+        Get the one-shot events which haven't happened yet, as (time, model) pairs.
+        """
+        if isinstance(self.scheduler, EventScheduler):
+            return self.scheduler.pending()
+        return sorted(self.events, key=lambda event: event[0])
+
+    def scheduled_models(self):
+        """
+        Get the models the scheduler should update, in order: everything but loggers
+        with dt=None, which only log what they're given (e.g. substeps).
+        """
+        return [model for model in self.execution_order() if not (isinstance(model, Logger) and model.dt is None)]
+
+    def discretize(self, model, dt: float):
+        """
+        Get the (Phi, Gamma) discretization of a linear model for a step of dt. These
+        are only computed once per model and distinct dt, and then cached.
+        """
+        # Round so float noise in dt doesn't miss the cache (and so the result doesn't
+        # depend on which dt happened to fill the cache)
+        dt = round(dt, 12)
+        key = (model.name, dt)
+        if key not in self.discretizations:
+            A, B = model.state_space()
+            self.discretizations[key] = discretize_zoh(A, B, dt)
+        return self.discretizations[key]
+
+    def clear_discretizations(self, model):
+        """
+        Forget cached discretizations for a model (e.g. after changing its parameters).
+        """
+        for key in [key for key in self.discretizations if key[0] == model.name]:
+            del self.discretizations[key]
+
+    def compile(self):
+        """
+        Freeze the connections between models. This validates every input connection
+        (raising an error for missing models, attributes, or indices) and resolves it
+        into a direct accessor, so that reading inputs during the simulation doesn't
+        need to look anything up by name. No inputs can be added afterward.
+
+        Note that feedback loops are allowed (and expected, since this is a closed loop
+        simulation), but each one needs a connection marked with delay=True, where the
+        reading model gets the previous value; this checks for that too (see
+        execution_order).
+
+        This also gathers the states, inputs, and outputs of the dynamic models into
+        one contiguous store (see StateStore), which they then update in place.
+
+        This is called by setup_logging() if you haven't called it yourself.
+        """
+        if self.compiled:
+            raise ValueError("world already compiled, please only call once")
+
+        for name in self.order:
+            self.models[name].compile_inputs()
+        self.execution_order()
+
+        self.store = StateStore([self.models[name] for name in self.order])
+
+        self.compiled = True
+
+    def set_coupled(self, coupled: bool = True):
+        """
+        Integrate dynamic models with the same rate (and solver settings) together, in
+        one solve_ivp call on their stacked states, instead of one call each (see
+        CoupledGroup). This cuts down on the solver overhead when there are lots of
+        plants. Only models using the solve_ivp integrator get coupled.
+
+        Each group updates at the position of its first model, so the inputs of all
+        of the models in the group get read at that point in the frame.
+        """
+        self.coupled = coupled
+        self.reset_schedule() # the schedule needs rebuilding with (or without) the groups
+
+    def checkpoint(self, file=None):
+        """
+        Save the state of the simulation (see save_checkpoint), to file (a path or a
+        file object) if given, or else as bytes, which we return.
+        """
+        return save_checkpoint(self, file)
+
+    def restore(self, source, restore_rng: bool = True):
+        """
+        Pick up from a checkpoint (bytes, a path, or a file object), either to resume a
+        run or to fork a new one from it. The world has to have the same models as the
+        one that was saved (build it the same way first), but their parameters can be
+        different, e.g. to try out different gains from a shared warm-up.
+
+        Pass restore_rng=False to keep this world's own random number generator.
+
+        Restoring into a world with a new log file starts a new segment of each log:
+        the frames the loggers still had buffered, and everything from then on, but
+        not what had already been written to the old file (see Logger.set_state).
+        """
+        load_checkpoint(self, source, restore_rng=restore_rng)
+
+        # Pick the schedule back up from the restored time (with the restored events,
+        # rather than the ones we had).
+        self.scheduler = None
+        if self.pacer is not None:
+            self.pacer.wall_start = None
+
+    def set_realtime(self, speed: float = 1.0, spin: float = 0.001):
+        """
+        Run in real time: each cycle waits until its frame is due on the wall clock
+        (scaled by speed, so 10.0 runs ten times faster than real time), and the
+        timing of every frame gets recorded (see RealTimePacer). The timing stats end
+        up in world.pacer, and in the 'realtime' group of the log file.
+
+        Pass speed=None to go back to running as fast as possible.
+        """
+        if speed is None:
+            self.pacer = None
+        else:
+            self.pacer = RealTimePacer(speed=speed, spin=spin)
+
+    def enable_profiling(self):
+        """
+        Start recording the wall time of every cycle, model update, and update phase
+        (see Profiler). Do this after all of the models have been added. The profile
+        is available from world.profiler (e.g. world.profiler.report()), and gets
+        written to the 'profile' group of the log file.
+        """
+        if self.profiler is not None:
+            raise ValueError("profiling already enabled")
+        self.profiler = Profiler(self)
+        self.profiler.attach()
+        return self.profiler
+
+    def disable_profiling(self):
+        """
+        Stop profiling (this leaves world.profiler in place, so you can still look at
+        the results).
+        """
+        if self.profiler is not None:
+            self.profiler.detach()
+
+    def setup_logging(self, async_writes: bool = False, spare_buffers: int = 1, max_queued: int = 8):
         """
         Create datasets for each of the loggers.
+
+        Args:
+            async_writes: if True, a background thread does all of the writing to the
+                file, which helps throughput with heavy compression and a spare core,
+                but not the worst-case cycle time (see LogWriter), so it's off by
+                default
+            spare_buffers: with async_writes, how many extra buffers each logger gets
+                to log into while the writer is busy (1 gives double buffering)
+            max_queued: with async_writes, how many full buffers can be waiting to be
+                written before loggers have to wait
         """
         if self.logging_ready:
             raise ValueError("logging already set up, please only call once")
-        
+
+        if not self.compiled:
+            self.compile()
+
+        if async_writes:
+            self.writer = LogWriter(max_queued=max_queued)
+            self.spare_buffers = spare_buffers
+
         for model_id in self.models:
             if isinstance(self.models[model_id], Logger):
                 # Create a dataset with the same model_id as the logger
                 self.models[model_id].create_log(model_id)
 
+        if self.writer is not None:
+            self.writer.start()
+
         self.logging_ready = True
 
     def finish_logging(self):
         """
         Close the file and clean up.
         """
-        for model_id in self.models:
-            if isinstance(self.models[model_id], Logger):
-                self.models[model_id].finalize()
-        self.f.close()
+        if not self.f: # already closed
+            return
+
+        try:
+            for model_id in self.models:
+                if isinstance(self.models[model_id], Logger):
+                    self.models[model_id].finalize()
+        finally:
+            try:
+                # Wait for the writer to finish up
+                if self.writer is not None:
+                    writer, self.writer = self.writer, None
+                    writer.stop()
+            finally:
+                if self.pacer is not None:
+                    self.pacer.write(self.f.create_group('realtime'))
+                if self.profiler is not None:
+                    self.profiler.write(self.f.create_group('profile'))
+                self.f.close()
 
     def cycle(self):
         """
         Cycle through the models in the world and update them. In practice,
-        this picks the model with the earliest next update time and updates
-        all models whose frequencies make them eligible at that time.
-        """
+        this advances to the next minor frame in which any model is due and
+        updates those models (and only those models), in order (see
+        execution_order).
 
-        # Calculate the next update time for each model individually.
-        min_dt = float('inf')
-        for model in self.models.values():
-            if model.t_next < min_dt:
-                min_dt = min(min_dt, model.t_next - self.t)
-
-        if min_dt == float('inf'):
-            raise ValueError("something is wrong with model time")
-
-        # Calculate the proposed update time.
-        proposed_t = self.t + min_dt
+        The schedule is precomputed from the model rates the first time this
+        is called (and again if more models or connections get added). In event-driven mode (see
+        set_event_driven), the next frame comes off a priority queue instead.
+        """
+        if self.scheduler is None:
+            models = self.scheduled_models()
+            if self.coupled:
+                models = couple(models)
+            if self.event_driven:
+                self.scheduler = EventScheduler(models, t=self.t, events=self.events)
+                self.events = []
+            else:
+                self.scheduler = RateGroupScheduler(models, t=self.t)
 
-        # Update models that are ready.
-        for name, model in self.models.items():
-            if proposed_t >= model.t_next:
-                model.update(proposed_t)
+        t, models = self.scheduler.next_frame()
+        self.frame += 1
+        if self.pacer is None:
+            for model in models:
+                if model.latches:
+                    model.hold(self.frame)
+                model.update(t)
+        else:
+            if self.pacer.wall_start is None:
+                self.pacer.start(self.t)
+            started = self.pacer.wait(t)
+            for model in models:
+                if model.latches:
+                    model.hold(self.frame)
+                model.update(t)
+            self.pacer.record(t, models, started)
 
-        # Update the world clock to the proposed time.
-        self.t = proposed_t
+        # Update the world clock to the frame time.
+        self.t = t
 
 
 if __name__ == "__main__":
@@ -93,41 +438,22 @@ if __name__ == "__main__":
              # don't use the noise model)
     
     # Get the desired position of the mass from the command line
-    if len(sys.argv) != 3:
-        raise SyntaxError("Usage: python world.py <duration> <desired_x>")
+    if len(sys.argv) not in (3, 4):
+        raise SyntaxError("Usage: python world.py <duration> <desired_x> [realtime_speed]")
     duration = float(sys.argv[1])
     desired_x = float(sys.argv[2])
     if duration <= 0.0:
         raise ValueError("duration must be positive")
+    speed = float(sys.argv[3]) if len(sys.argv) == 4 else None
 
     # Create a world (our "prime mover")
     world = World(rng=npr.default_rng(seed=SEED))
 
-    # Add the models to the world in the order they should be updated
-    msd = MassSpringDamper(world, 'mass_spring_damper', m=4.0, k=2.0, b=3.0, dt=0.01)
-    sensor = GaussianNoise(world, 'sensor', sigma=0.01, dt=0.1)
-    pid = PIDController(world, 'pid', dt=0.1, kp=40.0, ki=2.0, kd=4.0, setpoint=desired_x)
-
-    # Now add the loggers
-    high_rate_log = Logger(world, 'high_rate_log', dt=0.01)
-    low_rate_log  = Logger(world, 'low_rate_log', dt=0.1)
-
-    # Define the connections between the model inputs and outputs
-    msd.add_input('force', 'pid.y')
-    sensor.add_input('process', 'mass_spring_damper.y', 0)
-    pid.add_input('process', 'sensor.y')
-
-    # Now define logging inputs
-    high_rate_log.add_input('position', 'mass_spring_damper.y', 0)
-    high_rate_log.add_input('velocity', 'mass_spring_damper.x', 1)
-    high_rate_log.add_input('force', 'mass_spring_damper.u')
-    low_rate_log.add_input('E', 'pid.E', label="E(t)")
-    low_rate_log.add_input('e', 'pid.e', label="e(t)")
-    low_rate_log.add_input('de', 'pid.de', label="de(t)/dt")
-    low_rate_log.add_input('pid_y', 'pid.y', label="PID output")
-    low_rate_log.add_input('mu', 'sensor.mu', label="sensor noise")
-    low_rate_log.add_input('sensor_y', 'sensor.y', label="sensor output")
-    low_rate_log.add_input('setpoint', 'pid.setpoint')
+    # Add the models, connections, and loggers
+    build_scenario(world, desired_x)
+
+    # Optionally lock the loop to the wall clock
+    world.set_realtime(speed)
 
     # This should be the final call in the setup phase.
     world.setup_logging()
@@ -137,3 +463,11 @@ if __name__ == "__main__":
         world.cycle()
 
     world.finish_logging()
+
+    if world.pacer is not None:
+        summary = world.pacer.summary()
+        print(f"max frame lateness: {1e6 * summary['max_lateness']:.1f} us, "
+              f"p99 {1e6 * summary['p99_lateness']:.1f} us")
+        for dt, stats in summary['rate_groups'].items():
+            print(f"dt {dt}: {stats['misses']} of {stats['frames']} deadlines missed, "
+                  f"max overrun {1e6 * stats['max_overrun']:.1f} us")